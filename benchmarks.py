@@ -0,0 +1,661 @@
+"""
+Synthetic benchmarks for the scanning code.
+
+Usage:
+    python benchmarks.py walker [--dirs 200] [--files 500]
+    python benchmarks.py incremental [--dirs 200] [--files 500]
+    python benchmarks.py parallel [--latency 0.005]
+    python benchmarks.py processes [--dirs 8] [--files 50000]
+    python benchmarks.py memory [--dirs 1000] [--files 1000]
+    python benchmarks.py classify [--files 100000] [--noise 0.5]
+    python benchmarks.py tune [--jobs 1500]
+    python benchmarks.py recordlog [--flights 50000]
+    python benchmarks.py recordmap [--flights 600000] [--noise 10]
+    python benchmarks.py recordtail [--flights 200000] [--append 100]
+    python benchmarks.py recordparallel [--flights 600000] [--workers N] [--chunk-mib 64]
+    python benchmarks.py reconcile [--flights 2000] [--segments 5] [--latency 0.0005]
+    python benchmarks.py columns [--flights 300000]
+    python benchmarks.py filter [--flights 500000]
+
+Every benchmark builds its data in a temporary directory and removes it
+afterwards, so nothing here touches the real drives.
+"""
+import argparse
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from das_walker import FlightEntry, iter_flight_entries
+from flight_catalog import FlightCatalog, add_entries
+from flight_filter import FlightFilter
+from flight_index import FlightIndex
+from flight_schema import DEFAULT_CLASSIFIER
+from flight_table import FlightTable
+from incremental_scan import MTIME_GRANULARITY, rescan_drive
+from io_tuner import ConcurrencyTuner, TuningPolicy, run_tuned
+from parallel_scan import ProcessScanner, SubtreeScanner
+from reconcile import reconcile
+from record_log import RecordLogParser
+
+
+def build_synthetic_drive(root, missions=200, files_per_das=500, noise_per_dir=20):
+    """
+    Lay out <root>/!shu_fd/<mission>/<sub>/das/<DDMMYY_PPP>.NNN like the
+    recorders do, with some unrelated files and folders next to every das.
+    """
+    shu_fd = Path(root) / '!shu_fd'
+    for m in range(missions):
+        mission = shu_fd / f'mission_{m:04d}'
+        das = mission / 'raw' / 'das'
+        das.mkdir(parents=True)
+        (mission / 'reports').mkdir()
+        for n in range(noise_per_dir):
+            (mission / 'reports' / f'report_{n}.txt').write_bytes(b'x')
+        day = m % 28 + 1
+        plane = 200 + m % 7
+        for f in range(files_per_das):
+            name = f'{day:02d}1124_{plane}.{f:03d}'
+            (das / name).write_bytes(b'\0' * (f % 64))
+        for n in range(noise_per_dir):
+            (das / f'notes_{n}.txt').write_bytes(b'x')
+    return str(root)
+
+
+def legacy_process_drive(drive):
+    """The rglob/iterdir/stat scan the GUI used before das_walker."""
+    pattern = re.compile(r'(\d{6})_(\d+)')
+    drive_data = []
+    shu_fd_folder = Path(drive) / '!shu_fd'
+    if shu_fd_folder.exists():
+        for das_folder in shu_fd_folder.rglob('das'):
+            if das_folder.is_dir():
+                for file in list(das_folder.iterdir()):
+                    if file.is_file() and pattern.match(file.stem):
+                        date, plane_number = pattern.match(file.stem).groups()
+                        try:
+                            size = file.stat().st_size
+                        except OSError:
+                            size = 0
+                        drive_data.append((date, plane_number, str(file), size))
+    return drive_data
+
+
+def walker_process_drive(drive):
+    return [(e.date, e.plane_number, e.path, e.size) for e in iter_flight_entries(drive)]
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_walker(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building {args.dirs} das folders x {args.files} files in {tmp} ...")
+        drive = build_synthetic_drive(tmp, args.dirs, args.files)
+        before, old = timed(legacy_process_drive, drive)
+        after, new = timed(walker_process_drive, drive)
+        assert sorted(old) == sorted(new), "walker and rglob scan disagree"
+        print(f"files matched:   {len(new)}")
+        print(f"rglob + stat:    {before:.3f} s")
+        print(f"scandir walker:  {after:.3f} s  ({before / after:.1f}x)")
+
+
+def bench_incremental(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        drive = os.path.join(tmp, 'drive')
+        os.mkdir(drive)
+        print(f"Building {args.dirs} das folders x {args.files} files in {tmp} ...")
+        build_synthetic_drive(drive, args.dirs, args.files)
+        # Let the freshly built directories age past the racy-mtime window
+        time.sleep(MTIME_GRANULARITY + 0.5)
+        index = FlightIndex(os.path.join(tmp, 'index.db'))
+
+        full, (added, _) = timed(rescan_drive, index, drive, 61, True, repeat=1)
+        quiet, (quiet_added, quiet_removed) = timed(rescan_drive, index, drive, 61)
+        das = os.path.join(drive, '!shu_fd', 'mission_0000', 'raw', 'das')
+        Path(das, '011124_999.000').write_bytes(b'new')
+        one, (one_added, _) = timed(rescan_drive, index, drive, 61, repeat=1)
+        assert not quiet_added and not quiet_removed and len(one_added) == 1
+        print(f"files indexed:            {len(added)}")
+        print(f"full scan:                {full:.3f} s")
+        print(f"reload, nothing changed:  {quiet:.3f} s  ({full / quiet:.1f}x)")
+        print(f"reload, one new file:     {one:.3f} s  ({full / one:.1f}x)")
+
+
+@contextmanager
+def simulated_latency(seconds):
+    """Add a fixed round-trip delay to every directory listing, like an SMB mount."""
+    real_scandir = os.scandir
+
+    def slow_scandir(path='.'):
+        time.sleep(seconds)
+        return real_scandir(path)
+
+    os.scandir = slow_scandir
+    try:
+        yield
+    finally:
+        os.scandir = real_scandir
+
+
+def bench_parallel(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        # One drive like 61 with most of the recordings, several small ones
+        layout = [(args.big, 100)] + [(5, 100)] * args.small
+        drives = []
+        for i, (missions, files) in enumerate(layout):
+            drive = os.path.join(tmp, f'drive{i}')
+            os.mkdir(drive)
+            build_synthetic_drive(drive, missions, files, noise_per_dir=5)
+            drives.append(drive)
+
+        def per_drive():
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                return dict(zip(drives, executor.map(lambda d: list(iter_flight_entries(d)), drives)))
+
+        def subtree():
+            return SubtreeScanner(max_workers=args.workers, per_drive_limit=args.per_drive).scan(drives)
+
+        with simulated_latency(args.latency):
+            before, old = timed(per_drive, repeat=1)
+            after, new = timed(subtree, repeat=1)
+        assert all(sorted(old[d]) == sorted(new[d]) for d in drives), "scanners disagree"
+        print(f"drives: 1 x {args.big} das folders + {args.small} x 5, {args.latency * 1000:.0f} ms per listing")
+        print(f"one thread per drive:    {before:.3f} s")
+        print(f"work-stealing subtrees:  {after:.3f} s  ({before / after:.1f}x)")
+
+
+def bench_processes(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        drive = os.path.join(tmp, 'drive')
+        os.mkdir(drive)
+        print(f"Building {args.dirs} das folders x {args.files} files in {tmp} ...")
+        build_synthetic_drive(drive, args.dirs, args.files, noise_per_dir=5)
+
+        threads = SubtreeScanner(max_workers=args.workers, per_drive_limit=None)
+        processes = ProcessScanner(max_workers=args.workers, dirs_per_task=1)
+        before, old = timed(threads.scan, [drive], repeat=1)
+        batches_time, batches = timed(processes.scan_batches, [drive], repeat=1)
+        after, new = timed(processes.scan, [drive], repeat=1)
+        assert sorted(old[drive]) == sorted(new[drive]), "thread and process scans disagree"
+        print(f"cores: {os.cpu_count()}, workers: {args.workers}, files: {len(new[drive])}")
+        print(f"thread mode:                     {before:.3f} s")
+        print(f"process mode, compact batches:   {batches_time:.3f} s  ({before / batches_time:.1f}x)")
+        print(f"process mode, expanded entries:  {after:.3f} s  ({before / after:.1f}x)")
+
+
+def synthetic_entries(dirs, files_per_dir):
+    for d in range(dirs):
+        das_dir = os.path.join('Z:/', '!shu_fd', f'mission_{d:05d}', 'raw', 'das')
+        date = f'{d % 28 + 1:02d}1124'
+        plane = str(200 + d % 7)
+        for f in range(files_per_dir):
+            yield FlightEntry(date, plane, os.path.join(das_dir, f'{date}_{plane}.{f:03d}'), 1024 * f, 0.0)
+
+
+def legacy_flight_data(entries, drive_id):
+    """The {"key": {"files": [Path, ...], "total_size": GB}} layout the scanners used before FlightCatalog."""
+    flight_data = {}
+    for entry in entries:
+        key = f"{entry.date}_{entry.plane_number}_{drive_id}"
+        if key not in flight_data:
+            flight_data[key] = {"files": [], "total_size": 0}
+        flight_data[key]["files"].append(Path(entry.path))
+        flight_data[key]["total_size"] += entry.size / (1024 * 1024 * 1024)
+    return flight_data
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def bench_memory(args):
+    count = args.dirs * args.files
+
+    def build_catalog():
+        catalog = FlightCatalog()
+        add_entries(catalog, synthetic_entries(args.dirs, args.files), 61)
+        return catalog
+
+    before, legacy = measure(lambda: legacy_flight_data(synthetic_entries(args.dirs, args.files), 61))
+    del legacy
+    after, catalog = measure(build_catalog)
+    print(f"files: {count} in {args.dirs} das folders")
+    print(f"dict of Path lists:  {before / count:7.1f} bytes/file  ({before / 2**20:.0f} MiB)")
+    print(f"FlightCatalog:       {after / count:7.1f} bytes/file  ({after / 2**20:.0f} MiB, {before / after:.1f}x smaller)")
+
+
+def bench_classify(args):
+    flights = int(args.files * (1 - args.noise))
+    names = [f'{n % 28 + 1:02d}1124_{200 + n % 7}.{n % 1000:03d}' for n in range(flights)]
+    names += [f'notes_{n}.txt' if n % 2 else f'Thumbs{n}.db' for n in range(args.files - flights)]
+    paths = [Path('das', name) for name in names]
+    pattern = re.compile(r'(\d{6})_(\d+)')
+
+    def stem_twice():
+        # What the GUI scanners do: two regex calls on Path.stem per matching file
+        return [(i, pattern.match(p.stem).groups()) for i, p in enumerate(paths) if pattern.match(p.stem)]
+
+    def name_once():
+        return [(i, m.groups()) for i, m in enumerate(map(pattern.match, names)) if m]
+
+    def listing():
+        return DEFAULT_CLASSIFIER.classify_listing(names)
+
+    stem_time, old = timed(stem_twice)
+    once_time, _ = timed(name_once)
+    after, new = timed(listing)
+    assert [(i, n[:2]) for i, n in new] == old, "classifier and regex disagree"
+    print(f"names: {len(names)}, flight files: {len(new)}")
+    print(f"regex twice on Path.stem:  {stem_time:.3f} s")
+    print(f"regex once on the name:    {once_time:.3f} s")
+    print(f"classify_listing:          {after:.3f} s  ({stem_time / after:.1f}x / {once_time / after:.1f}x)")
+
+
+class SimulatedDrive:
+    """
+    A drive that serves `slots` requests at once in `service` seconds each;
+    requests beyond that queue up, so latency grows and throughput does not.
+    """
+
+    def __init__(self, slots, service):
+        self.slots = threading.Semaphore(slots)
+        self.service = service
+
+    def request(self):
+        with self.slots:
+            time.sleep(self.service)
+
+
+def bench_tune(args):
+    drives = {"nas": SimulatedDrive(slots=3, service=0.02), "ssd": SimulatedDrive(slots=12, service=0.004)}
+    jobs = [(name, 1, drive.request) for name, drive in drives.items() for _ in range(args.jobs)]
+
+    def run(policy):
+        tuner = ConcurrencyTuner(policies={"copy": policy}, window=0.2)
+        start = time.perf_counter()
+        run_tuned(jobs, tuner, "copy", max_workers=32)
+        seconds = time.perf_counter() - start
+        # Concurrency and p90 latency (ms) each drive ended on
+        return seconds, {drive: (limit, round((latency or 0) * 1000))
+                         for drive, _, limit, _, latency in tuner.snapshot()}
+
+    print(f"jobs: {args.jobs} per drive; nas serves 3 at 20 ms, ssd 12 at 4 ms")
+    for fixed in (1, 4, 16):
+        seconds, ended = run(TuningPolicy(fixed, fixed, fixed, latency_cap=1.0))
+        print(f"fixed {fixed:2d} per drive:  {seconds:.2f} s  (concurrency, p90 ms: {ended})")
+    seconds, ended = run(TuningPolicy(2, 1, 32, latency_cap=0.03))
+    print(f"tuned:              {seconds:.2f} s  (concurrency, p90 ms: {ended})")
+
+
+def build_record_log(path, flights, segments=3, noise=0):
+    """Write a RECORDS.LOG with <flights> entries, each listing <segments> files and <noise> other settings."""
+    settings = ''.join(f'Channel{k}=gain 1.0, offset 0.0, rate 1000\n' for k in range(noise))
+    with open(path, 'w') as f:
+        for n in range(flights):
+            date, plane = f'{n % 28 + 1:02d}{n % 12 + 1:02d}24', 200 + n % 7
+            for segment in range(segments):
+                f.write(f'[Z:/!shu_fd/das/{date}_{plane}.{segment:03d}]\n')
+            f.write('StartedAt=01.11.2024 10:00:00\n')
+            f.write(f'DataLength={n * 4096}:{segments}\n')
+            f.write('Channels=32\n')
+            f.write(settings)
+            f.write('FinishedAt=01.11.2024 11:30:00\n')
+
+
+def bench_recordlog(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'RECORDS.LOG')
+        build_record_log(path, args.flights)
+        quiet_time, quiet = timed(RecordLogParser.parse, path)
+
+        # Every per-entry diagnostic formatted and written, like the old prints
+        logger = logging.getLogger("record_log")
+        handler = logging.FileHandler(os.devnull)
+        handler.setFormatter(logging.Formatter("%(event)s line %(line)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            traced_time, traced = timed(RecordLogParser.parse, path)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(logging.NOTSET)
+            handler.close()
+        assert quiet.flights == traced.flights, "quiet and traced parses disagree"
+        print(quiet)
+        print(f"DEBUG tracing to a file:  {traced_time:.3f} s")
+        print(f"quiet:                    {quiet_time:.3f} s  ({traced_time / quiet_time:.1f}x)")
+
+
+def bench_recordmap(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'RECORDS.LOG')
+        build_record_log(path, args.flights, noise=args.noise)
+        size = os.path.getsize(path)
+        text_time, text = timed(RecordLogParser.parse, path, repeat=1)
+        mapped_time, mapped = timed(RecordLogParser.parse_mapped, path, repeat=1)
+        assert text.flights == mapped.flights, "text and mapped parses disagree"
+        assert (text.lines, text.malformed) == (mapped.lines, mapped.malformed), "parse statistics disagree"
+        print(f"log: {size / 2**20:.0f} MiB, {text.lines} lines, {len(text.flights)} flights")
+        print(f"text lines:  {text_time:.3f} s  ({size / 2**20 / text_time:.0f} MiB/s)")
+        print(f"mmap bytes:  {mapped_time:.3f} s  ({size / 2**20 / mapped_time:.0f} MiB/s, {text_time / mapped_time:.1f}x)")
+
+
+def bench_recordtail(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'RECORDS.LOG')
+        build_record_log(path, args.flights, noise=10)
+        appended = os.path.join(tmp, 'appended')
+        build_record_log(appended, args.append, noise=10)
+
+        first_time, first = timed(RecordLogParser.parse_tail, path, repeat=1)
+        with open(path, 'ab') as log, open(appended, 'rb') as new:
+            log.write(new.read())
+        full_time, full = timed(RecordLogParser.parse_mapped, path, repeat=1)
+        tail_time, tail = timed(RecordLogParser.parse_tail, path, first.state, repeat=1)
+        quiet_time, quiet = timed(RecordLogParser.parse_tail, path, tail.state)
+        assert first.flights + tail.flights == full.flights, "tail parse lost or repeated flights"
+        assert tail.kept == len(first.flights) and not quiet.flights
+        print(f"log: {os.path.getsize(path) / 2**20:.0f} MiB, {len(full.flights)} flights, "
+              f"{args.append} appended")
+        print(f"full parse:            {full_time:.3f} s")
+        print(f"tail after appending:  {tail_time:.4f} s  ({len(tail.flights)} flights parsed, {len(first.flights)} kept)")
+        print(f"tail, log unchanged:   {quiet_time:.6f} s")
+
+
+def bench_recordparallel(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'RECORDS.LOG')
+        build_record_log(path, args.flights, noise=10)
+        mapped_time, mapped = timed(RecordLogParser.parse_mapped, path, repeat=1)
+        parallel_time, parallel = timed(RecordLogParser.parse_parallel, path, args.workers,
+                                        args.chunk_mib * 2**20, repeat=1)
+        assert mapped.flights == parallel.flights, "parallel parse differs from the sequential one"
+        assert (mapped.lines, mapped.malformed) == (parallel.lines, parallel.malformed)
+        print(f"log: {os.path.getsize(path) / 2**20:.0f} MiB, {len(mapped.flights)} flights, "
+              f"cores: {os.cpu_count()}, workers: {args.workers}")
+        print(f"sequential mmap:  {mapped_time:.3f} s")
+        print(f"process pool:     {parallel_time:.3f} s  ({mapped_time / parallel_time:.1f}x)")
+
+
+@contextmanager
+def simulated_stat_latency(seconds):
+    """Add a round-trip delay to os.stat as well as to directory listings."""
+    real_stat = os.stat
+
+    def slow_stat(path, *args, **kwargs):
+        time.sleep(seconds)
+        return real_stat(path, *args, **kwargs)
+
+    os.stat = slow_stat
+    try:
+        with simulated_latency(seconds):
+            yield
+    finally:
+        os.stat = real_stat
+
+
+def legacy_log_check(drive, records_log):
+    """
+    What new new new.py did: an exists() and a stat() for every file
+    RECORDS.LOG names (with the path stripping fixed - it used to keep the
+    closing bracket, so no file was ever found).
+    """
+    entries = []
+    with open(records_log, 'r') as f:
+        for line in f:
+            if line.startswith('[') and line.endswith(']\n'):
+                file_path = Path(line.strip().strip('[]').replace('D:/', drive))
+                if file_path.exists():
+                    name = DEFAULT_CLASSIFIER.classify(file_path.name)
+                    if name:
+                        st = file_path.stat()
+                        entries.append(FlightEntry(name[0], name[1], str(file_path), st.st_size, st.st_mtime))
+    return entries
+
+
+def bench_reconcile(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        drive = tmp + '/'
+        # Spread over a handful of das folders, like several missions on one drive
+        folders = [f'mission_{m}/das' for m in range(10)]
+        records_log = os.path.join(tmp, 'RECORDS.LOG')
+        with open(records_log, 'w') as log:
+            for n in range(args.flights):
+                folder = folders[n % len(folders)]
+                os.makedirs(os.path.join(tmp, folder), exist_ok=True)
+                base = f'{n % 28 + 1:02d}{n // 28 % 12 + 1:02d}{20 + n // 336:02d}_{200 + n % 7}'
+                for segment in range(args.segments):
+                    log.write(f'[D:/{folder}/{base}.{segment:03d}]\n')
+                    missing = n % 20 == 0
+                    if not missing:
+                        # Every 20th flight is gone, every 25th has a short last file
+                        short = n % 25 == 0 and segment == args.segments - 1
+                        with open(os.path.join(tmp, folder, f'{base}.{segment:03d}'), 'wb') as f:
+                            f.write(b'\0' * (512 if short else 1024))
+                log.write(f'StartedAt=10:00\nDataLength={args.segments * 1024}:{args.segments}\nFinishedAt=11:00\n')
+        for n in range(50):
+            open(os.path.join(tmp, folders[0], f'0101{n:02d}_999.000'), 'wb').close()
+
+        def joined():
+            report = reconcile(RecordLogParser.parse_mapped(records_log).flights, 'D:/', drive)
+            return report, report.entries()
+
+        with simulated_stat_latency(args.latency):
+            before, old = timed(legacy_log_check, drive, records_log, repeat=1)
+            after, (report, new) = timed(joined, repeat=1)
+        assert sorted(old) == sorted(new), "reconciliation and per-file checks found different files"
+        counts = report.counts()
+        print(f"log: {args.flights} flights x {args.segments} files in {len(folders)} folders, "
+              f"{args.latency * 1000:.1f} ms per stat/listing")
+        print(f"found: {counts}")
+        print(f"exists()+stat() per logged file:  {before:.3f} s")
+        print(f"one listing per folder + join:    {after:.3f} s  ({before / after:.1f}x)")
+
+
+def legacy_catalog_queries(catalog, drive_ids, min_bytes):
+    # What the tables do today: split every key, sort the lot, then loop for filters and totals
+    rows = []
+    for key, record in catalog.items():
+        date, plane, drive_id = key.split('_')
+        rows.append((f'20{date[4:6]}{date[2:4]}{date[0:2]}', int(plane), int(drive_id), record.total_bytes, key))
+    rows.sort(key=lambda row: (row[0], row[1]))
+    selected = [row[4] for row in rows if row[2] in drive_ids and row[3] >= min_bytes]
+    per_drive = {}
+    for row in rows:
+        flights, size = per_drive.get(row[2], (0, 0))
+        per_drive[row[2]] = (flights + 1, size + row[3])
+    return selected, per_drive
+
+
+def table_queries(table, drive_ids, min_bytes):
+    by_date = table.sort("date", "plane")
+    selected = by_date.select(drive_ids=drive_ids, min_size=min_bytes)
+    totals = table.totals("drive_id")
+    per_drive = {int(t["drive_id"]): (int(t["flights"]), int(t["size"])) for t in totals}
+    return selected.keys(), per_drive
+
+
+def bench_columns(args):
+    catalog = FlightCatalog()
+    for n in range(args.flights):
+        key = f'{n % 28 + 1:02d}{n // 28 % 12 + 1:02d}{n // 336 % 30:02d}_{n // 10080 % 500}_{n % 12 + 1}'
+        catalog.add(key, f'/drive_{n % 12}/das', f'{key}.000', (n * 7919) % (3 * 1024 ** 3))
+    drive_ids, min_bytes = {2, 5, 7}, 1024 ** 3
+    print(f"catalog: {len(catalog)} flights on 12 drives")
+
+    before, (old_keys, old_totals) = timed(legacy_catalog_queries, catalog, drive_ids, min_bytes)
+    build, table = timed(FlightTable.from_catalog, catalog)
+    after, (new_keys, new_totals) = timed(table_queries, table, drive_ids, min_bytes)
+    assert old_keys == new_keys and old_totals == new_totals, "columnar queries disagree with the dict loops"
+    query, _ = timed(lambda: (table.sort("date", "plane").select(drive_ids=drive_ids, min_size=min_bytes),
+                              table.totals("drive_id")))
+    print(f"split keys + sort + filter + totals:  {before:.3f} s")
+    print(f"build FlightTable once:               {build:.3f} s")
+    print(f"columnar sort + filter + totals:      {after:.3f} s  ({before / after:.1f}x, "
+          f"{len(new_keys)} keys turned back into strings)")
+    print(f"  of which array work only:           {query:.3f} s  ({before / query:.1f}x)")
+
+
+def bench_filter(args):
+    drive_mapping = {f"{chr(ord('E') + n)}:/": 61 + n for n in range(7)}
+    drives = list(drive_mapping)
+    flights = []
+    for n in range(args.flights):
+        date = f'20{20 + n // 336 % 6:02d}{n // 28 % 12 + 1:02d}{n % 28 + 1:02d}'
+        flights.append({
+            'base_filename': f'{date[6:8]}{date[4:6]}{date[2:4]}_{200 + n % 400}_{n}', 'date': date,
+            'plane_number': str(200 + n % 400), 'drive': drives[n % 7],
+            'size': (n * 2654435761) % (8 * 1024 ** 3), 'start_time': None, 'end_time': None,
+        })
+    print(f"flights: {len(flights)}")
+
+    fields = {
+        "plane": lambda f: int(f['plane_number']),
+        "drive_id": lambda f: drive_mapping[f['drive']],
+        "date": lambda f: int(f['date']),
+        "size": lambda f: f['size'],
+    }
+    queries = [
+        ("one plane, one month", dict(plane=[234], date=(20210301, 20210331))),
+        ("two drives, > 4 GB", dict(drive_id=[62, 65], size=(4 * 1024 ** 3, None))),
+        ("one month", dict(date=(20230501, 20230531))),
+    ]
+
+    def scan(conditions):
+        # Looking at every flight, as a filter over flight_data would
+        found = set()
+        for flight in flights:
+            for name, condition in conditions.items():
+                value = fields[name](flight)
+                if isinstance(condition, tuple):
+                    low, high = condition
+                    if (low is not None and value < low) or (high is not None and value > high):
+                        break
+                elif value not in condition:
+                    break
+            else:
+                found.add(flight['base_filename'])
+        return found
+
+    # Each drive's table and indexes are built by the worker that read its log...
+    drive_flights = [flights[n::7] for n in range(7)]
+    build, drive_filters = timed(
+        lambda: [FlightFilter(FlightTable.from_log_flights(part, drive_mapping)) for part in drive_flights], repeat=1)
+    # ... and merged into the window's as each drive finishes
+    index = FlightFilter()
+    merge, _ = timed(lambda: [index.update(drive_filter) for drive_filter in drive_filters], repeat=1)
+    first, _ = timed(lambda: index.query(**queries[0][1]), repeat=1)
+    print(f"build 7 drive tables + indexes: {build:.3f} s  (worker threads)")
+    print(f"merge them as drives finish:    {merge:.3f} s")
+    print(f"first query after the merge:    {first * 1000:.1f} ms")
+    if len(flights) >= 500000:
+        assert first < 0.1, f"first filter query took {first * 1000:.0f} ms over {len(flights)} flights"
+    for label, conditions in queries:
+        before, old = timed(scan, conditions, repeat=1)
+        after, new = timed(lambda: index.query(**conditions))
+        assert old == new, f"{label}: indexed filter disagrees with the scan"
+        print(f"{label:22s} {len(new):6d} flights   scan {before * 1000:7.1f} ms   "
+              f"indexed {after * 1000:6.1f} ms  ({before / after:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    walker = sub.add_parser("walker", help="rglob scan vs scandir walker")
+    walker.add_argument("--dirs", type=int, default=200)
+    walker.add_argument("--files", type=int, default=500)
+    walker.set_defaults(func=bench_walker)
+
+    incremental = sub.add_parser("incremental", help="full scan vs mtime-driven rescan")
+    incremental.add_argument("--dirs", type=int, default=200)
+    incremental.add_argument("--files", type=int, default=500)
+    incremental.set_defaults(func=bench_incremental)
+
+    parallel = sub.add_parser("parallel", help="one thread per drive vs work-stealing subtree scanner")
+    parallel.add_argument("--big", type=int, default=300, help="das folders on the big drive")
+    parallel.add_argument("--small", type=int, default=6, help="number of small drives")
+    parallel.add_argument("--workers", type=int, default=16)
+    parallel.add_argument("--per-drive", type=int, default=8)
+    parallel.add_argument("--latency", type=float, default=0.005)
+    parallel.set_defaults(func=bench_parallel)
+
+    processes = sub.add_parser("processes", help="thread scan vs process-pool scan on huge das folders")
+    processes.add_argument("--dirs", type=int, default=8)
+    processes.add_argument("--files", type=int, default=50000)
+    processes.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    processes.set_defaults(func=bench_processes)
+
+    memory = sub.add_parser("memory", help="memory per file: dict of Paths vs FlightCatalog")
+    memory.add_argument("--dirs", type=int, default=1000)
+    memory.add_argument("--files", type=int, default=1000)
+    memory.set_defaults(func=bench_memory)
+
+    classify = sub.add_parser("classify", help="per-name regex vs batched filename classification")
+    classify.add_argument("--files", type=int, default=100000)
+    classify.add_argument("--noise", type=float, default=0.5, help="fraction of non-flight names")
+    classify.set_defaults(func=bench_classify)
+
+    tune = sub.add_parser("tune", help="fixed vs tuned per-drive concurrency on simulated drives")
+    tune.add_argument("--jobs", type=int, default=1500)
+    tune.set_defaults(func=bench_tune)
+
+    recordlog = sub.add_parser("recordlog", help="RECORDS.LOG parse, quiet vs DEBUG tracing")
+    recordlog.add_argument("--flights", type=int, default=50000)
+    recordlog.set_defaults(func=bench_recordlog)
+
+    recordmap = sub.add_parser("recordmap", help="RECORDS.LOG parse, text lines vs memory-mapped bytes")
+    recordmap.add_argument("--flights", type=int, default=600000)
+    recordmap.add_argument("--noise", type=int, default=10, help="extra setting lines per flight")
+    recordmap.set_defaults(func=bench_recordmap)
+
+    recordtail = sub.add_parser("recordtail", help="RECORDS.LOG full parse vs parsing only the appended tail")
+    recordtail.add_argument("--flights", type=int, default=200000)
+    recordtail.add_argument("--append", type=int, default=100)
+    recordtail.set_defaults(func=bench_recordtail)
+
+    recordparallel = sub.add_parser("recordparallel", help="RECORDS.LOG parse, sequential vs chunked process pool")
+    recordparallel.add_argument("--flights", type=int, default=600000)
+    recordparallel.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    recordparallel.add_argument("--chunk-mib", type=int, default=64)
+    recordparallel.set_defaults(func=bench_recordparallel)
+
+    reconcile_cmd = sub.add_parser("reconcile", help="per-file exists()/stat() vs listing each folder once")
+    reconcile_cmd.add_argument("--flights", type=int, default=2000)
+    reconcile_cmd.add_argument("--segments", type=int, default=5)
+    reconcile_cmd.add_argument("--latency", type=float, default=0.0005)
+    reconcile_cmd.set_defaults(func=bench_reconcile)
+
+    columns = sub.add_parser("columns", help="dict-of-records loops vs NumPy columnar flight table")
+    columns.add_argument("--flights", type=int, default=300000)
+    columns.set_defaults(func=bench_columns)
+
+    filter_cmd = sub.add_parser("filter", help="scan every flight vs indexed filter bar lookups")
+    filter_cmd.add_argument("--flights", type=int, default=500000)
+    filter_cmd.set_defaults(func=bench_filter)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
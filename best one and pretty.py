@@ -1,16 +1,45 @@
 import random
-import shutil
-import re
-from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, font
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import queue
+import threading
 import time
 from datetime import datetime
 from tkinter import PhotoImage
 import os
 
+from drive_config import load_drive_mapping, probe_timeout
+from drive_health import check_drives, describe_drive
+from flight_engine import FlightEngine
+from flight_filter import FlightFilter
+from flight_schema import DEFAULT_CLASSIFIER
+from flight_table import UNKNOWN_DRIVE, FlightTable
+from reconcile import MISSING, ORPHANED, PRESENT, SIZE_MISMATCH
+from ui_channel import UiChannel
+from virtual_table import VirtualTable
+
+# Milliseconds the filter bar waits after the last keystroke before filtering
+FILTER_DELAY_MS = 250
+
+
+def filter_date(text):
+    """DD/MM/YY (or DD/MM/YYYY, DD.MM.YY) from the filter bar as the YYYYMMDD of FlightTable's date column."""
+    parts = text.replace('.', '/').split('/')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    day, month, year = (int(part) for part in parts)
+    return (2000 + year % 100) * 10000 + month * 100 + day
+
+
+def filter_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
 class ModernTheme:
     # Color scheme
     PRIMARY = "#2C3E50"  # Dark blue-gray
@@ -131,91 +160,6 @@ class DeleteButton(ModernButton):
     def on_leave(self, e):
         self['background'] = ModernTheme.ACCENT
 
-class RecordLogParser:
-    @staticmethod
-    def parse_log_file(log_path):
-        flights = []
-        current_flight = None
-        line_number = 0
-        
-        print(f"\n=== Starting to parse log file: {log_path} ===")
-        
-        try:
-            with open(log_path, 'r') as f:
-                for line in f:
-                    line_number += 1
-                    line = line.strip()
-                    
-                    # Debug output for every 1000 lines
-                    if line_number % 1000 == 0:
-                        print(f"Processing line {line_number}")
-                    
-                    # Check for new flight entry
-                    if line.startswith('[') and line.endswith('.000]'):
-                        print(f"\nFound potential flight entry at line {line_number}: {line}")
-                        
-                        # Extract flight info from path
-                        flight_path = line[1:-1] 
-                        dir_name = os.path.dirname(flight_path)
-                        file_name = os.path.basename(flight_path)
-                        
-                        # Parse flight details
-                        match = re.match(r'(\d{2})(\d{2})(\d{2})_(\d{3})\.000', file_name)
-                        if match:
-                            day, month, year, plane = match.groups()
-                            
-                            current_flight = {
-                                'date': f'20{year}{month}{day}',
-                                'plane_number': plane,
-                                'base_path': dir_name,
-                                'base_filename': file_name[:-4],  
-                                'size': 0,
-                                'start_time': None,
-                                'end_time': None
-                            }
-                            print(f"Successfully parsed flight details: {current_flight}")
-                        else:
-                            print(f"Warning: Could not parse flight details from filename: {file_name}")
-                    
-                    # Get start time
-                    elif line.startswith('StartedAt=') and current_flight:
-                        time_str = line.split('=')[1]
-                        current_flight['start_time'] = time_str
-                        print(f"Found start time: {time_str}")
-                    
-                    # Get end time and add flight to list
-                    elif line.startswith('FinishedAt=') and current_flight:
-                        time_str = line.split('=')[1]
-                        current_flight['end_time'] = time_str
-                        print(f"Found end time: {time_str}")
-                        flights.append(current_flight)
-                        print(f"Added flight to list. Total flights so far: {len(flights)}")
-                        current_flight = None
-                    
-                    # Get data length
-                    elif line.startswith('DataLength=') and current_flight:
-                        try:
-                            size_str = line.split('=')[1].split(':')[0]
-                            current_flight['size'] = int(size_str)
-                            print(f"Found data length: {size_str}")
-                        except (IndexError, ValueError) as e:
-                            print(f"Warning: Could not parse data length from line: {line}")
-                            print(f"Error: {str(e)}")
-                            current_flight['size'] = 0
-        
-        except Exception as e:
-            print(f"\nError while parsing log file:")
-            print(f"Last line processed: {line_number}")
-            print(f"Error details: {str(e)}")
-            import traceback
-            print("Full traceback:")
-            print(traceback.format_exc())
-            return []
-            
-        print(f"\n=== Finished parsing log file ===")
-        print(f"Total flights found: {len(flights)}")
-        return flights
-
 class DriveSelector(tk.Toplevel):
     def __init__(self, parent, drive_mapping):
         super().__init__(parent)
@@ -243,6 +187,7 @@ class DriveSelector(tk.Toplevel):
         content_frame.pack(fill="both", expand=True, padx=30)
         
         self.check_vars = {}
+        self.status_labels = {}
         
         # Create checkbuttons with modern styling
         for drive_path, drive_id in sorted(drive_mapping.items(), key=lambda x: x[1]):
@@ -267,6 +212,21 @@ class DriveSelector(tk.Toplevel):
                 fg=ModernTheme.TEXT_SECONDARY,
                 bg=ModernTheme.BACKGROUND
             ).pack(side="left", padx=5)
+            
+            self.status_labels[drive_path] = tk.Label(
+                frame,
+                text="checking...",
+                font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+                fg=ModernTheme.TEXT_SECONDARY,
+                bg=ModernTheme.BACKGROUND
+            )
+            self.status_labels[drive_path].pack(side="right")
+        
+        # Every drive is probed at once; answers show up as they come in
+        self.statuses = {}
+        self.probe_results = queue.Queue()
+        threading.Thread(target=self.probe_drives, args=(list(drive_mapping),), daemon=True).start()
+        self._poll_job = self.after(50, self.show_probe_results)
         
         # Button frame
         btn_frame = tk.Frame(self, bg=ModernTheme.BACKGROUND, pady=20)
@@ -293,9 +253,39 @@ class DriveSelector(tk.Toplevel):
         self.transient(parent)
         self.grab_set()
 
+    def probe_drives(self, drives):
+        # Runs on its own thread, show_probe_results picks the answers up on the Tk thread
+        for status in check_drives(drives, probe_timeout()):
+            self.probe_results.put(status)
+
+    def show_probe_results(self):
+        while True:
+            try:
+                status = self.probe_results.get_nowait()
+            except queue.Empty:
+                break
+            self.statuses[status.drive] = status
+            reachable = status.answered and status.error is None
+            self.status_labels[status.drive].config(
+                text=describe_drive(status),
+                fg=ModernTheme.SUCCESS if reachable else ModernTheme.ACCENT
+            )
+        self._poll_job = self.after(50, self.show_probe_results) if len(self.statuses) < len(self.status_labels) else None
+
+    def reachable(self, drive):
+        """False once a probe found drive unreachable, True otherwise (also while it is still being probed)."""
+        status = self.statuses.get(drive)
+        return status is None or (status.answered and status.error is None)
+
+    def destroy(self):
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+        super().destroy()
+
     def select_all(self):
-        for var in self.check_vars.values():
-            var.set(True)
+        for drive, var in self.check_vars.items():
+            var.set(self.reachable(drive))
     
     def clear_all(self):
         for var in self.check_vars.values():
@@ -311,16 +301,30 @@ class DriveSelector(tk.Toplevel):
 class FlightFileManager:
     def __init__(self, root):
         self.root = root
-        self.drive_mapping = {
+        # Worker threads reach the window only through this, never through Tk directly
+        self.ui = UiChannel(self.root)
+        self.ui.start()
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "C:/": 61, "Y:/": 62, "X:/": 63, "W:/": 64,
             "V:/": 65, "U:/": 66, "T:/": 67,
-        }
+        })
         self.flight_data = {}
+        # RECORDS.LOG parsing happens in the engine (flight_cli.py runs the same one)
+        self.engine = FlightEngine(self.drive_mapping)
+        self.index = self.engine.index
+        # Pending filter bar update, so typing only filters once it pauses
+        self._filter_job = None
         self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        # RECORDS.LOG parses in flight at once, one per drive
+        self.log_scan_workers = 4
+        # Processes splitting one big log between them; 1 parses in this process
+        self.log_parse_workers = os.cpu_count() or 1
         
         # Configure modern theme
         ModernTheme.configure_styles()
         self.init_gui()
+        self.root.after(100, self.load_cached_flights)
 
     def init_gui(self):
         self.root.title("Flight File Manager")
@@ -349,21 +353,68 @@ class FlightFileManager:
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
+        # Filter bar: narrows the table through self.flight_filter, never rescans
+        filter_frame = tk.Frame(self.root, bg=ModernTheme.BACKGROUND)
+        filter_frame.pack(fill="x", padx=20, pady=(15, 0))
+        
+        self.filter_vars = {}
+        filter_fields = [
+            ("plane", "Aircraft"), ("date_from", "From (DD/MM/YY)"), ("date_to", "To"),
+            ("id", "Drive ID"), ("min_gb", "Min GB"), ("max_gb", "Max GB"),
+        ]
+        for name, label in filter_fields:
+            tk.Label(
+                filter_frame,
+                text=label,
+                font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+                fg=ModernTheme.TEXT_SECONDARY,
+                bg=ModernTheme.BACKGROUND
+            ).pack(side="left", padx=(10, 3))
+            var = self.filter_vars[name] = tk.StringVar()
+            ttk.Entry(filter_frame, textvariable=var, width=10).pack(side="left")
+            var.trace_add("write", self.schedule_filter)
+        
+        ModernButton(
+            filter_frame,
+            text="Clear",
+            command=self.clear_filter
+        ).pack(side="left", padx=10)
+        
+        self.filter_label = tk.Label(
+            filter_frame,
+            text="",
+            font=(ModernTheme.FONT_FAMILY, ModernTheme.FONT_SIZE_SMALL),
+            fg=ModernTheme.TEXT_SECONDARY,
+            bg=ModernTheme.BACKGROUND
+        )
+        self.filter_label.pack(side="left")
+        
         # Main content frame
         content_frame = tk.Frame(self.root, bg=ModernTheme.BACKGROUND)
         content_frame.pack(fill="both", expand=True, padx=20, pady=20)
         
-        # Treeview with modern styling
-        # Treeview with modern styling
-        self.table = ttk.Treeview(
+        # The flights as a FlightTable; its column indexes back sorting, filtering and totals
+        self.flight_filter = FlightFilter()
+        table_columns = {"date": "date", "plane": "plane", "id": "drive_id",
+                         "start_time": "start", "end_time": "end", "size": "size"}
+        
+        # Only the rows in view exist as Treeview items, the rest stay in flight_data
+        self.table = VirtualTable(
             content_frame,
-            columns=("date", "plane", "id", "start_time", "end_time", "size"),
+            columns=tuple(table_columns),
+            row_values=self.flight_row,
+            row_tags=lambda key: (self.flight_data[key].get('status', PRESENT),),
+            sort_orders={column: lambda name=name: self.flight_filter.order(name)
+                         for column, name in table_columns.items()},
             show='headings',
             style="Custom.Treeview"
         )
         
         # Override default style for headers
         self.table.tag_configure('header', background=ModernTheme.TABLE_HEADER_BG, foreground="white")
+        # Flights the disk check could not find, or found at a different size than DataLength
+        self.table.tag_configure(MISSING, foreground=ModernTheme.ACCENT)
+        self.table.tag_configure(SIZE_MISMATCH, foreground=ModernTheme.WARNING)
         
         # Configure columns
         column_config = {
@@ -380,14 +431,12 @@ class FlightFileManager:
             self.table.column(col, width=width, anchor="center")
 
         
-        # Add scrollbars
-        y_scrollbar = ttk.Scrollbar(content_frame, orient="vertical", command=self.table.yview)
-        x_scrollbar = ttk.Scrollbar(content_frame, orient="horizontal", command=self.table.xview)
-        self.table.configure(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
+        # The table brings its own vertical scrollbar, sized to every row
+        x_scrollbar = ttk.Scrollbar(content_frame, orient="horizontal", command=self.table.tree.xview)
+        self.table.tree.configure(xscrollcommand=x_scrollbar.set)
         
         # Grid layout for table and scrollbars
         self.table.grid(row=0, column=0, sticky="nsew")
-        y_scrollbar.grid(row=0, column=1, sticky="ns")
         x_scrollbar.grid(row=1, column=0, sticky="ew")
         
         content_frame.grid_columnconfigure(0, weight=1)
@@ -456,187 +505,237 @@ class FlightFileManager:
 
     async def scan_record_logs(self, selected_drives):
         start_time = time.time()
-        flight_data = {}
+        # Parses run on worker threads, at most log_scan_workers drives at a time
+        limit = asyncio.Semaphore(self.log_scan_workers)
 
-        for drive in selected_drives:
-            # Try both the root directory and the expected subdirectory
-            possible_paths = [
-                Path(drive) / '!shu_fd' / 'das' / 'RECORDS.LOG',
-                Path(drive) / '!shu_fd' / 'das' / 'RECORDS',  
-            ]
-            
-            log_found = False
-            for log_path in possible_paths:
-                try:
-                    if log_path.exists():
-                        print(f"Found log file at: {log_path}")  # Debug 
-                        flights = RecordLogParser.parse_log_file(str(log_path))
-                        for flight in flights:
-                            # Use the base_filename directly as the key
-                            key = flight['base_filename']
-                            flight_data[key] = {
-                                'base_path': flight['base_path'],
-                                'base_filename': flight['base_filename'],
-                                'size': flight['size'],
-                                'start_time': flight['start_time'],
-                                'end_time': flight['end_time'],
-                                'drive': drive
-                            }
-                        log_found = True
-                        print(f"Successfully processed {len(flights)} flights from {log_path}")  # Debug print
-                        break
-                except Exception as e:
-                    print(f"Error processing log file {log_path}: {str(e)}")
-            
-            if not log_found:
-                print(f"No valid RECORD.LOG found in any of the expected locations for drive {drive}")
+        async def scan_one(drive):
+            async with limit:
+                await asyncio.to_thread(self.scan_drive_log, drive)
+                return await asyncio.to_thread(self.check_drive_flights, drive)
+
+        tasks = [asyncio.ensure_future(scan_one(drive)) for drive in selected_drives]
+        for done, finished in enumerate(asyncio.as_completed(tasks), 1):
+            drive_data, drive_filter = await finished
+            self.ui.call(self.merge_drive_flights, drive_data, drive_filter, done / len(tasks) * 100)
 
         end_time = time.time()
         print(f"Log scan completed in {end_time - start_time:.2f} seconds")
+
+    def scan_drive_log(self, drive):
+        # Only what the recorder appended since the last scan is parsed
+        try:
+            result = self.engine.scan_log(drive, workers=self.log_parse_workers)
+        except Exception as e:
+            print(f"Error processing log file on drive {drive}: {str(e)}")
+            return
+        if result is None:
+            print(f"No valid RECORD.LOG found in any of the expected locations for drive {drive}")
+        elif not result.ok:
+            # The engine keeps what the index has for this drive rather than wiping it
+            print(f"Could not parse {result.path}: {result.error}")
+
+    def check_drive_flights(self, drive):
+        flights = self.index.load_log_flights([drive])
+        # DataLength is what the recorder meant to write; one listing per
+        # folder the log refers to shows what is actually on the drive
+        report = self.engine.reconcile_log(drive)
+        counts = report.counts()
+        if counts[MISSING] or counts[SIZE_MISMATCH] or counts[ORPHANED]:
+            print(f"{drive}: {report}")
+        drive_data = self.build_flight_data(flights)
+        for name, status in report.status_by_name().items():
+            drive_data[name]['status'] = status
+        # The columns of these flights and their indexes are built here, off the Tk thread
+        return drive_data, FlightFilter(self.flight_table(drive_data))
+
+    def merge_drive_flights(self, drive_data, drive_filter, progress):
+        self.flight_data.update(drive_data)
+        self.insert_flight_rows(drive_data, drive_filter)
+        self.progress_var.set(progress)
+
+    def build_flight_data(self, flights):
+        flight_data = {}
+        for flight in flights:
+            # Use the base_filename directly as the key
+            key = flight['base_filename']
+            flight_data[key] = {
+                'base_path': flight['base_path'],
+                'base_filename': flight['base_filename'],
+                'size': flight['size'],
+                'start_time': flight['start_time'],
+                'end_time': flight['end_time'],
+                'drive': flight['drive'],
+                'date': flight['date'],
+                'plane_number': flight['plane_number']
+            }
         return flight_data
 
+    def flight_table(self, flight_data):
+        """A FlightTable of the flights in flight_data the table shows."""
+        keys = [key for key in flight_data if DEFAULT_CLASSIFIER.classify(key)]
+        return FlightTable.from_log_flights([flight_data[key] for key in keys], self.drive_mapping)
+
+    def load_cached_flights(self):
+        self.flight_data = self.build_flight_data(self.index.load_log_flights())
+        self.display_flights()
+
     def load_files(self, selected_drives):
         self.status_label.config(text="Loading files...")
         self.progress_var.set(0)
-        self.table.delete(*self.table.get_children())
-        
+        self.flight_data = {}
+        self.flight_filter.clear()
+        self.table.clear()
+
         async def process_logs():
-            self.flight_data = await self.scan_record_logs(selected_drives)
-            self.root.after(0, self.display_flights)
+            # Each drive's rows are added as soon as that drive is done
+            await self.scan_record_logs(selected_drives)
+            self.ui.post("status", self.status_label.config, {"text": "Ready"})
 
-        asyncio.run(process_logs())
+        # The event loop gets its own thread so Tk keeps drawing the progress
+        threading.Thread(target=asyncio.run, args=(process_logs(),), daemon=True).start()
 
     def display_flights(self):
-        for key, data in self.flight_data.items():
-            # Parse the key directly
-            match = re.match(r'(\d{6})_(\d{3})', key)
-            if match:
-                date_part, plane_number = match.groups()
-                # Convert to DD/MM/YY format
-                formatted_date = f"{date_part[0:2]}/{date_part[2:4]}/20{date_part[4:6]}"
-                size_gb = data['size'] / (1024 * 1024 * 1024)
-                
-                self.table.insert("", "end", values=(
-                    formatted_date,
-                    plane_number,
-                    self.drive_mapping.get(data['drive'], 'Unknown'),
-                    data['start_time'],
-                    data['end_time'],
-                    f"{size_gb:.2f} GB"
-                ))
-        
+        self.flight_filter.set_table(self.flight_table(self.flight_data))
+        self.table.set_keys(self.flight_filter.table.keys())
+        self.apply_filter()
         self.status_label.config(text="Ready")
 
+    def insert_flight_rows(self, flight_data, flight_filter):
+        # Rows are drawn by the table as they scroll into view
+        self.flight_filter.update(flight_filter)
+        self.table.append(flight_filter.table.keys())
+        self.apply_filter()
+
+    def remove_flight_rows(self, keys):
+        self.flight_filter.remove(keys)
+        self.table.remove(keys)
+        self.apply_filter()
+
+    def schedule_filter(self, *args):
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_job = None
+        rows = self.flight_filter.rows(**self.read_filter())
+        flights = self.flight_filter.table
+        self.table.set_filter(None if rows is None else set(flights.keys_of(rows)))
+        self.filter_label.config(text=self.describe_flights(flights if rows is None else flights.take(rows)))
+
+    def describe_flights(self, shown):
+        """Flight count and size of the shown FlightTable, in total and per drive."""
+        if not len(self.flight_filter):
+            return ""
+        gb = 1024 * 1024 * 1024
+        text = f"{len(shown)}"
+        if len(shown) != len(self.flight_filter):
+            text += f" of {len(self.flight_filter)}"
+        text += f" flights, {shown['size'].sum() / gb:.1f} GB"
+        per_drive = ", ".join(
+            f"{'Unknown' if total['drive_id'] == UNKNOWN_DRIVE else total['drive_id']}: "
+            f"{total['flights']} / {total['size'] / gb:.1f} GB"
+            for total in shown.totals("drive_id"))
+        return f"{text} ({per_drive})" if per_drive else text
+
+    def clear_filter(self):
+        for var in self.filter_vars.values():
+            var.set("")
+
+    def read_filter(self):
+        """The filter bar as FlightFilter.rows() conditions; a field that does not parse is left out."""
+        text = {name: var.get().strip() for name, var in self.filter_vars.items()}
+        conditions = {}
+        for name, column in (("plane", "plane"), ("id", "drive_id")):
+            numbers = [int(part) for part in text[name].replace(',', ' ').split() if part.isdigit()]
+            if numbers:
+                conditions[column] = numbers
+        date_from, date_to = filter_date(text['date_from']), filter_date(text['date_to'])
+        if date_from is not None or date_to is not None:
+            conditions['date'] = (date_from, date_to)
+        min_gb, max_gb = filter_number(text['min_gb']), filter_number(text['max_gb'])
+        if min_gb is not None or max_gb is not None:
+            gb = 1024 * 1024 * 1024
+            conditions['size'] = (None if min_gb is None else min_gb * gb, None if max_gb is None else max_gb * gb)
+        return conditions
 
-    def get_flight_files(self, flight_key):
+    def flight_row(self, key):
+        data = self.flight_data[key]
+        date_part, plane_number, _ = DEFAULT_CLASSIFIER.classify(key)
+        # Convert to DD/MM/YY format
+        formatted_date = f"{date_part[0:2]}/{date_part[2:4]}/20{date_part[4:6]}"
+        size_gb = (data['size'] or 0) / (1024 * 1024 * 1024)
+        return (
+            formatted_date,
+            plane_number,
+            self.drive_mapping.get(data['drive'], 'Unknown'),
+            data['start_time'],
+            data['end_time'],
+            f"{size_gb:.2f} GB"
+        )
+
+    def selected_flights(self):
+        """(base_filename, drive) of each selected flight, read on the Tk thread for the workers."""
+        return [(key, self.flight_data[key]['drive']) for key in self.table.selection() if key in self.flight_data]
+
+    def flight_files(self, flights):
         """
-        Get all related files for a given flight key.
-        
-        Args:
-        flight_key (str): Full key with format 'DDMMYYYY_PlaneNumber_StationID'
-        
-        Returns:
-        List of Path objects for matching files
+        (drive, FlightEntry) for every file of the (base_filename, drive)
+        flights that is on disk, from one engine.reconcile_log() per drive:
+        the same match the status column shows, one listing per das folder.
         """
-        try:
-            # Split the full key and extract just the date and plane number
-            # Example: '27112024_200_61' -> '271124_200'
-            parts = flight_key.split('_')
-            if len(parts) < 2:
-                print(f"Invalid flight key format: {flight_key}")
-                return []
-            
-            # Format date from DDMMYYYY to DDMMYY
-            date_formatted = parts[0][0:2] + parts[0][2:4] + parts[0][6:8]
-            simplified_key = f"{date_formatted}_{parts[1]}"
-            
-            # Construct the base path
-            base_path = Path("C:/!shu_fd/das")
-            
-            # Verbose logging to help diagnose issues
-            print(f"Searching for files:")
-            print(f"Original flight key: {flight_key}")
-            print(f"Simplified search key: {simplified_key}")
-            print(f"Base path: {base_path}")
-            
-            # Use glob to find files that start with the simplified key
-            matching_files = list(base_path.glob(f"{simplified_key}*"))
-            
-            print(f"Found {len(matching_files)} matching files:")
-            for file in matching_files:
-                print(f" - {file}")
-            
-            return matching_files
-        
-        except Exception as e:
-            print(f"Error in get_flight_files: {str(e)}")
-            return []
+        by_drive = {}
+        for name, drive in flights:
+            by_drive.setdefault(drive, set()).add(name)
+        files = []
+        for drive, names in by_drive.items():
+            report = self.engine.reconcile_log(drive)
+            files.extend((drive, entry) for check in report.checks if check.flight['base_filename'] in names
+                         for entry in check.files)
+        # Two log flights with the same date and plane share their files
+        return list(dict.fromkeys(files))
 
+    def file_reporter(self, verb, title, total):
+        """An engine on_file callback showing how many of total files are done, and each one that failed."""
+        done = []
+
+        def on_file(file, error):
+            done.append(file)
+            if error is not None:
+                print(f"Error {verb.lower()} {file}: {str(error)}")
+                self.ui.call(messagebox.showerror, title, f"Error {verb.lower()} file {file}: {str(error)}")
+            self.ui.post("progress", self.progress_var.set, len(done) / total * 100)
+            self.ui.post("status", self.status_label.config, {"text": f"{verb} files... ({len(done)}/{total})"})
+
+        return on_file
 
     def copy_files(self):
         """
         Copy selected flight files to a chosen destination directory.
         """
-        selected = self.table.selection()
-        if not selected:
+        flights = self.selected_flights()
+        if not flights:
             messagebox.showwarning("No Selection", "Please select a flight to copy.")
             return
         
         dest_dir = filedialog.askdirectory(title="Select Destination")
         if not dest_dir:
             return
-            
-        dest_path = Path(dest_dir)
-        total_files = 0
-        copied_files = 0
         
         self.status_label.config(text="Copying files...")
         self.progress_var.set(0)
         
         def copy_task():
-            nonlocal total_files, copied_files
-            
             try:
-                # First pass: count total files
-                for item in selected:
-                    values = self.table.item(item, 'values')
-                    if values:
-                        date = values[0].replace("/", "")  # Convert DD/MM/YYYY to DDMMYYYY
-                        plane_number = values[1]
-                        drive_id = values[2]
-                        key = f"{date}_{plane_number}_{drive_id}"
-                        
-                        files = self.get_flight_files(key)
-                        total_files += len(files)
-                
-                # Second pass: copy files
-                for item in selected:
-                    values = self.table.item(item, 'values')
-                    if values:
-                        date = values[0].replace("/", "")
-                        plane_number = values[1]
-                        drive_id = values[2]
-                        key = f"{date}_{plane_number}_{drive_id}"
-                        
-                        files = self.get_flight_files(key)
-                        for file in files:
-                            try:
-                                shutil.copy2(file, dest_path / file.name)
-                                copied_files += 1
-                                progress = (copied_files / total_files) * 100
-                                self.root.after(0, self.progress_var.set, progress)
-                                self.root.after(0, self.status_label.config, 
-                                              {"text": f"Copying files... ({copied_files}/{total_files})"})
-                            except Exception as e:
-                                print(f"Error copying {file}: {str(e)}")
-                                self.root.after(0, messagebox.showerror, "Copy Error", 
-                                              f"Error copying file {file}: {str(e)}")
-                
-                self.root.after(0, messagebox.showinfo, "Copy Complete", 
-                              f"Successfully copied {copied_files} out of {total_files} files.")
+                files = self.flight_files(flights)
+                # As many copies per drive at once as the engine's tuner allows
+                copied = self.engine.copy_files([(drive, entry.path, entry.size) for drive, entry in files], dest_dir,
+                                                self.file_reporter("Copying", "Copy Error", len(files)))
+                self.ui.call(messagebox.showinfo, "Copy Complete", 
+                             f"Successfully copied {copied} out of {len(files)} files.")
             finally:
-                self.root.after(0, self.status_label.config, {"text": "Ready"})
-                self.root.after(0, self.progress_var.set, 0)
+                self.ui.post("status", self.status_label.config, {"text": "Ready"})
+                self.ui.post("progress", self.progress_var.set, 0)
         
         self.executor.submit(copy_task)
 
@@ -644,67 +743,36 @@ class FlightFileManager:
         """
         Delete selected flight files.
         """
-        selected = self.table.selection()
-        if not selected:
+        flights = self.selected_flights()
+        if not flights:
             messagebox.showwarning("No Selection", "Please select a flight to delete.")
             return
         
-        # Count total files before asking for confirmation
-        total_files = 0
-        for item in selected:
-            values = self.table.item(item, 'values')
-            if values:
-                date = values[0].replace("/", "")
-                plane_number = values[1]
-                drive_id = values[2]
-                key = f"{date}_{plane_number}_{drive_id}"
-                files = self.get_flight_files(key)
-                total_files += len(files)
-        
         confirm = messagebox.askyesno("Confirm Deletion", 
-                                    f"Are you sure you want to delete {total_files} files?")
+                                    f"Are you sure you want to delete the files of {len(flights)} flights?")
         if not confirm:
             return
         
         self.status_label.config(text="Deleting files...")
         self.progress_var.set(0)
-        deleted_files = 0
+        keys = [key for key, _ in flights]
         
         def delete_task():
-            nonlocal deleted_files
-            
             try:
-                for item in selected:
-                    values = self.table.item(item, 'values')
-                    if values:
-                        date = values[0].replace("/", "")
-                        plane_number = values[1]
-                        drive_id = values[2]
-                        key = f"{date}_{plane_number}_{drive_id}"
-                        
-                        files = self.get_flight_files(key)
-                        for file in files:
-                            try:
-                                os.remove(file)
-                                deleted_files += 1
-                                progress = (deleted_files / total_files) * 100
-                                self.root.after(0, self.progress_var.set, progress)
-                                self.root.after(0, self.status_label.config, 
-                                              {"text": f"Deleting files... ({deleted_files}/{total_files})"})
-                            except Exception as e:
-                                print(f"Error deleting {file}: {str(e)}")
-                                self.root.after(0, messagebox.showerror, "Deletion Error", 
-                                              f"Error deleting file {file}: {str(e)}")
+                files = self.flight_files(flights)
+                # The engine also drops the files from the index
+                deleted = self.engine.delete_files(
+                    [(os.path.dirname(entry.path), os.path.basename(entry.path)) for _, entry in files],
+                    self.file_reporter("Deleting", "Deletion Error", len(files)))
                 
                 # Remove deleted items from the table
-                for item in selected:
-                    self.table.delete(item)
+                self.ui.call(self.remove_flight_rows, keys)
                 
-                self.root.after(0, messagebox.showinfo, "Deletion Complete", 
-                              f"Successfully deleted {deleted_files} out of {total_files} files.")
+                self.ui.call(messagebox.showinfo, "Deletion Complete", 
+                             f"Successfully deleted {deleted} out of {len(files)} files.")
             finally:
-                self.root.after(0, self.status_label.config, {"text": "Ready"})
-                self.root.after(0, self.progress_var.set, 0)
+                self.ui.post("status", self.status_label.config, {"text": "Ready"})
+                self.ui.post("progress", self.progress_var.set, 0)
         
         self.executor.submit(delete_task)
 
@@ -1,68 +1,22 @@
 import os
 import random
 import shutil
-import re
 from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, font
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import queue
+import threading
 import time
 from datetime import datetime
 
-class RecordLogParser:
-    @staticmethod
-    def parse_log_file(log_path):
-        flights = []
-        current_flight = None
-        
-        with open(log_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                
-                # Check for new flight entry
-                if line.startswith('[') and line.endswith('.000]'):
-                    # Extract flight info from path
-                    flight_path = line[1:-1] 
-                    dir_name = os.path.dirname(flight_path)
-                    file_name = os.path.basename(flight_path)
-                    
-                    # Parse flight details
-                    match = re.match(r'(\d{2})(\d{2})(\d{2})_(\d+)\.000', file_name)
-                    if match:
-                        day, month, year, plane = match.groups()
-                        
-                        current_flight = {
-                            'date': f'20{year}{month}{day}',
-                            'plane_number': plane,
-                            'base_path': dir_name,
-                            'base_filename': file_name[:-4],  
-                            'size': 0,
-                            'start_time': None,
-                            'end_time': None
-                        }
-                
-                # Get start time
-                elif line.startswith('StartedAt=') and current_flight:
-                    time_str = line.split('=')[1]
-                    current_flight['start_time'] = time_str
-                
-                # Get end time and add flight to list
-                elif line.startswith('FinishedAt=') and current_flight:
-                    time_str = line.split('=')[1]
-                    current_flight['end_time'] = time_str
-                    flights.append(current_flight)
-                    current_flight = None
-                
-                # Get data length
-                elif line.startswith('DataLength=') and current_flight:
-                    try:
-                        size_str = line.split('=')[1].split(':')[0]
-                        current_flight['size'] = int(size_str)
-                    except (IndexError, ValueError):
-                        current_flight['size'] = 0
-        
-        return flights
+from drive_config import load_drive_mapping, probe_timeout
+from drive_health import check_drives, describe_drive
+from flight_index import FlightIndex
+from flight_schema import DEFAULT_CLASSIFIER
+from record_log import RecordLogParser
+from ui_channel import UiChannel
 
 class DriveSelector(tk.Toplevel):
     def __init__(self, parent, drive_mapping):
@@ -80,15 +34,26 @@ class DriveSelector(tk.Toplevel):
         
         self.check_vars = {}
         
+        self.status_labels = {}
         for drive_path, drive_id in sorted(drive_mapping.items(), key=lambda x: x[1]):
             var = tk.BooleanVar()
             self.check_vars[drive_path] = var
+            row = tk.Frame(self.check_frame)
+            row.pack(fill="x", pady=5)
             cb = ttk.Checkbutton(
-                self.check_frame, 
+                row, 
                 text=f"Drive ID {drive_id} ({drive_path})", 
                 variable=var
             )
-            cb.pack(anchor="w", pady=5)
+            cb.pack(side="left")
+            self.status_labels[drive_path] = tk.Label(row, text="checking...", fg="gray")
+            self.status_labels[drive_path].pack(side="right")
+        
+        # Every drive is probed at once; answers show up as they come in
+        self.statuses = {}
+        self.probe_results = queue.Queue()
+        threading.Thread(target=self.probe_drives, args=(list(drive_mapping),), daemon=True).start()
+        self._poll_job = self.after(50, self.show_probe_results)
         
         btn_frame = tk.Frame(self)
         btn_frame.pack(fill="x", pady=10)
@@ -100,9 +65,36 @@ class DriveSelector(tk.Toplevel):
         self.transient(parent)
         self.grab_set()
         
+    def probe_drives(self, drives):
+        # Runs on its own thread, show_probe_results picks the answers up on the Tk thread
+        for status in check_drives(drives, probe_timeout()):
+            self.probe_results.put(status)
+
+    def show_probe_results(self):
+        while True:
+            try:
+                status = self.probe_results.get_nowait()
+            except queue.Empty:
+                break
+            self.statuses[status.drive] = status
+            reachable = status.answered and status.error is None
+            self.status_labels[status.drive].config(text=describe_drive(status), fg="green" if reachable else "red")
+        self._poll_job = self.after(50, self.show_probe_results) if len(self.statuses) < len(self.status_labels) else None
+
+    def reachable(self, drive):
+        """False once a probe found drive unreachable, True otherwise (also while it is still being probed)."""
+        status = self.statuses.get(drive)
+        return status is None or (status.answered and status.error is None)
+
+    def destroy(self):
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+        super().destroy()
+
     def select_all(self):
-        for var in self.check_vars.values():
-            var.set(True)
+        for drive, var in self.check_vars.items():
+            var.set(self.reachable(drive))
     
     def clear_all(self):
         for var in self.check_vars.values():
@@ -118,13 +110,23 @@ class DriveSelector(tk.Toplevel):
 class FlightFileManager:
     def __init__(self, root):
         self.root = root
-        self.drive_mapping = {
+        # Worker threads reach the window only through this, never through Tk directly
+        self.ui = UiChannel(self.root)
+        self.ui.start()
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "C:/": 61, "Y:/": 62, "X:/": 63, "W:/": 64,
             "V:/": 65, "U:/": 66, "T:/": 67,
-        }
+        })
         self.flight_data = {}
+        self.index = FlightIndex()
         self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        # RECORDS.LOG parses in flight at once, one per drive
+        self.log_scan_workers = 4
+        # Processes splitting one big log between them; 1 parses in this process
+        self.log_parse_workers = os.cpu_count() or 1
         self.init_gui()
+        self.root.after(100, self.load_cached_flights)
 
     def init_gui(self):
         self.root.title("Flight File Manager by Danny Karp")
@@ -199,43 +201,82 @@ class FlightFileManager:
 
     async def scan_record_logs(self, selected_drives):
         start_time = time.time()
-        flight_data = {}
+        # Parses run on worker threads, at most log_scan_workers drives at a time
+        limit = asyncio.Semaphore(self.log_scan_workers)
 
-        for drive in selected_drives:
-            log_path = Path(drive) / '!shu_fd' / 'das' / 'RECORD.LOG'
-            if log_path.exists():
-                try:
-                    flights = RecordLogParser.parse_log_file(str(log_path))
-                    for flight in flights:
-                        key = f"{flight['date']}_{flight['plane_number']}_{self.drive_mapping.get(drive, 'Unknown')}"
-                        flight_data[key] = {
-                            'base_path': flight['base_path'],
-                            'base_filename': flight['base_filename'],
-                            'size': flight['size'],
-                            'start_time': flight['start_time'],
-                            'end_time': flight['end_time'],
-                            'drive': drive
-                        }
-                except Exception as e:
-                    print(f"Error processing log file {log_path}: {e}")
+        async def scan_one(drive):
+            async with limit:
+                await asyncio.to_thread(self.scan_drive_log, drive)
+            return drive
+
+        tasks = [asyncio.ensure_future(scan_one(drive)) for drive in selected_drives]
+        for done, finished in enumerate(asyncio.as_completed(tasks), 1):
+            drive = await finished
+            drive_data = self.build_flight_data(self.index.load_log_flights([drive]))
+            self.ui.call(self.merge_drive_flights, drive_data, done / len(tasks) * 100)
 
         end_time = time.time()
         print(f"Log scan completed in {end_time - start_time:.2f} seconds")
+
+    def scan_drive_log(self, drive):
+        log_path = Path(drive) / '!shu_fd' / 'das' / 'RECORD.LOG'
+        if log_path.exists():
+            try:
+                # Only what the recorder appended since the last scan is parsed;
+                # this window takes plane numbers of any length, not just three digits
+                result = RecordLogParser.parse_tail(str(log_path), self.index.load_log_state(drive),
+                                                    classifier=DEFAULT_CLASSIFIER, workers=self.log_parse_workers)
+                if result.ok:
+                    self.index.apply_log_tail(drive, self.drive_mapping.get(drive, 'Unknown'),
+                                              result.flights, result.kept, result.state)
+                else:
+                    print(f"Error processing log file {log_path}: {result.error}")
+            except Exception as e:
+                print(f"Error processing log file {log_path}: {e}")
+
+    def merge_drive_flights(self, drive_data, progress):
+        self.flight_data.update(drive_data)
+        self.insert_flight_rows(drive_data)
+        self.progress_var.set(progress)
+
+    def build_flight_data(self, flights):
+        flight_data = {}
+        for flight in flights:
+            key = f"{flight['date']}_{flight['plane_number']}_{self.drive_mapping.get(flight['drive'], 'Unknown')}"
+            flight_data[key] = {
+                'base_path': flight['base_path'],
+                'base_filename': flight['base_filename'],
+                'size': flight['size'],
+                'start_time': flight['start_time'],
+                'end_time': flight['end_time'],
+                'drive': flight['drive']
+            }
         return flight_data
 
+    def load_cached_flights(self):
+        self.flight_data = self.build_flight_data(self.index.load_log_flights())
+        self.display_flights()
+
     def load_files(self, selected_drives):
         self.status_label.config(text="Loading files...")
         self.progress_var.set(0)
         self.table.delete(*self.table.get_children())
-        
+        self.flight_data = {}
+
         async def process_logs():
-            self.flight_data = await self.scan_record_logs(selected_drives)
-            self.root.after(0, self.display_flights)
+            # Each drive's rows are added as soon as that drive is done
+            await self.scan_record_logs(selected_drives)
+            self.ui.post("status", self.status_label.config, {"text": "Ready"})
 
-        asyncio.run(process_logs())
+        # The event loop gets its own thread so Tk keeps drawing the progress
+        threading.Thread(target=asyncio.run, args=(process_logs(),), daemon=True).start()
 
     def display_flights(self):
-        for key, data in self.flight_data.items():
+        self.insert_flight_rows(self.flight_data)
+        self.status_label.config(text="Ready")
+
+    def insert_flight_rows(self, flight_data):
+        for key, data in flight_data.items():
             date, plane_number, drive_id = key.split('_')
             formatted_date = f"{date[6:8]}/{date[4:6]}/{date[:4]}"
             size_gb = data['size'] / (1024 * 1024 * 1024)
@@ -248,8 +289,6 @@ class FlightFileManager:
                 data['end_time'],
                 f"{size_gb:.2f} GB"
             ))
-            
-        self.status_label.config(text="Ready")
 
     def get_flight_files(self, flight_key):
         if flight_key not in self.flight_data:
@@ -261,6 +300,16 @@ class FlightFileManager:
         
         return list(base_path.glob(pattern))
 
+    def selected_keys(self, selected):
+        keys = []
+        for item in selected:
+            values = self.table.item(item, 'values')
+            if values:
+                date, plane_number, drive_id = values[:3]
+                date = date.replace("/", "")
+                keys.append(f"{date}_{plane_number}_{drive_id}")
+        return keys
+
     def copy_files(self):
         selected = self.table.selection()
         if not selected:
@@ -273,25 +322,22 @@ class FlightFileManager:
         
         self.status_label.config(text="Copying files...")
         
+        # The table is read here, on the Tk thread; the task only gets keys
+        keys = self.selected_keys(selected)
+
         def copy_task():
-            for item in selected:
-                values = self.table.item(item, 'values')
-                if values:
-                    date, plane_number, drive_id = values[:3]
-                    date = date.replace("/", "")
-                    key = f"{date}_{plane_number}_{drive_id}"
-                    
-                    files = self.get_flight_files(key)
-                    for file in files:
-                        try:
-                            shutil.copy2(file, dest_dir)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Copy Error", 
-                                          f"Error copying file {file}: {str(e)}")
-                            
-            self.root.after(0, messagebox.showinfo, "Copy Complete", 
-                          "Selected files have been copied.")
-            self.root.after(0, self.status_label.config, {"text": "Ready"})
+            for key in keys:
+                files = self.get_flight_files(key)
+                for file in files:
+                    try:
+                        shutil.copy2(file, dest_dir)
+                    except Exception as e:
+                        self.ui.call(messagebox.showerror, "Copy Error", 
+                                     f"Error copying file {file}: {str(e)}")
+
+            self.ui.call(messagebox.showinfo, "Copy Complete", 
+                         "Selected files have been copied.")
+            self.ui.post("status", self.status_label.config, {"text": "Ready"})
         
         self.executor.submit(copy_task)
 
@@ -307,26 +353,21 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Deleting files...")
-        
+        keys = self.selected_keys(selected)
+
         def delete_task():
-            for item in selected:
-                values = self.table.item(item, 'values')
-                if values:
-                    date, plane_number, drive_id = values[:3]
-                    date = date.replace("/", "")
-                    key = f"{date}_{plane_number}_{drive_id}"
-                    
-                    files = self.get_flight_files(key)
-                    for file in files:
-                        try:
-                            os.remove(file)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Deletion Error", 
-                                          f"Error deleting file {file}: {str(e)}")
-                            
-            self.root.after(0, messagebox.showinfo, "Deletion Complete", 
-                          "Selected files have been deleted.")
-            self.root.after(0, self.status_label.config, {"text": "Ready"})
+            for key in keys:
+                files = self.get_flight_files(key)
+                for file in files:
+                    try:
+                        os.remove(file)
+                    except Exception as e:
+                        self.ui.call(messagebox.showerror, "Deletion Error", 
+                                     f"Error deleting file {file}: {str(e)}")
+
+            self.ui.call(messagebox.showinfo, "Deletion Complete", 
+                         "Selected files have been deleted.")
+            self.ui.post("status", self.status_label.config, {"text": "Ready"})
         
         self.executor.submit(delete_task)
 
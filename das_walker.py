@@ -0,0 +1,88 @@
+import os
+from typing import NamedTuple
+
+from flight_schema import DEFAULT_CLASSIFIER
+
+
+class FlightEntry(NamedTuple):
+    date: str
+    plane_number: str
+    path: str
+    size: int
+    mtime: float
+
+
+def iter_das_dirs(root, das_name='das', on_error=None):
+    """
+    Yield every `das` directory below root.
+
+    Walks with os.scandir so the directory type comes from the cached
+    DirEntry instead of an extra stat per entry, and stops descending once
+    a `das` folder is found (recordings never nest another das inside).
+    A directory that cannot be listed is skipped; on_error(path, error)
+    hears about it first, unless it has simply vanished.
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if not entry.is_dir(follow_symlinks=False):
+                            continue
+                    except OSError:
+                        continue
+                    if entry.name == das_name:
+                        yield entry.path
+                    else:
+                        stack.append(entry.path)
+        except FileNotFoundError:
+            # Vanished directory - skip it like rglob would
+            continue
+        except OSError as e:
+            if on_error is not None:
+                on_error(current, e)
+            continue
+
+
+def iter_das_entries(das_dir, classifier=DEFAULT_CLASSIFIER, cancel=None, strict=False):
+    """
+    Yield a FlightEntry for every flight file directly inside das_dir.
+
+    The whole listing is classified in one classify_listing() call, and
+    only the names it accepts are stat'ed. Size and mtime come from
+    DirEntry.stat(), which is free on Windows (the data arrives with the
+    directory listing) and a single stat elsewhere.
+
+    With a CancelToken as cancel, the token is checked before every stat,
+    so a folder with a huge number of recordings can be abandoned halfway.
+    A folder that cannot be listed yields nothing, or raises the OSError
+    with strict=True, for callers that must not mistake it for an empty one.
+    """
+    try:
+        with os.scandir(das_dir) as it:
+            listing = list(it)
+    except OSError:
+        if strict:
+            raise
+        return
+    for i, (date, plane_number, _) in classifier.classify_listing([entry.name for entry in listing]):
+        if cancel is not None:
+            cancel.check()
+        entry = listing[i]
+        try:
+            if not entry.is_file():
+                continue
+            st = entry.stat()
+            size, mtime = st.st_size, st.st_mtime
+        except OSError:
+            size, mtime = 0, 0.0  # Handle cases where file size can't be determined
+        yield FlightEntry(date, plane_number, entry.path, size, mtime)
+
+
+def iter_flight_entries(drive, classifier=DEFAULT_CLASSIFIER, cancel=None):
+    """Yield a FlightEntry for every flight file under <drive>/!shu_fd/**/das."""
+    shu_fd_folder = os.path.join(drive, '!shu_fd')
+    for das_dir in iter_das_dirs(shu_fd_folder):
+        yield from iter_das_entries(das_dir, classifier, cancel)
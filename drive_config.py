@@ -0,0 +1,109 @@
+"""
+Drive definitions shared by the scanner windows.
+
+drives.json, next to the scripts, maps each drive to its station id and
+can ask for mounted volumes to be discovered:
+
+    {
+        "drives": {"C:/": 61, "Y:/": 62, "X:/": 63},
+        "discover": true,
+        "probe_timeout": 2.0
+    }
+
+Without the file every window keeps the mapping it was written with.
+"""
+import json
+import os
+import string
+import sys
+import threading
+import time
+from pathlib import Path
+
+CONFIG_PATH = Path(__file__).with_name("drives.json")
+
+# Folder that marks a volume as holding flight recordings
+FLIGHT_ROOT = "!shu_fd"
+
+DEFAULT_PROBE_TIMEOUT = 2.0
+
+
+def load_drive_config(path=CONFIG_PATH):
+    """Return the parsed drives.json as a dict, {} if there is none or it cannot be read."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring {path}: {e}")
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def load_drive_mapping(default, path=CONFIG_PATH):
+    """
+    Return {drive: station id} from drives.json, or default when the file
+    does not define any drives. With "discover" set, mounted volumes that
+    hold a !shu_fd folder and are not in the mapping are added after it,
+    numbered on from the highest id.
+    """
+    config = load_drive_config(path)
+    drives = config.get("drives")
+    mapping = {drive: int(drive_id) for drive, drive_id in drives.items()} if drives else dict(default)
+    if config.get("discover"):
+        timeout = float(config.get("probe_timeout", DEFAULT_PROBE_TIMEOUT))
+        # Discovered drives have no station id of their own
+        next_id = max(mapping.values(), default=0) + 1
+        for drive in discover_drives(set(mapping), timeout):
+            mapping[drive] = next_id
+            next_id += 1
+    return mapping
+
+
+def probe_timeout(path=CONFIG_PATH):
+    """Seconds to wait for a drive to answer, from drives.json."""
+    return float(load_drive_config(path).get("probe_timeout", DEFAULT_PROBE_TIMEOUT))
+
+
+def mounted_volumes():
+    """Every drive letter on Windows, mount points on Linux (from /proc/mounts), as "X:/"-style paths."""
+    if sys.platform == "win32":
+        # Not checked here: a dead network letter can block, discover_drives() copes with that
+        return [f"{letter}:/" for letter in string.ascii_uppercase]
+    volumes = []
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                # Mount points escape spaces as \040
+                mount_point = line.split()[1].replace("\\040", " ")
+                volumes.append(mount_point.rstrip("/") + "/")
+    except OSError:
+        pass
+    return volumes
+
+
+def discover_drives(known=(), timeout=DEFAULT_PROBE_TIMEOUT):
+    """
+    Return the mounted volumes not in known that have a !shu_fd folder,
+    sorted. Every volume is looked at on its own daemon thread, at the same
+    time, and one that does not answer within timeout seconds is skipped.
+    """
+    found = []
+    lock = threading.Lock()
+
+    def look(volume):
+        if os.path.isdir(os.path.join(volume, FLIGHT_ROOT)):
+            with lock:
+                found.append(volume)
+
+    threads = [threading.Thread(target=look, args=(volume,), daemon=True)
+               for volume in mounted_volumes() if volume not in known]
+    for thread in threads:
+        thread.start()
+    # One deadline for all of them, not timeout per volume
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    with lock:
+        return sorted(found)
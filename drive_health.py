@@ -0,0 +1,214 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import NamedTuple
+
+from scan_session import DriveToken, DriveUnreachable, ScanCancelled
+
+
+# Probe threads still waiting on a drive, so a dead one only ever holds one
+_probes = {}
+
+
+class DriveStatus(NamedTuple):
+    drive: str
+    answered: bool       # the listing came back (with or without an error) within the timeout
+    latency: float       # seconds the listing took, None without an answer
+    free: int            # free bytes, None if unknown
+    error: str           # why the drive could not be listed, None if it could
+
+
+def check_drive(drive, timeout=5.0):
+    """
+    List <drive> and ask for its free space, giving up after timeout
+    seconds; return a DriveStatus.
+
+    A listing rather than a stat, because SMB clients answer stats of the
+    share root from cache. It runs on a daemon thread since a dead mount
+    can block it far longer than timeout; while that thread is still stuck,
+    later checks of the same drive report no answer instead of piling up
+    more threads.
+    """
+    stuck = _probes.get(drive)
+    if stuck is not None and stuck.is_alive():
+        return DriveStatus(drive, False, None, None, None)
+    answered = threading.Event()
+    result = {}
+
+    def listing():
+        start = time.perf_counter()
+        try:
+            with os.scandir(drive) as it:
+                next(it, None)
+            result["free"] = shutil.disk_usage(drive).free
+        except OSError as e:
+            # An error is still an answer - the share responded
+            result["error"] = e.strerror or str(e)
+        result["latency"] = time.perf_counter() - start
+        answered.set()
+
+    thread = threading.Thread(target=listing, daemon=True)
+    _probes[drive] = thread
+    thread.start()
+    if not answered.wait(timeout):
+        return DriveStatus(drive, False, None, None, None)
+    return DriveStatus(drive, True, result["latency"], result.get("free"), result.get("error"))
+
+
+def check_drives(drives, timeout=2.0):
+    """
+    check_drive() every drive at once and yield each DriveStatus as it
+    comes in, so the whole lot takes at most about timeout seconds however
+    many drives are dead.
+    """
+    results = queue.Queue()
+    drives = list(drives)
+    for drive in drives:
+        threading.Thread(target=lambda drive=drive: results.put(check_drive(drive, timeout)), daemon=True).start()
+    for _ in drives:
+        yield results.get()
+
+
+def describe_drive(status):
+    """One line for a DriveStatus, e.g. "12 ms, 1.4 TB free" or "no answer"."""
+    if not status.answered:
+        return "no answer"
+    if status.error is not None:
+        return f"unavailable ({status.error})"
+    ms = status.latency * 1000
+    text = f"{ms:.1f} ms" if ms < 10 else f"{ms:.0f} ms"
+    if status.free is not None:
+        free = status.free
+        for unit in ("B", "KB", "MB", "GB", "TB"):
+            if free < 1024 or unit == "TB":
+                break
+            free /= 1024
+        text += f", {free:.1f} {unit} free"
+    return text
+
+
+def probe_drive(drive, timeout=5.0):
+    """Return True if <drive> answers a directory listing within timeout seconds (see check_drive)."""
+    return check_drive(drive, timeout).answered
+
+
+class DriveHealth:
+    """
+    Circuit breaker over the mapped drives.
+
+    A drive that misses its deadline or stalls is tripped: allow() turns
+    False and scans skip it until a background probe sees it answer a
+    listing again, every probe_interval seconds. on_change(drive, reason) is called
+    from the probe thread when a drive recovers (reason None) and from the
+    scan thread when one is tripped.
+    """
+
+    def __init__(self, probe_interval=30.0, probe_timeout=5.0, on_change=None):
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.on_change = on_change
+        self.degraded = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def allow(self, drive):
+        return drive not in self.degraded
+
+    def trip(self, drive, reason):
+        with self._lock:
+            first = drive not in self.degraded
+            self.degraded[drive] = reason
+        if first:
+            threading.Thread(target=self._probe_until_back, args=(drive,), daemon=True).start()
+        if self.on_change is not None:
+            self.on_change(drive, reason)
+
+    def reset(self, drive):
+        with self._lock:
+            was_degraded = self.degraded.pop(drive, None) is not None
+        if was_degraded and self.on_change is not None:
+            self.on_change(drive, None)
+
+    def stop(self):
+        self._stop.set()
+
+    def _probe_until_back(self, drive):
+        while not self._stop.wait(self.probe_interval):
+            if drive not in self.degraded:
+                return
+            if probe_drive(drive, self.probe_timeout):
+                self.reset(drive)
+                return
+
+
+def run_drives(drives, scan_drive, health=None, cancel=None, budget=None, stall_timeout=None,
+               cancel_grace=2.0, poll_interval=0.25):
+    """
+    Run scan_drive(drive, token) for every drive on its own daemon thread
+    and yield (drive, status, result) as each one ends.
+
+    status is one of:
+        "done"      scan_drive returned result
+        "skipped"   the circuit breaker has the drive marked degraded
+        "deadline"  the drive ran past its budget in seconds
+        "stalled"   the drive made no progress for stall_timeout seconds
+        "cancelled" cancel (the session's token) was cancelled
+        "unreachable" scan_drive raised DriveUnreachable, leaving the index as it was
+
+    token is a DriveToken that scan_drive must pass down as its cancel
+    token, so it can be stopped and so its checks count as progress. A
+    drive that runs out of time is tripped in health and given up on at
+    once; whatever it stored before that is all it returns. Its thread is
+    left behind rather than joined, because a dead share can keep it
+    inside a single directory listing for minutes. Exceptions raised by
+    scan_drive are re-raised here. Once cancel fires, a drive that has not
+    checked in for cancel_grace seconds is given up on as "cancelled", so a
+    stuck share does not hold up the scan that superseded this one; it is
+    not tripped, as the user stopping a scan says nothing about the drive.
+    """
+    results = queue.Queue()
+    tokens = {}
+    for drive in drives:
+        if health is not None and not health.allow(drive):
+            yield drive, "skipped", None
+            continue
+        token = tokens[drive] = DriveToken(cancel, budget, stall_timeout)
+
+        def run(drive=drive, token=token):
+            try:
+                results.put((drive, "done", scan_drive(drive, token)))
+            except ScanCancelled:
+                results.put((drive, "cancelled", None))
+            except DriveUnreachable as e:
+                results.put((drive, "unreachable", e))
+            except BaseException as e:
+                results.put((drive, "error", e))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    while tokens:
+        try:
+            drive, status, result = results.get(timeout=poll_interval)
+        except queue.Empty:
+            pass
+        else:
+            # A drive already given up on has no token left - drop its late answer
+            if tokens.pop(drive, None) is not None:
+                if status == "error":
+                    raise result
+                yield drive, status, result
+
+        now = time.monotonic()
+        cancelled = cancel is not None and cancel.cancelled
+        for drive, token in list(tokens.items()):
+            reason = token.overdue(now)
+            if reason is None and cancelled and now - token.last_beat > cancel_grace:
+                reason = "cancelled"
+            if reason is not None:
+                token.expire(reason)
+                del tokens[drive]
+                if health is not None and reason != "cancelled":
+                    health.trip(drive, reason)
+                yield drive, reason, None
@@ -6,12 +6,15 @@ from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, font, PhotoImage
 
+from drive_config import load_drive_mapping
+
 class FlightFileManager:
     def __init__(self, root, network_drives):
         self.root = root
         self.network_drives = network_drives
         self.flight_data = []
-        self.drive_mapping = {
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "C:/": 61,
             "E:/": 63,
             "Y:/": 62,
@@ -19,7 +22,7 @@ class FlightFileManager:
             "G:/": 65,
             "H:/": 66,
             "I:/": 67
-        }
+        })
         self.init_gui()
 
     def init_gui(self):
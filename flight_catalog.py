@@ -0,0 +1,208 @@
+import os
+from array import array
+from pathlib import Path
+
+from das_walker import FlightEntry
+
+GB = 1024 * 1024 * 1024
+
+
+def flight_key(entry, drive_id):
+    return f"{entry.date}_{entry.plane_number}_{drive_id}"
+
+
+class PathTable:
+    """Stores every distinct directory path once and hands out small integer ids for it."""
+
+    __slots__ = ("paths", "ids")
+
+    def __init__(self):
+        self.paths = []
+        self.ids = {}
+
+    def intern(self, path):
+        dir_id = self.ids.get(path)
+        if dir_id is None:
+            dir_id = self.ids[path] = len(self.paths)
+            self.paths.append(path)
+        return dir_id
+
+    def __getitem__(self, dir_id):
+        return self.paths[dir_id]
+
+    def __len__(self):
+        return len(self.paths)
+
+
+class FlightRecord:
+    """
+    The files of one flight, stored column-wise: a directory id into the
+    catalog's PathTable, the bare file name and the size in bytes. No Path
+    object exists until someone asks for one through FlightCatalog.files().
+    """
+
+    __slots__ = ("dir_ids", "names", "sizes", "total_bytes")
+
+    def __init__(self):
+        self.dir_ids = array("I")
+        self.names = []
+        self.sizes = array("q")
+        self.total_bytes = 0
+
+    @property
+    def file_count(self):
+        return len(self.names)
+
+    @property
+    def total_size(self):
+        """Total size in GB, as the tables display it."""
+        return self.total_bytes / GB
+
+    def add(self, dir_id, name, size):
+        self.dir_ids.append(dir_id)
+        self.names.append(name)
+        self.sizes.append(size)
+        self.total_bytes += size
+
+    def remove(self, dir_id, name):
+        for i, existing in enumerate(self.names):
+            if existing == name and self.dir_ids[i] == dir_id:
+                self.total_bytes -= self.sizes[i]
+                del self.names[i]
+                del self.dir_ids[i]
+                del self.sizes[i]
+                return True
+        return False
+
+
+class FlightCatalog:
+    """
+    The scanners' flight_data: {"date_plane_driveid": FlightRecord} plus
+    the PathTable all records share. Reads like a dict of records.
+    """
+
+    __slots__ = ("paths", "flights")
+
+    def __init__(self):
+        self.paths = PathTable()
+        self.flights = {}
+
+    def add(self, key, das_dir, name, size):
+        record = self.flights.get(key)
+        if record is None:
+            record = self.flights[key] = FlightRecord()
+        record.add(self.paths.intern(das_dir), name, size)
+
+    def remove(self, key, das_dir, name):
+        record = self.flights.get(key)
+        dir_id = self.paths.ids.get(das_dir)
+        if record is None or dir_id is None or not record.remove(dir_id, name):
+            return False
+        if not record.names:
+            del self.flights[key]
+        return True
+
+    def subset(self, keys):
+        """
+        A new catalog with copies of the records of keys that are in this
+        one, for a worker thread to read while the Tk thread goes on
+        changing this catalog.
+        """
+        subset = FlightCatalog()
+        paths = self.paths
+        for key in keys:
+            record = self.flights.get(key)
+            if record is not None:
+                for dir_id, name, size in zip(record.dir_ids, record.names, record.sizes):
+                    subset.add(key, paths[dir_id], name, size)
+        return subset
+
+    def files(self, key):
+        """Return the full Paths of one flight's files."""
+        record = self.flights.get(key)
+        if record is None:
+            return []
+        paths = self.paths
+        return [Path(paths[dir_id], name) for dir_id, name in zip(record.dir_ids, record.names)]
+
+    def sized_files(self, key):
+        """Return (Path, size in bytes) for each of one flight's files."""
+        record = self.flights.get(key)
+        if record is None:
+            return []
+        return list(zip(self.files(key), record.sizes))
+
+    def entries(self, key):
+        """
+        Return one flight's files as FlightEntry objects, as add_entries()
+        and remove_entries() take them. The catalog keeps no mtimes, so
+        mtime is 0.
+        """
+        record = self.flights.get(key)
+        if record is None:
+            return []
+        date, plane_number, _ = key.split('_')
+        paths = self.paths
+        return [FlightEntry(date, plane_number, os.path.join(paths[dir_id], name), size, 0.0)
+                for dir_id, name, size in zip(record.dir_ids, record.names, record.sizes)]
+
+    def __getitem__(self, key):
+        return self.flights[key]
+
+    def __contains__(self, key):
+        return key in self.flights
+
+    def __iter__(self):
+        return iter(self.flights)
+
+    def __len__(self):
+        return len(self.flights)
+
+    def get(self, key, default=None):
+        return self.flights.get(key, default)
+
+    def keys(self):
+        return self.flights.keys()
+
+    def items(self):
+        return self.flights.items()
+
+
+def add_entries(flight_data, entries, drive_id):
+    """Add FlightEntry objects to a FlightCatalog."""
+    for entry in entries:
+        das_dir, name = os.path.split(entry.path)
+        flight_data.add(flight_key(entry, drive_id), das_dir, name, entry.size)
+
+
+def remove_entries(flight_data, entries, drive_id):
+    """Remove FlightEntry objects from a FlightCatalog, dropping flights that end up with no files."""
+    for entry in entries:
+        das_dir, name = os.path.split(entry.path)
+        flight_data.remove(flight_key(entry, drive_id), das_dir, name)
+
+
+def deleted_entries(flights, deleted):
+    """
+    Return {drive_id: [FlightEntry, ...]} for the files of a FlightCatalog
+    whose paths are in deleted (Paths, as FlightEngine.delete reports them).
+    """
+    removed = {}
+    for key in flights:
+        drive_id = key.rsplit('_', 1)[1]
+        for entry in flights.entries(key):
+            if Path(entry.path) in deleted:
+                removed.setdefault(drive_id, []).append(entry)
+    return removed
+
+
+def diff_entries(old_entries, new_entries):
+    """
+    Compare two FlightEntry listings by path and return (added, removed).
+    A file whose size or mtime changed is reported as removed and re-added.
+    """
+    old = {e.path: e for e in old_entries}
+    new = {e.path: e for e in new_entries}
+    added = [e for path, e in new.items() if old.get(path) != e]
+    removed = [e for path, e in old.items() if new.get(path) != e]
+    return added, removed
@@ -0,0 +1,173 @@
+"""
+Scan, list, copy and delete flights without a window, e.g. from cron or
+over SSH on the ingest server.
+
+Usage:
+    python flight_cli.py scan [--drive Z:/ ...] [--logs] [--workers 16] [--processes]
+    python flight_cli.py list [--drive Z:/ ...] [--plane 201 ...] [--date DDMMYY ...]
+    python flight_cli.py copy KEY [KEY ...] --dest DIR
+    python flight_cli.py delete KEY [KEY ...] [--dry-run]
+
+Drives come from drives.json (see drive_config.py); --drive narrows a
+command to some of them. Flights are named by their "DDMMYY_plane_driveid"
+keys, as list prints them. The index is the one the windows use, or
+FLIGHT_INDEX_PATH.
+
+Every command writes JSON lines to stdout, one object per line with an
+"event" field: "drive" per scanned drive, "log" per parsed RECORDS.LOG,
+"flight" per listed flight, "file" per copied or deleted file and one
+"done" line at the end. The exit status is 1 if any file failed or a
+drive was unreachable or only partly scanned, 0 otherwise. An unreachable
+drive keeps the flights the index had for it.
+
+Nothing here imports tkinter.
+"""
+import argparse
+import json
+import sys
+import threading
+
+from drive_config import load_drive_mapping
+from flight_engine import FlightEngine
+
+# The mapping the windows were written with, used when drives.json has none
+DEFAULT_DRIVES = {
+    "Z:/": 61, "Y:/": 62, "X:/": 63, "W:/": 64,
+    "V:/": 65, "U:/": 66, "T:/": 67,
+}
+
+# Copies report from several threads; one line must not cut into another
+_emit_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    line = json.dumps({"event": event, **fields}, default=str)
+    with _emit_lock:
+        print(line, flush=True)
+
+
+def selected_drives(engine, args):
+    return args.drive or list(engine.drive_mapping)
+
+
+def cmd_scan(engine, args):
+    drives = selected_drives(engine, args)
+    incomplete = 0
+    for outcome in engine.scan(drives):
+        incomplete += outcome.state != "complete"
+        emit("drive", **outcome._asdict())
+    if args.logs:
+        for drive in drives:
+            result = engine.scan_log(drive)
+            if result is None:
+                emit("log", drive=drive, path=None, flights=0, new=0, error="no RECORDS.LOG")
+            else:
+                incomplete += not result.ok
+                emit("log", drive=drive, path=result.path, flights=result.kept + len(result.flights),
+                     new=len(result.flights), error=None if result.ok else str(result.error))
+    emit("done", drives=len(drives), incomplete=incomplete)
+    return 1 if incomplete else 0
+
+
+def cmd_list(engine, args):
+    drives = args.drive or None
+    planes = set(args.plane or ())
+    dates = set(args.date or ())
+    listed = 0
+    for key, record in engine.flights(drives).items():
+        date, plane, drive_id = key.split('_')
+        if (planes and plane not in planes) or (dates and date not in dates):
+            continue
+        listed += 1
+        emit("flight", key=key, date=date, plane=plane, drive_id=drive_id, drive=engine.drive_of(key),
+             files=record.file_count, bytes=record.total_bytes)
+    emit("done", flights=listed)
+    return 0
+
+
+def file_reporter(action):
+    failed = []
+
+    def on_file(path, error):
+        if error is not None:
+            failed.append(path)
+        emit("file", action=action, path=str(path), error=None if error is None else str(error))
+
+    return on_file, failed
+
+
+def cmd_copy(engine, args):
+    flight_data = engine.flights()
+    keys = known_keys(flight_data, args.keys)
+    on_file, failed = file_reporter("copy")
+    copied = engine.copy(flight_data, keys, args.dest, on_file)
+    emit("done", flights=len(keys), files=copied, failed=len(failed))
+    return 1 if failed or len(keys) < len(args.keys) else 0
+
+
+def cmd_delete(engine, args):
+    flight_data = engine.flights()
+    keys = known_keys(flight_data, args.keys)
+    if args.dry_run:
+        files = 0
+        for key in keys:
+            for path in flight_data.files(key):
+                files += 1
+                emit("file", action="would delete", path=str(path), error=None)
+        emit("done", flights=len(keys), files=files, failed=0)
+        return 0
+    on_file, failed = file_reporter("delete")
+    deleted = engine.delete(flight_data, keys, on_file)
+    emit("done", flights=len(keys), files=deleted, failed=len(failed))
+    return 1 if failed or len(keys) < len(args.keys) else 0
+
+
+def known_keys(flight_data, keys):
+    """The keys the index knows, reporting the others as errors."""
+    known = []
+    for key in keys:
+        if key in flight_data:
+            known.append(key)
+        else:
+            emit("error", key=key, error="no such flight in the index")
+    return known
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="walk the drives and store their flights in the index")
+    scan.add_argument("--drive", action="append", help="drive to scan (repeatable, default every drive)")
+    scan.add_argument("--logs", action="store_true", help="also parse each drive's RECORDS.LOG")
+    scan.add_argument("--workers", type=int, default=16, help="directory listings in flight across all drives")
+    scan.add_argument("--processes", action="store_true", help="classify das folders in a process pool")
+    scan.set_defaults(func=cmd_scan)
+
+    list_cmd = sub.add_parser("list", help="print the indexed flights")
+    list_cmd.add_argument("--drive", action="append", help="only flights on this drive (repeatable)")
+    list_cmd.add_argument("--plane", action="append", help="only this plane number (repeatable)")
+    list_cmd.add_argument("--date", action="append", help="only this DDMMYY date (repeatable)")
+    list_cmd.set_defaults(func=cmd_list)
+
+    copy = sub.add_parser("copy", help="copy flights' files into a directory")
+    copy.add_argument("keys", nargs="+", metavar="KEY")
+    copy.add_argument("--dest", required=True, help="directory to copy into")
+    copy.set_defaults(func=cmd_copy)
+
+    delete = sub.add_parser("delete", help="delete flights' files from their drives")
+    delete.add_argument("keys", nargs="+", metavar="KEY")
+    delete.add_argument("--dry-run", action="store_true", help="print the files instead of deleting them")
+    delete.set_defaults(func=cmd_delete)
+
+    args = parser.parse_args(argv)
+    engine = FlightEngine(
+        load_drive_mapping(DEFAULT_DRIVES),
+        scan_workers=getattr(args, "workers", 16),
+        scan_mode="processes" if getattr(args, "processes", False) else "threads",
+    )
+    return args.func(engine, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
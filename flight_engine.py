@@ -0,0 +1,331 @@
+import os
+import shutil
+import time
+from functools import partial
+from pathlib import Path
+from typing import NamedTuple
+
+from drive_health import DriveHealth, run_drives
+from flight_catalog import diff_entries
+from flight_index import FlightIndex
+from incremental_scan import rescan_drive, snapshot_unchanged, take_snapshot
+from io_tuner import MIB, ConcurrencyTuner, run_tuned
+from parallel_scan import ProcessScanner, SubtreeScanner
+from reconcile import MISSING, ORPHANED, SIZE_MISMATCH, reconcile
+from flight_schema import LOG_CLASSIFIER
+from record_log import RecordLogParser
+from scan_session import ScanCancelled
+
+# Where the recorders keep RECORDS.LOG, tried in this order
+LOG_PATHS = (
+    Path('!shu_fd') / 'das' / 'RECORDS.LOG',
+    Path('!shu_fd') / 'das' / 'RECORDS',
+    Path('!shu_fd') / 'RECORDS.LOG',
+)
+
+# The drive the recorders write base_path against; reconcile() swaps it for the mounted one
+RECORDED_ROOT = 'D:/'
+
+
+class DriveScan(NamedTuple):
+    drive: str
+    state: str           # "complete", "partial" (cancelled, over budget or with unreadable folders),
+                         # "skipped" (degraded)
+                         # or "unreachable" (no !shu_fd to list; the index keeps what it had)
+    files: int           # files stored for the drive by this scan
+    reason: str = None
+
+
+class LogSync(NamedTuple):
+    added: list          # FlightEntry objects the drive gained since the index last saw it
+    removed: list        # and the ones it lost
+    problem: str = None  # what is wrong with the drive's log or its files, for the user
+
+
+class FlightEngine:
+    """
+    Scanning, RECORDS.LOG parsing, copying and deleting, without a window.
+
+    Everything the scanner windows do to drives and to the index goes
+    through here, so the same work can run from flight_cli.py in a cron
+    job or over SSH. Nothing in this module (or anything it imports) uses
+    tkinter: progress and errors are reported through plain callbacks,
+    called from worker threads, which a window hands to its UiChannel and
+    the CLI prints.
+
+    drive_mapping is {drive: station id} (drive_config.load_drive_mapping()
+    gives the configured one). Scan results are stored in index, and
+    flights() reads them back as a FlightCatalog; copy() and delete() work
+    on the flight keys of such a catalog, copy_files() and delete_files()
+    on files a window found some other way (e.g. reconcile_log()).
+
+    There are three ways to bring the index up to date, one per kind of
+    window: scan() walks the drives with the work-stealing scanner,
+    rescan() re-lists only what changed since the last scan, and
+    sync_logs() indexes the files each drive's RECORDS.LOG refers to.
+    health is the DriveHealth circuit breaker all of them share.
+    log_classifier decides which RECORDS.LOG headers are flights; the
+    default LOG_CLASSIFIER takes three-digit planes only, a window that
+    has always taken any plane number passes DEFAULT_CLASSIFIER.
+    """
+
+    def __init__(self, drive_mapping, index=None, health=None, scan_workers=16, scan_mode="threads",
+                 drive_budget=300.0, stall_timeout=20.0, log_classifier=LOG_CLASSIFIER):
+        self.drive_mapping = drive_mapping
+        self.log_classifier = log_classifier
+        self.index = index if index is not None else FlightIndex()
+        # Directory listings and copies in flight per drive, tuned to what each
+        # drive can take and kept in the index between sessions
+        self.tuner = ConcurrencyTuner(self.index)
+        # Directory listings in flight across all drives
+        self.scan_workers = scan_workers
+        # "threads" lists and classifies in this process, "processes" hands the
+        # das folders to a process pool (worth it for folders with huge file counts)
+        self.scan_mode = scan_mode
+        # Per-drive time budget and stall limit in seconds; a drive that misses
+        # either is skipped by later scans until it answers a probe again
+        self.drive_budget = drive_budget
+        self.stall_timeout = stall_timeout
+        self.health = health if health is not None else DriveHealth()
+
+    def drive_id(self, drive):
+        return self.drive_mapping.get(drive, "Unknown")
+
+    def drive_of(self, key):
+        """The drive a "date_plane_driveid" flight key belongs to, the id itself if it is not mapped."""
+        drive_id = key.rsplit('_', 1)[-1]
+        for drive, mapped_id in self.drive_mapping.items():
+            if str(mapped_id) == drive_id:
+                return drive
+        return drive_id
+
+    def scan(self, drives, cancel=None, progress=None):
+        """
+        Walk <drive>/!shu_fd on every drive and store the flight files
+        found in the index, returning a DriveScan per drive.
+
+        progress(dirs_done, dirs_pending, files_found) is called from the
+        scan threads. With a CancelToken as cancel, a cancelled scan stores
+        the das folders it listed completely and returns; those drives come
+        back "partial", like drives that ran out of time. A drive whose
+        !shu_fd cannot be listed comes back "unreachable" and its indexed
+        flights are left as they were, rather than replaced by nothing;
+        so do the indexed flights under any folder further down that could
+        not be listed, and such a drive comes back "partial".
+        """
+        drives = list(drives)
+        # Drives the circuit breaker has open keep their indexed flights
+        outcomes = {drive: DriveScan(drive, "skipped", 0, self.health.degraded[drive])
+                    for drive in drives if not self.health.allow(drive)}
+        scan_drives = [drive for drive in drives if drive not in outcomes]
+        if self.scan_mode == "processes":
+            scanner = ProcessScanner(progress=progress)
+        else:
+            scanner = SubtreeScanner(
+                max_workers=self.scan_workers,
+                progress=progress,
+                tuner=self.tuner,
+                drive_budget=self.drive_budget,
+                stall_timeout=self.stall_timeout,
+            )
+        try:
+            results = scanner.scan(scan_drives, cancel=cancel)
+        except ScanCancelled as stopped:
+            for drive, entries in stopped.partial.items():
+                if drive in scanner.unreachable:
+                    outcomes[drive] = DriveScan(drive, "unreachable", 0, scanner.unreachable[drive])
+                    continue
+                self.store_partial(drive, entries)
+                outcomes[drive] = DriveScan(drive, "partial", len(entries), "cancelled")
+        else:
+            for drive, entries in results.items():
+                if drive in scanner.unreachable:
+                    outcomes[drive] = DriveScan(drive, "unreachable", 0, scanner.unreachable[drive])
+                elif drive in scanner.expired:
+                    if scanner.expired[drive] != "cancelled":
+                        self.health.trip(drive, scanner.expired[drive])
+                    self.store_partial(drive, entries)
+                    outcomes[drive] = DriveScan(drive, "partial", len(entries), scanner.expired[drive])
+                elif drive in scanner.unreadable:
+                    unreadable = scanner.unreadable[drive]
+                    self.index.replace_drive(drive, self.drive_id(drive), entries, keep=unreadable)
+                    outcomes[drive] = DriveScan(drive, "partial", len(entries), f"{len(unreadable)} folders unreadable")
+                else:
+                    self.index.replace_drive(drive, self.drive_id(drive), entries)
+                    outcomes[drive] = DriveScan(drive, "complete", len(entries))
+        self.tuner.save()
+        return [outcomes.get(drive, DriveScan(drive, "partial", 0, "cancelled")) for drive in drives]
+
+    def store_partial(self, drive, entries):
+        # Keep the das folders that were listed completely, on top of what was indexed before
+        listings = {}
+        for entry in entries:
+            listings.setdefault(os.path.dirname(entry.path), []).append(entry)
+        self.index.apply_rescan(drive, self.drive_id(drive), {}, listings, [])
+
+    def rescan(self, drives, incremental=True, cancel=None, on_listing=None):
+        """
+        Bring the index up to date with every drive, each on its own
+        thread, and yield (drive, status, result) as each one ends (see
+        drive_health.run_drives for the statuses). Only directories whose
+        mtime moved are listed again, unless incremental is False.
+
+        on_listing(drive, added, removed) is called from the drive's
+        thread after every das folder that changed, through the drive's
+        token, so nothing arrives from a drive that has been given up on.
+        """
+        def scan_drive(drive, token):
+            listing = None if on_listing is None else partial(token.call, on_listing, drive)
+            return rescan_drive(self.index, drive, self.drive_id(drive), full=not incremental,
+                                on_listing=listing, cancel=token)
+
+        return run_drives(drives, scan_drive, self.health, cancel, self.drive_budget, self.stall_timeout)
+
+    def sync_logs(self, drives, incremental=False, cancel=None):
+        """
+        Index the flight files each drive's RECORDS.LOG refers to, each
+        drive on its own thread, and yield (drive, status, result) as they
+        end, result being a LogSync for a drive that finished.
+
+        Every folder the log refers to is listed once (reconcile()). With
+        incremental, a drive whose log and folders all kept their mtimes
+        is not read at all. A drive with no readable log keeps what the
+        index has for it and reports why in LogSync.problem.
+        """
+        def sync_drive(drive, token):
+            if incremental and snapshot_unchanged(self.index.load_dir_snapshot(drive)):
+                return LogSync([], [])
+            started = time.time()
+            log_path = find_log(drive)
+            if log_path is None:
+                return LogSync([], [], "no RECORDS.LOG")
+            token.check()
+            result = RecordLogParser.parse_mapped(str(log_path), self.log_classifier)
+            if not result.ok:
+                return LogSync([], [], f"RECORDS.LOG unreadable ({result.error})")
+            report = reconcile(result.flights, RECORDED_ROOT, drive, cancel=token)
+            entries = report.entries()
+            old_entries = self.index.load_drive_entries(drive) if incremental else []
+            # A drive given up on mid-read must not overwrite what the index has
+            token.check()
+            self.index.replace_drive(drive, self.drive_id(drive), entries)
+            snapshot = take_snapshot([str(log_path)], 'log', started)
+            snapshot.update(take_snapshot(report.listed, 'dir', started))
+            self.index.save_dir_states(drive, snapshot)
+            return LogSync(*diff_entries(old_entries, entries), describe_problems(report))
+
+        return run_drives(drives, sync_drive, self.health, cancel, self.drive_budget, self.stall_timeout)
+
+    def scan_log(self, drive, workers=1):
+        """
+        Parse what was appended to drive's RECORDS.LOG since the last time
+        and store its flights in the index. Returns the ParseResult, None
+        if the drive has no log (its stored log flights are then dropped).
+        A log that cannot be parsed keeps what the index has for the drive.
+        """
+        log_path = find_log(drive)
+        if log_path is None:
+            self.index.replace_log_flights(drive, self.drive_id(drive), [])
+            return None
+        result = RecordLogParser.parse_tail(str(log_path), self.index.load_log_state(drive),
+                                            classifier=self.log_classifier, workers=workers)
+        if result.ok:
+            self.index.apply_log_tail(drive, self.drive_id(drive), result.flights, result.kept, result.state)
+        return result
+
+    def reconcile_log(self, drive, cancel=None):
+        """
+        The RECORDS.LOG flights stored for drive checked against its
+        folders, as a Reconciliation: each flight's status and files.
+        """
+        return reconcile(self.index.load_log_flights([drive]), RECORDED_ROOT, drive, cancel=cancel)
+
+    def flights(self, drives=None):
+        """The indexed flights of drives (every drive for None) as a FlightCatalog."""
+        return self.index.load_flight_data(drives)
+
+    def copy(self, flight_data, keys, dest_dir, on_file=None):
+        """
+        Copy the files of the given flights of flight_data into dest_dir,
+        as many at a time per drive as the tuner allows. on_file(path,
+        error) is called from the copying threads after every file, error
+        being None when it was copied. Returns the number of files copied.
+        """
+        files = [(self.drive_of(key), file, size) for key in keys for file, size in flight_data.sized_files(key)]
+        return self.copy_files(files, dest_dir, on_file)
+
+    def copy_files(self, files, dest_dir, on_file=None):
+        """
+        Copy (drive, path, size in bytes) files into dest_dir, as many at a
+        time per drive as the tuner allows, reporting like copy().
+        """
+        copied = []
+        jobs = [(drive, max(size / MIB, 1.0), partial(self._copy_file, file, dest_dir, copied, on_file))
+                for drive, file, size in files]
+        run_tuned(jobs, self.tuner, "copy")
+        self.tuner.save()
+        return len(copied)
+
+    def delete(self, flight_data, keys, on_file=None):
+        """
+        Delete the files of the given flights of flight_data from their
+        drives and from the index. on_file(path, error) is called after
+        every file, error being None when it was deleted. Returns the
+        number of files deleted.
+        """
+        files = []
+        for key in keys:
+            record = flight_data.get(key)
+            if record is not None:
+                files.extend((flight_data.paths[dir_id], name) for dir_id, name in zip(record.dir_ids, record.names))
+        return self.delete_files(files, on_file)
+
+    def delete_files(self, files, on_file=None):
+        """Delete (das_dir, name) files from their drives and from the index, reporting like delete()."""
+        deleted = []
+        for das_dir, name in files:
+            file = Path(das_dir, name)
+            try:
+                os.remove(file)
+            except Exception as e:
+                _report(on_file, file, e)
+            else:
+                deleted.append((das_dir, name))
+                _report(on_file, file, None)
+        self.index.remove_files(deleted)
+        return len(deleted)
+
+    @staticmethod
+    def _copy_file(file, dest_dir, copied, on_file):
+        try:
+            shutil.copy2(file, dest_dir)
+        except Exception as e:
+            _report(on_file, file, e)
+        else:
+            # list.append is atomic, the copying threads share copied
+            copied.append(file)
+            _report(on_file, file, None)
+
+
+def find_log(drive):
+    """drive's RECORDS.LOG, None if it has none in any of LOG_PATHS."""
+    for log_path in LOG_PATHS:
+        log_path = Path(drive) / log_path
+        if log_path.exists():
+            return log_path
+    return None
+
+
+def describe_problems(report):
+    """What a Reconciliation found wrong, e.g. "2 missing, 1 orphaned"; None when nothing is."""
+    counts = report.counts()
+    problems = [f"{counts[status]} {label}" for status, label in
+                ((MISSING, "missing"), (SIZE_MISMATCH, "size mismatch"), (ORPHANED, "orphaned"))
+                if counts[status]]
+    return ", ".join(problems) or None
+
+
+def _report(on_file, file, error):
+    if on_file is not None:
+        on_file(file, error)
+
@@ -0,0 +1,106 @@
+from flight_table import FlightTable, np
+
+
+class FlightFilter:
+    """
+    Indexes over the columns of a FlightTable, for filtering and sorting
+    without looking at every flight.
+
+    Each indexed column keeps its values in ascending order next to the
+    row numbers in that order (FlightTable.order()). query(plane=[201]) or
+    query(date=(low, high)) finds each value or range end with a
+    searchsorted() on those values, so a condition's matches are one
+    slice of row numbers per value; the conditions are then intersected
+    through a row mask, and no flight is looked at one by one.
+
+    The indexes are built with the table, e.g. for one drive's flights on
+    the worker thread that read them, and update() merges another
+    filter's indexes into these: two sorted runs, so a drive finishing
+    costs a merge rather than a sort and the first query after it is as
+    quick as any other. remove() drops rows from the indexes in place.
+
+    The same indexes give the table's sort orders: order(column).
+    """
+
+    def __init__(self, table=None, columns=("date", "plane", "drive_id", "size", "start", "end")):
+        self.columns = columns
+        self.set_table(FlightTable() if table is None else table)
+
+    def __len__(self):
+        return len(self.table)
+
+    def set_table(self, table):
+        self.table = table
+        self._indexes = {}
+        for column in self.columns:
+            order = table.order(column)
+            self._indexes[column] = (table[column][order], order)
+
+    def update(self, other):
+        """Take in the rows of another FlightFilter, e.g. one built for a drive on a worker thread."""
+        offset = len(self.table)
+        for column in self.columns:
+            values, order = self._indexes[column]
+            other_values, other_order = other._indexes[column]
+            values = np.concatenate((values, other_values))
+            # Timsort finds the two sorted runs and merges them in one pass
+            merged = np.argsort(values, kind="stable")
+            self._indexes[column] = (values[merged], np.concatenate((order, other_order + offset))[merged])
+        self.table = self.table.concat(other.table)
+
+    def remove(self, keys):
+        gone = set(keys)
+        keep = np.fromiter((key not in gone for key in self.table.keys()), dtype=bool, count=len(self.table))
+        # Row numbers of the rows that stay, as they will be once the others are gone
+        renumber = np.cumsum(keep) - 1
+        for column, (values, order) in self._indexes.items():
+            kept = keep[order]
+            self._indexes[column] = (values[kept], renumber[order[kept]])
+        self.table = self.table.take(keep)
+
+    def clear(self):
+        self.set_table(FlightTable())
+
+    def index(self, column):
+        """(values in ascending order, their row numbers) for column."""
+        return self._indexes[column]
+
+    def order(self, column):
+        """Every row's key in ascending order of column."""
+        return self.table.keys_of(self.index(column)[1])
+
+    def rows(self, **conditions):
+        """
+        Row numbers of the table matching every condition, in row order, or
+        None when no condition is given. A condition is column=[values],
+        matching any of the values, or column=(low, high); either end of a
+        range may be None.
+        """
+        matches = []
+        for column, condition in conditions.items():
+            values, order = self.index(column)
+            if isinstance(condition, tuple):
+                low, high = condition
+                start = 0 if low is None else np.searchsorted(values, low, "left")
+                end = len(values) if high is None else np.searchsorted(values, high, "right")
+                matches.append(order[start:end])
+            else:
+                wanted = np.unique(np.asarray(condition, dtype=values.dtype))
+                starts = np.searchsorted(values, wanted, "left")
+                ends = np.searchsorted(values, wanted, "right")
+                matches.append(np.concatenate([order[0:0], *(order[s:e] for s, e in zip(starts, ends))]))
+        if not matches:
+            return None
+        # Intersecting from the smallest match keeps every step as small as the result
+        matches.sort(key=len)
+        found = matches[0]
+        for other in matches[1:]:
+            keep = np.zeros(len(self.table), dtype=bool)
+            keep[other] = True
+            found = found[keep[found]]
+        return np.sort(found)
+
+    def query(self, **conditions):
+        """The set of keys of rows(**conditions), or None when no condition is given."""
+        found = self.rows(**conditions)
+        return None if found is None else set(self.table.keys_of(found))
@@ -0,0 +1,411 @@
+import ctypes
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+from das_walker import FlightEntry
+from flight_catalog import FlightCatalog
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "FLIGHT_INDEX_PATH",
+    str(Path(__file__).with_name("flight_index.db")),
+)
+
+# File systems an index on which cannot use WAL: it needs memory shared by
+# every process with the file open, which only a local disk provides
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "fuse.sshfs", "fuse.glusterfs"}
+# GetDriveTypeW() of a mapped network drive letter
+DRIVE_REMOTE = 4
+
+
+class DirState(NamedTuple):
+    kind: str            # "dir", "das" or any marker a caller stores, e.g. "log"
+    mtime_ns: int
+    entry_count: int
+    scanned_at: float
+    children: tuple      # sub-directory names, only kept for "dir" rows
+
+
+class LogState(NamedTuple):
+    path: str            # the RECORDS.LOG it describes
+    inode: int
+    size: int
+    mtime_ns: int
+    offset: int          # just past the last complete entry parsed
+    flight_count: int    # flights stored from before offset
+    digest: bytes        # hash of the bytes just before offset
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drives (
+    drive       TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    drive_id    TEXT,
+    scanned_at  REAL,
+    PRIMARY KEY (drive, source)
+);
+CREATE TABLE IF NOT EXISTS das_dirs (
+    id          INTEGER PRIMARY KEY,
+    drive       TEXT NOT NULL,
+    path        TEXT NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS das_dirs_drive ON das_dirs(drive);
+CREATE TABLE IF NOT EXISTS files (
+    dir_id      INTEGER NOT NULL REFERENCES das_dirs(id) ON DELETE CASCADE,
+    name        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    flight_key  TEXT NOT NULL,
+    PRIMARY KEY (dir_id, name)
+);
+CREATE INDEX IF NOT EXISTS files_flight_key ON files(flight_key);
+CREATE TABLE IF NOT EXISTS dirs (
+    path         TEXT PRIMARY KEY,
+    drive        TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    mtime_ns     INTEGER NOT NULL,
+    entry_count  INTEGER NOT NULL,
+    scanned_at   REAL NOT NULL,
+    children     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS dirs_drive ON dirs(drive);
+CREATE TABLE IF NOT EXISTS log_flights (
+    drive          TEXT NOT NULL,
+    seq            INTEGER NOT NULL,
+    flight_key     TEXT NOT NULL,
+    date           TEXT,
+    plane_number   TEXT,
+    base_path      TEXT,
+    base_filename  TEXT,
+    size           INTEGER,
+    start_time     TEXT,
+    end_time       TEXT,
+    PRIMARY KEY (drive, seq)
+);
+CREATE TABLE IF NOT EXISTS log_state (
+    drive         TEXT PRIMARY KEY,
+    path          TEXT NOT NULL,
+    inode         INTEGER NOT NULL,
+    size          INTEGER NOT NULL,
+    mtime_ns      INTEGER NOT NULL,
+    offset        INTEGER NOT NULL,
+    flight_count  INTEGER NOT NULL,
+    digest        BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS io_tuning (
+    drive        TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    concurrency  INTEGER NOT NULL,
+    throughput   REAL,
+    latency      REAL,
+    updated_at   REAL NOT NULL,
+    PRIMARY KEY (drive, kind)
+);
+"""
+
+
+class FlightIndex:
+    """
+    Persistent flight index stored in a local SQLite file.
+
+    Scans write each drive's results here as soon as the drive finishes and
+    the GUI builds its table from the index, so a restart (or a second
+    workstation pointed at the same file through FLIGHT_INDEX_PATH) can show
+    the last known flights without walking the drives again.
+
+    A local index uses WAL, so readers never wait for a scan that is
+    writing. WAL does not work on a network share, so an index on one
+    (a UNC path, a mapped drive letter, an NFS or SMB mount) uses the
+    rollback journal instead; journal_mode overrides the choice.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, journal_mode=None):
+        self.path = str(path)
+        if journal_mode is None:
+            journal_mode = "DELETE" if on_network_share(self.path) else "WAL"
+        self.journal_mode = journal_mode
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the index usable from the
+        # Tk thread and the scan workers without sharing a connection object.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def scanned_drives(self, source="disk"):
+        """Return the set of drives with stored results from a disk walk ("disk") or RECORDS.LOG ("log")."""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT drive FROM drives WHERE source = ?", (source,))}
+
+    def replace_drive(self, drive, drive_id, entries, keep=()):
+        """
+        Replace everything stored for drive with the FlightEntry list from a
+        fresh scan. Stored das directories at or below a path in keep (ones
+        the scan could not read) are left as they were.
+        """
+        by_dir = {}
+        for entry in entries:
+            by_dir.setdefault(os.path.dirname(entry.path), []).append(entry)
+
+        with self._lock, self._connect() as conn:
+            if keep:
+                prefixes = tuple(os.path.join(path, '') for path in keep)
+                stale = [(path,) for (path,) in conn.execute("SELECT path FROM das_dirs WHERE drive = ?", (drive,))
+                         if path not in keep and not path.startswith(prefixes)]
+                conn.executemany("DELETE FROM das_dirs WHERE path = ?", stale)
+            else:
+                conn.execute("DELETE FROM das_dirs WHERE drive = ?", (drive,))
+            # The directory snapshot no longer matches what is stored
+            conn.execute("DELETE FROM dirs WHERE drive = ?", (drive,))
+            for das_dir, dir_entries in by_dir.items():
+                self._insert_das_dir(conn, drive, drive_id, das_dir, dir_entries)
+            self._touch_drive(conn, drive, "disk", drive_id)
+
+    def load_drive_entries(self, drive):
+        """Return the stored FlightEntry list for drive."""
+        query = (
+            "SELECT d.path, f.name, f.size, f.mtime, f.flight_key FROM files f "
+            "JOIN das_dirs d ON d.id = f.dir_id WHERE d.drive = ?"
+        )
+        with self._connect() as conn:
+            return [_entry_from_row(*row) for row in conn.execute(query, (drive,))]
+
+    def load_das_entries(self, das_dir):
+        """Return the stored FlightEntry list for a single das directory."""
+        query = (
+            "SELECT d.path, f.name, f.size, f.mtime, f.flight_key FROM files f "
+            "JOIN das_dirs d ON d.id = f.dir_id WHERE d.path = ?"
+        )
+        with self._connect() as conn:
+            return [_entry_from_row(*row) for row in conn.execute(query, (das_dir,))]
+
+    def load_das_dirs(self, drives=None):
+        """Return {das_dir: drive} for every das directory stored for drives."""
+        query = "SELECT path, drive FROM das_dirs"
+        params = ()
+        if drives is not None:
+            drives = list(drives)
+            query += f" WHERE drive IN ({','.join('?' * len(drives))})"
+            params = drives
+        with self._connect() as conn:
+            return dict(conn.execute(query, params).fetchall())
+
+    def load_dir_snapshot(self, drive):
+        """Return {path: DirState} recorded for drive by the last (incremental) scan."""
+        with self._connect() as conn:
+            return {
+                path: DirState(kind, mtime_ns, entry_count, scanned_at,
+                               tuple(children.split("\n")) if children else ())
+                for path, kind, mtime_ns, entry_count, scanned_at, children in conn.execute(
+                    "SELECT path, kind, mtime_ns, entry_count, scanned_at, children FROM dirs WHERE drive = ?",
+                    (drive,),
+                )
+            }
+
+    def apply_rescan(self, drive, drive_id, dir_states, das_listings, vanished, full=False):
+        """
+        Store the outcome of an incremental scan in one transaction.
+
+        dir_states:   {path: DirState} for every directory that was relisted
+        das_listings: {das_dir: [FlightEntry, ...]} for every relisted das directory
+        vanished:     paths from the previous snapshot that no longer exist
+        full:         the scan ignored the old snapshot, so drop everything stored for drive first
+        """
+        with self._lock, self._connect() as conn:
+            if full:
+                conn.execute("DELETE FROM das_dirs WHERE drive = ?", (drive,))
+                conn.execute("DELETE FROM dirs WHERE drive = ?", (drive,))
+            for path in vanished:
+                conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+                conn.execute("DELETE FROM das_dirs WHERE path = ?", (path,))
+            for das_dir, entries in das_listings.items():
+                conn.execute("DELETE FROM das_dirs WHERE path = ?", (das_dir,))
+                self._insert_das_dir(conn, drive, drive_id, das_dir, entries)
+            conn.executemany(
+                "INSERT OR REPLACE INTO dirs (path, drive, kind, mtime_ns, entry_count, scanned_at, children) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (path, drive, st.kind, st.mtime_ns, st.entry_count, st.scanned_at, "\n".join(st.children))
+                    for path, st in dir_states.items()
+                ],
+            )
+            self._touch_drive(conn, drive, "disk", drive_id)
+
+    def remove_files(self, files):
+        """Forget (das_dir, name) files, e.g. once they have been deleted from the drive."""
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM files WHERE name = ? AND dir_id = (SELECT id FROM das_dirs WHERE path = ?)",
+                [(name, das_dir) for das_dir, name in files],
+            )
+
+    def save_dir_states(self, drive, dir_states):
+        """Record {path: DirState} for drive, replacing the snapshot stored for it before."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM dirs WHERE drive = ?", (drive,))
+            conn.executemany(
+                "INSERT INTO dirs (path, drive, kind, mtime_ns, entry_count, scanned_at, children) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (path, drive, st.kind, st.mtime_ns, st.entry_count, st.scanned_at, "\n".join(st.children))
+                    for path, st in dir_states.items()
+                ],
+            )
+
+    def load_tuning(self):
+        """Return {(drive, kind): concurrency} as last saved by an io_tuner.ConcurrencyTuner."""
+        with self._connect() as conn:
+            return {
+                (drive, kind): concurrency
+                for drive, kind, concurrency in conn.execute("SELECT drive, kind, concurrency FROM io_tuning")
+            }
+
+    def save_tuning(self, rows):
+        """Store (drive, kind, concurrency, throughput, latency) rows, replacing earlier values."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO io_tuning (drive, kind, concurrency, throughput, latency, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(drive, kind, concurrency, throughput, latency, now)
+                 for drive, kind, concurrency, throughput, latency in rows],
+            )
+
+    def load_flight_data(self, drives=None):
+        """Build the scanners' flight_data FlightCatalog from the index."""
+        query = (
+            "SELECT f.flight_key, d.path, f.name, f.size FROM files f "
+            "JOIN das_dirs d ON d.id = f.dir_id"
+        )
+        params = ()
+        if drives is not None:
+            drives = list(drives)
+            query += f" WHERE d.drive IN ({','.join('?' * len(drives))})"
+            params = drives
+
+        flight_data = FlightCatalog()
+        with self._connect() as conn:
+            for key, das_dir, name, size in conn.execute(query, params):
+                flight_data.add(key, das_dir, name, size)
+        return flight_data
+
+    def replace_log_flights(self, drive, drive_id, flights):
+        """Replace the RECORDS.LOG flights stored for drive with the parser's output."""
+        self.apply_log_tail(drive, drive_id, flights, 0, None)
+
+    def apply_log_tail(self, drive, drive_id, flights, kept, state):
+        """
+        Store the outcome of RecordLogParser.parse_tail() in one transaction:
+        keep the first <kept> flights stored for drive, append <flights>
+        after them and record state, the LogState the next tail parse
+        starts from (None forgets it, forcing a full parse).
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM log_flights WHERE drive = ? AND seq >= ?", (drive, kept))
+            conn.executemany(
+                "INSERT INTO log_flights (drive, seq, flight_key, date, plane_number, base_path, "
+                "base_filename, size, start_time, end_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (drive, seq, f"{f['date']}_{f['plane_number']}_{drive_id}", f['date'],
+                     f['plane_number'], f['base_path'], f['base_filename'], f['size'],
+                     f['start_time'], f['end_time'])
+                    for seq, f in enumerate(flights, start=kept)
+                ],
+            )
+            if state is None:
+                conn.execute("DELETE FROM log_state WHERE drive = ?", (drive,))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO log_state (drive, path, inode, size, mtime_ns, offset, "
+                    "flight_count, digest) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (drive, *state),
+                )
+            self._touch_drive(conn, drive, "log", drive_id)
+
+    def load_log_state(self, drive):
+        """Return the LogState the last tail parse of drive's RECORDS.LOG left, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT path, inode, size, mtime_ns, offset, flight_count, digest FROM log_state WHERE drive = ?",
+                (drive,),
+            ).fetchone()
+        return None if row is None else LogState(*row)
+
+    def load_log_flights(self, drives=None):
+        """Return the stored RECORDS.LOG flights as parser-style dicts with a 'drive' field, in log order."""
+        query = (
+            "SELECT drive, date, plane_number, base_path, base_filename, size, start_time, end_time "
+            "FROM log_flights"
+        )
+        params = ()
+        if drives is not None:
+            drives = list(drives)
+            query += f" WHERE drive IN ({','.join('?' * len(drives))})"
+            params = drives
+        query += " ORDER BY drive, seq"
+
+        columns = ("drive", "date", "plane_number", "base_path", "base_filename",
+                   "size", "start_time", "end_time")
+        with self._connect() as conn:
+            return [dict(zip(columns, row)) for row in conn.execute(query, params)]
+
+    def _insert_das_dir(self, conn, drive, drive_id, das_dir, entries):
+        dir_id = conn.execute(
+            "INSERT INTO das_dirs (drive, path) VALUES (?, ?)", (drive, das_dir)
+        ).lastrowid
+        conn.executemany(
+            "INSERT OR REPLACE INTO files (dir_id, name, size, mtime, flight_key) VALUES (?, ?, ?, ?, ?)",
+            [
+                (dir_id, os.path.basename(e.path), e.size, e.mtime,
+                 f"{e.date}_{e.plane_number}_{drive_id}")
+                for e in entries
+            ],
+        )
+
+    def _touch_drive(self, conn, drive, source, drive_id):
+        conn.execute(
+            "INSERT OR REPLACE INTO drives (drive, source, drive_id, scanned_at) VALUES (?, ?, ?, ?)",
+            (drive, source, str(drive_id), time.time()),
+        )
+
+
+def _entry_from_row(das_dir, name, size, mtime, flight_key):
+    date, plane_number = flight_key.split("_")[:2]
+    return FlightEntry(date, plane_number, os.path.join(das_dir, name), size, mtime)
+
+
+def on_network_share(path):
+    """Whether path is on a network file system rather than a local disk, as far as can be told."""
+    if path.startswith(("\\\\", "//")):
+        return True
+    path = os.path.realpath(path)
+    if sys.platform == "win32":
+        drive = os.path.splitdrive(path)[0]
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == DRIVE_REMOTE
+    # The longest mount point path lies under decides its file system
+    mount_point, fs_type = "", None
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                # Mount points escape spaces as \040
+                mount = fields[1].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(mount_point):
+                    mount_point, fs_type = mount, fields[2]
+    except OSError:
+        return False
+    return fs_type in NETWORK_FILESYSTEMS
@@ -0,0 +1,133 @@
+import re
+import string
+
+
+class FilenameSchema:
+    """
+    One recorder naming scheme.
+
+    Classifying a name yields a (date, plane, segment) tuple: date as
+    DDMMYY, the way it appears in flight keys, the plane number, and the
+    file number ("000", "001", ...) or None when the name carries none.
+    Plain tuples rather than a NamedTuple, because building one per file
+    costs more than the regex itself.
+
+    regex is matched at the start of the file name and must define the
+    named groups `plane` and either `date` (DDMMYY) or `day`, `month` and
+    `year`; an optional `segment` group picks up the file number. Names
+    whose first character is not in `leading` are rejected before the
+    regex runs.
+    """
+
+    def __init__(self, name, regex, leading=string.digits):
+        self.name = name
+        self.regex = re.compile(regex)
+        self.leading = frozenset(leading)
+        groups = self.regex.groupindex
+        if {"date", "plane", "segment"} <= groups.keys():
+            # Common case: match.group() already returns the tuple, no reshaping needed
+            self._fields = (groups["date"], groups["plane"], groups["segment"])
+        else:
+            self._fields = None
+
+    def classify(self, name):
+        if name[:1] not in self.leading:
+            return None
+        match = self.regex.match(name)
+        return None if match is None else self._normalize(match)
+
+    def classify_many(self, names):
+        """Return one (date, plane, segment) tuple or None per name."""
+        leading = self.leading
+        # Names failing the prefix check are swapped for "" so the regex
+        # rejects them without scanning
+        matches = map(self.regex.match, [n if n[:1] in leading else "" for n in names])
+        if self._fields is None:
+            normalize = self._normalize
+            return [None if m is None else normalize(m) for m in matches]
+        fields = self._fields
+        return [None if m is None else m.group(*fields) for m in matches]
+
+    def _normalize(self, match):
+        if self._fields is not None:
+            return match.group(*self._fields)
+        groups = match.groupdict()
+        date = groups.get("date") or f"{groups['day']}{groups['month']}{groups['year']}"
+        return date, groups["plane"], groups.get("segment")
+
+    def __repr__(self):
+        return f"FilenameSchema({self.name!r}, {self.regex.pattern!r})"
+
+
+class FlightClassifier:
+    """
+    Turn file names into (date, plane, segment) tuples using an ordered
+    list of schemas.
+
+    The scanners only talk to a classifier, so a new recorder naming scheme
+    is supported by registering another FilenameSchema here. The first
+    schema that matches a name wins.
+    """
+
+    def __init__(self, schemas=()):
+        self.schemas = list(schemas)
+
+    def register(self, schema):
+        self.schemas.append(schema)
+        return schema
+
+    def classify(self, name):
+        for schema in self.schemas:
+            result = schema.classify(name)
+            if result is not None:
+                return result
+        return None
+
+    def classify_listing(self, names):
+        """
+        Classify a whole directory listing at once.
+
+        Returns [(position, (date, plane, segment)), ...] for the names that are flight
+        files, in listing order. Names rejected by every schema's prefix
+        check never reach a regex.
+        """
+        if len(self.schemas) == 1:
+            results = self.schemas[0].classify_many(names)
+            return [(i, result) for i, result in enumerate(results) if result is not None]
+        found = {}
+        remaining = list(range(len(names)))
+        for schema in self.schemas:
+            if not remaining:
+                break
+            results = schema.classify_many([names[i] for i in remaining])
+            unmatched = []
+            for i, result in zip(remaining, results):
+                if result is None:
+                    unmatched.append(i)
+                else:
+                    found[i] = result
+            remaining = unmatched
+        return sorted(found.items())
+
+
+# DDMMYY_PPP followed by anything, e.g. 011124_201.000 or 011124_201.001
+DAS_SCHEMA = FilenameSchema(
+    "das",
+    r"(?P<date>\d{6})_(?P<plane>\d+)(?:\.(?P<segment>\d+))?",
+)
+
+DEFAULT_CLASSIFIER = FlightClassifier([DAS_SCHEMA])
+
+# RECORDS.LOG header lines name a flight's first file, DDMMYY_PPP.000 with
+# exactly three plane digits; anything else in brackets is not a flight
+LOG_SCHEMA = FilenameSchema(
+    "records-log",
+    r"(?P<date>\d{6})_(?P<plane>\d{3})\.(?P<segment>000)",
+)
+
+LOG_CLASSIFIER = FlightClassifier([LOG_SCHEMA])
+
+
+def register_schema(schema):
+    """Teach the default classifier (and so every scanner) a new naming scheme."""
+    return DEFAULT_CLASSIFIER.register(schema)
@@ -0,0 +1,53 @@
+import threading
+from collections import deque
+
+
+class FlightStream:
+    """
+    Thread-safe hand-off of FlightEntry batches from scan or watch threads to
+    the Tk thread.
+
+    Producers call publish() as soon as a das folder has been listed. The Tk
+    side calls drain() from an after() callback and gets back at most
+    max_entries entries, so a folder with 100k recordings is fed to the
+    table in slices instead of freezing the window in one go.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batches = deque()
+        self._pending = 0
+
+    def publish(self, drive_id, added=(), removed=()):
+        with self._lock:
+            # Removals first so a file that changed size is replaced, not doubled
+            for kind, entries in (("remove", removed), ("add", added)):
+                if entries:
+                    self._batches.append([kind, drive_id, list(entries), 0])
+                    self._pending += len(entries)
+
+    def drain(self, max_entries=2000):
+        """Return up to max_entries entries as [(kind, drive_id, [FlightEntry, ...]), ...]."""
+        out = []
+        taken = 0
+        with self._lock:
+            while self._batches and taken < max_entries:
+                batch = self._batches[0]
+                kind, drive_id, entries, start = batch
+                end = min(len(entries), start + max_entries - taken)
+                out.append((kind, drive_id, entries[start:end]))
+                taken += end - start
+                if end == len(entries):
+                    self._batches.popleft()
+                else:
+                    batch[3] = end
+            self._pending -= taken
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._batches.clear()
+            self._pending = 0
+
+    def __len__(self):
+        return self._pending
@@ -0,0 +1,209 @@
+try:
+    import numpy as np
+except ImportError:
+    # Optional: only FlightTable needs it, the scanners and the index do not
+    np = None
+
+from flight_catalog import GB
+from record_log import log_time_key
+
+# One row per flight. date is YYYYMMDD so integer order is date order;
+# start and end are log_time_key() values, NO_TIME when the flight has no
+# log times so that those sort last.
+FLIGHT_DTYPE = [
+    ("date", "i4"),
+    ("plane", "i4"),
+    ("drive_id", "i4"),
+    ("size", "i8"),
+    ("files", "i4"),
+    ("start", "i8"),
+    ("end", "i8"),
+]
+
+# drive_id of flights on a drive missing from the drive mapping
+UNKNOWN_DRIVE = -1
+
+# start/end of a flight whose RECORDS.LOG times cannot be read
+NO_TIME = 2 ** 63 - 1
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("FlightTable needs numpy: pip install numpy")
+
+
+class FlightTable:
+    """
+    Flights as columns of a NumPy structured array (see FLIGHT_DTYPE).
+
+    Built once from a FlightCatalog or from RECORDS.LOG flights; after that
+    sorting, filtering and per-drive or per-plane totals are array
+    operations rather than loops over "date_plane_driveid" keys. sort(),
+    select(), take() and concat() return new tables, so they chain. Rows are turned back into flight keys (key(), keys()) or
+    display strings (display_row()) only for the rows that are actually
+    needed.
+
+    A table built from RECORDS.LOG flights also carries each row's
+    base_filename in names, and its keys are those names; a table from a
+    catalog derives its "date_plane_driveid" keys from the columns.
+    """
+
+    __slots__ = ("rows", "names")
+
+    def __init__(self, rows=None, names=None):
+        require_numpy()
+        self.rows = np.zeros(0, dtype=FLIGHT_DTYPE) if rows is None else rows
+        self.names = names
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """One row per flight of a FlightCatalog (no start/end times, those only come from logs)."""
+        require_numpy()
+        rows = np.empty(len(catalog), dtype=FLIGHT_DTYPE)
+        try:
+            # One split and one int() pass over all keys beats splitting them one by one
+            parts = '_'.join(catalog.flights).split('_')
+            fields = np.fromiter(map(int, parts), dtype="i8", count=len(parts)).reshape(-1, 3)
+        except ValueError:
+            # Some drive has no id ("Unknown"), fall back to the careful way
+            fields = np.array([_key_fields(key) for key in catalog.flights], dtype="i8").reshape(-1, 3)
+        ddmmyy = fields[:, 0]
+        rows["date"] = 20000000 + ddmmyy % 100 * 10000 + ddmmyy // 100 % 100 * 100 + ddmmyy // 10000
+        rows["plane"] = fields[:, 1]
+        rows["drive_id"] = fields[:, 2]
+        records = catalog.flights.values()
+        rows["size"] = np.fromiter((record.total_bytes for record in records), dtype="i8", count=len(rows))
+        rows["files"] = np.fromiter((len(record.names) for record in records), dtype="i4", count=len(rows))
+        rows["start"] = NO_TIME
+        rows["end"] = NO_TIME
+        return cls(rows)
+
+    @classmethod
+    def from_log_flights(cls, flights, drive_mapping):
+        """
+        One row per RECORDS.LOG flight dict, as FlightIndex.load_log_flights()
+        returns them, named by its base_filename.
+        """
+        require_numpy()
+        rows = np.empty(len(flights), dtype=FLIGHT_DTYPE)
+        columns = [
+            (int(f['date']), int(f['plane_number']), _int_or(drive_mapping.get(f['drive'])),
+             f['size'] or 0, 1, log_time_key(f['start_time'], NO_TIME), log_time_key(f['end_time'], NO_TIME))
+            for f in flights
+        ]
+        if columns:
+            rows[:] = columns
+        names = np.array([f['base_filename'] for f in flights], dtype=object)
+        return cls(rows, names)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, column):
+        return self.rows[column]
+
+    def order(self, column):
+        """Row numbers in ascending order of column, equal values in row order."""
+        return np.argsort(self.rows[column], kind="stable")
+
+    def sort(self, *columns, descending=False):
+        """Sort by one or more columns, the first one most significant. Stable, so sorts can be layered."""
+        keys = [-self.rows[c] if descending else self.rows[c] for c in columns]
+        if len(keys) == 1:
+            order = np.argsort(keys[0], kind="stable")
+        else:
+            # lexsort takes its most significant key last
+            order = np.lexsort(keys[::-1])
+        return self.take(order)
+
+    def mask(self, date_from=None, date_to=None, planes=None, drive_ids=None, min_size=None, max_size=None):
+        """Boolean array of the rows matching every given condition (dates as YYYYMMDD, sizes in bytes)."""
+        rows = self.rows
+        keep = np.ones(len(rows), dtype=bool)
+        if date_from is not None:
+            keep &= rows["date"] >= date_from
+        if date_to is not None:
+            keep &= rows["date"] <= date_to
+        if planes is not None:
+            keep &= np.isin(rows["plane"], list(planes))
+        if drive_ids is not None:
+            keep &= np.isin(rows["drive_id"], list(drive_ids))
+        if min_size is not None:
+            keep &= rows["size"] >= min_size
+        if max_size is not None:
+            keep &= rows["size"] <= max_size
+        return keep
+
+    def select(self, **conditions):
+        """A table of the rows matching mask(**conditions)."""
+        return self.take(self.mask(**conditions))
+
+    def take(self, rows):
+        """A table of the given row numbers (or boolean mask), in that order."""
+        return FlightTable(self.rows[rows], None if self.names is None else self.names[rows])
+
+    def concat(self, other):
+        """This table's rows followed by other's, e.g. a drive's flights read on a worker thread."""
+        if not len(self):
+            return other
+        if not len(other):
+            return self
+        if (self.names is None) != (other.names is None):
+            raise ValueError("cannot join a catalog table and a log table")
+        names = None if self.names is None else np.concatenate((self.names, other.names))
+        return FlightTable(np.concatenate((self.rows, other.rows)), names)
+
+    def totals(self, by):
+        """
+        Per-group totals, by "drive_id", "plane" or "date": a structured
+        array with the group value and its flight count, file count and
+        size in bytes, ordered by group.
+        """
+        groups, inverse = np.unique(self.rows[by], return_inverse=True)
+        totals = np.empty(len(groups), dtype=[(by, "i4"), ("flights", "i8"), ("files", "i8"), ("size", "i8")])
+        totals[by] = groups
+        totals["flights"] = np.bincount(inverse, minlength=len(groups))
+        totals["files"] = np.bincount(inverse, weights=self.rows["files"], minlength=len(groups))
+        totals["size"] = np.bincount(inverse, weights=self.rows["size"], minlength=len(groups))
+        return totals
+
+    def key(self, i):
+        """The flight key of row i: its name, or "DDMMYY_plane_driveid"."""
+        return self.keys_of([i])[0]
+
+    def keys(self):
+        return self.keys_of(slice(None))
+
+    def keys_of(self, rows):
+        """Flight keys of the given row numbers (or slice), for copying and deleting."""
+        if self.names is not None:
+            return self.names[rows].tolist()
+        rows = self.rows[rows]
+        date = rows["date"]
+        ddmmyy = (date % 100 * 10000 + date // 100 % 100 * 100 + date // 10000 % 100).tolist()
+        return [f"{d:06d}_{p}_{_drive_label(i)}"
+                for d, p, i in zip(ddmmyy, rows["plane"].tolist(), rows["drive_id"].tolist())]
+
+    def display_row(self, i):
+        """(DD/MM/YY, plane, drive id, "N files", size in GB) as the scanner tables show a flight."""
+        row = self.rows[i]
+        date = int(row["date"])
+        return (f"{date % 100:02d}/{date // 100 % 100:02d}/{date // 10000 % 100:02d}", int(row["plane"]),
+                _drive_label(int(row["drive_id"])), f"{row['files']} files", f"{row['size'] / GB:.2f}")
+
+
+def _key_fields(key):
+    date, plane, drive_id = key.split('_')
+    return int(date), int(plane), _int_or(drive_id)
+
+
+def _int_or(value, default=UNKNOWN_DRIVE):
+    # Drives missing from the mapping show up as "Unknown" in keys
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _drive_label(drive_id):
+    return "Unknown" if drive_id == UNKNOWN_DRIVE else drive_id
@@ -0,0 +1,242 @@
+import ctypes
+import ctypes.util
+import os
+from abc import ABC, abstractmethod
+import select
+import struct
+import sys
+import threading
+import time
+
+from das_walker import FlightEntry, iter_das_entries
+from flight_schema import DEFAULT_CLASSIFIER
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_CLOSE_WRITE | IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _DasWatcher(ABC):
+    """
+    Common bookkeeping for the watchers: remembers the last seen FlightEntry
+    per file and reports differences as on_change(added, removed) from the
+    watcher thread. A file that grew is reported as removed (old entry) and
+    added (new entry), the same shape flight_catalog.diff_entries returns.
+    The das directories are first listed on the watcher thread too, so
+    start() returns at once however many of them there are.
+    """
+
+    def __init__(self, das_dirs, on_change, classifier=DEFAULT_CLASSIFIER):
+        self.das_dirs = list(das_dirs)
+        self.on_change = on_change
+        self.classifier = classifier
+        self.known = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _refresh(self, paths):
+        """Re-stat paths and report whatever changed since they were last seen."""
+        added, removed = [], []
+        for path in paths:
+            old = self.known.get(path)
+            new = self._stat_entry(path)
+            if new == old:
+                continue
+            if old is not None:
+                removed.append(old)
+                del self.known[path]
+            if new is not None:
+                added.append(new)
+                self.known[path] = new
+        if added or removed:
+            self.on_change(added, removed)
+
+    def _stat_entry(self, path):
+        name = self.classifier.classify(os.path.basename(path))
+        if name is None:
+            return None
+        date, plane_number, _ = name
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return FlightEntry(date, plane_number, path, st.st_size, st.st_mtime)
+
+    def _watch(self):
+        for das_dir in self.das_dirs:
+            if self._stop.is_set():
+                break
+            for entry in iter_das_entries(das_dir, self.classifier):
+                self.known[entry.path] = entry
+        self._run()
+
+    @abstractmethod
+    def _run(self):
+        """Watch the das directories until stop() and report changes through _refresh() or on_change."""
+
+
+class PollingWatcher(_DasWatcher):
+    """Relist every das directory each interval seconds. Works on any mount."""
+
+    def __init__(self, das_dirs, on_change, classifier=DEFAULT_CLASSIFIER, interval=5.0):
+        super().__init__(das_dirs, on_change, classifier)
+        self.interval = interval
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = {}
+            for das_dir in self.das_dirs:
+                for entry in iter_das_entries(das_dir, self.classifier):
+                    current[entry.path] = entry
+            added = [e for path, e in current.items() if self.known.get(path) != e]
+            removed = [e for path, e in self.known.items() if current.get(path) != e]
+            self.known = current
+            if added or removed:
+                self.on_change(added, removed)
+
+
+class InotifyWatcher(_DasWatcher):
+    """
+    Subscribe to inotify events on every das directory (Linux only).
+
+    IN_MODIFY fires on every write while a recording grows, so modified
+    files are collected and re-stat'ed at most once per coalesce_interval.
+    Creates, closes, moves and deletes are reported straight away.
+    """
+
+    def __init__(self, das_dirs, on_change, classifier=DEFAULT_CLASSIFIER, coalesce_interval=1.0):
+        super().__init__(das_dirs, on_change, classifier)
+        self.coalesce_interval = coalesce_interval
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_dirs = {}
+        try:
+            for das_dir in self.das_dirs:
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(das_dir), WATCH_MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, f"inotify_add_watch failed: {os.strerror(errno)}", das_dir)
+                self._wd_dirs[wd] = das_dir
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _run(self):
+        modified = set()
+        last_flush = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([self._fd], [], [], 0.5)
+                if readable:
+                    urgent = set()
+                    for mask, path in self._read_events():
+                        if mask & IN_Q_OVERFLOW:
+                            # Kernel dropped events - fall back to a full relist
+                            urgent.update(self._relist_all())
+                        elif path is None:
+                            continue
+                        elif mask & IN_MODIFY:
+                            modified.add(path)
+                        else:
+                            urgent.add(path)
+                            modified.discard(path)
+                    if urgent:
+                        self._refresh(urgent)
+                now = time.monotonic()
+                if modified and now - last_flush >= self.coalesce_interval:
+                    self._refresh(modified)
+                    modified = set()
+                    last_flush = now
+        finally:
+            os.close(self._fd)
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            das_dir = self._wd_dirs.get(wd)
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                # The das directory itself went away
+                if das_dir is not None:
+                    yield from ((IN_DELETE, path) for path in list(self.known)
+                                if os.path.dirname(path) == das_dir)
+                continue
+            if das_dir is None or mask & IN_ISDIR or not name:
+                yield mask, None
+                continue
+            yield mask, os.path.join(das_dir, os.fsdecode(name))
+
+    def _relist_all(self):
+        paths = set(self.known)
+        for das_dir in self.das_dirs:
+            paths.update(entry.path for entry in iter_das_entries(das_dir, self.classifier))
+        return paths
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def inotify_available():
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        return hasattr(_load_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+
+def create_watcher(das_dirs, on_change, mode="auto", poll_interval=5.0):
+    """
+    Build a started watcher for das_dirs.
+
+    mode="inotify" requires inotify, mode="poll" always polls, and
+    mode="auto" uses inotify when the platform supports it and every
+    directory accepts a watch, falling back to polling otherwise. Note that
+    SMB/CIFS mounts accept watches but only report local changes, so use
+    mode="poll" for drives that are written to by another machine.
+    """
+    if mode in ("auto", "inotify"):
+        try:
+            if not inotify_available():
+                raise OSError("inotify is not available on this platform")
+            return InotifyWatcher(das_dirs, on_change).start()
+        except OSError:
+            if mode == "inotify":
+                raise
+    return PollingWatcher(das_dirs, on_change, interval=poll_interval).start()
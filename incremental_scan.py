@@ -0,0 +1,196 @@
+import os
+import time
+
+from das_walker import iter_das_entries
+from flight_schema import DEFAULT_CLASSIFIER
+from flight_catalog import diff_entries
+from flight_index import DirState
+from scan_session import DriveUnreachable, ScanCancelled
+
+# Directory mtimes on FAT and some SMB servers only move in 2 second steps,
+# so a directory modified this close to the last scan could have changed
+# again without its mtime moving. Such directories are always relisted.
+MTIME_GRANULARITY = 2.0
+
+
+def is_unchanged(old, st):
+    return (
+        old is not None
+        and old.mtime_ns == st.st_mtime_ns
+        and st.st_mtime_ns / 1e9 < old.scanned_at - MTIME_GRANULARITY
+    )
+
+
+def take_snapshot(paths, kind, scanned_at):
+    """
+    Return {path: DirState} for every path that can be stat'ed. scanned_at
+    should be when the caller started reading those paths, so anything
+    modified while it was reading is picked up by the next rescan.
+    """
+    snapshot = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        snapshot[path] = DirState(kind, st.st_mtime_ns, 0, scanned_at, ())
+    return snapshot
+
+
+def snapshot_unchanged(snapshot):
+    """True when every path in a non-empty snapshot still has the mtime recorded for it."""
+    if not snapshot:
+        return False
+    for path, old in snapshot.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if not is_unchanged(old, st):
+            return False
+    return True
+
+
+def _list_subdirs(path):
+    children = []
+    entry_count = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            entry_count += 1
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    children.append(entry.name)
+            except OSError:
+                continue
+    return tuple(children), entry_count
+
+
+def rescan_drive(index, drive, drive_id, full=False, classifier=DEFAULT_CLASSIFIER, on_listing=None,
+                 cancel=None):
+    """
+    Bring the index up to date with <drive>/!shu_fd and return (added, removed).
+
+    Every directory remembered from the last scan costs a single stat. Only
+    directories whose mtime moved are listed again: a plain directory to pick
+    up new or deleted sub-directories, a das directory to re-read its flight
+    files. Unchanged directories reuse the child list stored in the index, so
+    a reload of a quiet drive never lists a single das folder.
+
+    With full=True (or when the drive has no snapshot yet) every directory is
+    listed and the drive's stored results are replaced wholesale.
+
+    on_listing(added, removed) is called after every das directory that was
+    listed again or vanished, so results can be shown while the walk is
+    still running. In a full scan it reports each folder's entries as
+    added; otherwise it reports the folder's changes since the last scan.
+
+    cancel is an optional CancelToken, checked before every directory and
+    every file stat. When it fires, the directories finished so far are
+    stored (never a half-listed one, and nothing is treated as vanished)
+    and ScanCancelled is raised. The index then matches everything that
+    was reported through on_listing, and the next rescan picks up where
+    this one stopped.
+
+    A drive whose !shu_fd cannot be stat'ed raises DriveUnreachable before
+    anything is stored. Below it, only a directory that is reported as not
+    found counts as vanished; one that cannot be stat'ed or listed for any
+    other reason keeps what the index has for it and everything under it.
+    """
+    snapshot = {} if full else index.load_dir_snapshot(drive)
+    full = full or not snapshot
+
+    old_entries = index.load_drive_entries(drive) if full else []
+    new_entries = []
+    dir_states = {}
+    das_listings = {}
+    seen = set()
+    # Directories that could not be read this time; what is stored under them stands
+    kept = []
+
+    root = os.path.join(drive, '!shu_fd')
+    try:
+        os.stat(root)
+    except OSError as e:
+        raise DriveUnreachable(e.errno, f"cannot reach {root}: {e.strerror}", root) from e
+
+    def keep_subtree(path):
+        # Unreadable right now, not gone: nothing under it may count as vanished
+        kept.append(path)
+        prefix = os.path.join(path, '')
+        seen.update(p for p in snapshot if p == path or p.startswith(prefix))
+
+    stack = [root]
+    while stack:
+        if cancel is not None and cancel.cancelled:
+            index.apply_rescan(drive, drive_id, dir_states, das_listings, [])
+            raise ScanCancelled()
+        path = stack.pop()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        except OSError:
+            keep_subtree(path)
+            continue
+        seen.add(path)
+        old = snapshot.get(path)
+        is_das = os.path.basename(path) == 'das'
+
+        if is_unchanged(old, st):
+            if not is_das:
+                stack.extend(os.path.join(path, child) for child in old.children)
+            continue
+
+        scanned_at = time.time()
+        if is_das:
+            try:
+                entries = list(iter_das_entries(path, classifier, cancel, strict=True))
+            except ScanCancelled:
+                # Keep the folders finished before this one
+                index.apply_rescan(drive, drive_id, dir_states, das_listings, [])
+                raise
+            except OSError:
+                keep_subtree(path)
+                continue
+            das_listings[path] = entries
+            dir_states[path] = DirState('das', st.st_mtime_ns, len(entries), scanned_at, ())
+            new_entries.extend(entries)
+            previous = index.load_das_entries(path) if old is not None else []
+            old_entries.extend(previous)
+            if on_listing is not None:
+                on_listing(*diff_entries(previous, entries))
+        else:
+            try:
+                children, entry_count = _list_subdirs(path)
+            except OSError:
+                keep_subtree(path)
+                continue
+            dir_states[path] = DirState('dir', st.st_mtime_ns, entry_count, scanned_at, children)
+            stack.extend(os.path.join(path, child) for child in children)
+
+    if full and kept:
+        # A full scan would drop everything stored for the drive, including
+        # what is under the unreadable directories: store it as a rescan
+        # instead, with every stored directory that was not seen as vanished
+        stored = {**index.load_das_dirs([drive]), **index.load_dir_snapshot(drive)}
+        prefixes = tuple(os.path.join(path, '') for path in kept)
+        for path in stored:
+            if path in kept or path.startswith(prefixes):
+                seen.add(path)
+                if path not in das_listings:
+                    # Still stored, so not removed
+                    new_entries.extend(index.load_das_entries(path))
+        vanished = [path for path in stored if path not in seen]
+        index.apply_rescan(drive, drive_id, dir_states, das_listings, vanished)
+        return diff_entries(old_entries, new_entries)
+
+    vanished = [path for path in snapshot if path not in seen]
+    for path in vanished:
+        if snapshot[path].kind == 'das':
+            previous = index.load_das_entries(path)
+            old_entries.extend(previous)
+            if on_listing is not None:
+                on_listing([], previous)
+
+    index.apply_rescan(drive, drive_id, dir_states, das_listings, vanished, full=full)
+    return diff_entries(old_entries, new_entries)
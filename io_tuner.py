@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import defaultdict, deque
+from typing import NamedTuple
+
+MIB = 1024 * 1024
+
+
+class TuningPolicy(NamedTuple):
+    initial: int
+    minimum: int
+    maximum: int
+    latency_cap: float   # seconds per unit at the 90th percentile
+
+
+# A "scan" unit is one directory listing or file stat, a "copy" unit one MiB
+# (small files count as a whole MiB so their fixed per-file cost does not look
+# like a slow link)
+DEFAULT_POLICIES = {
+    "scan": TuningPolicy(initial=4, minimum=1, maximum=16, latency_cap=0.05),
+    "copy": TuningPolicy(initial=2, minimum=1, maximum=16, latency_cap=1.0),
+}
+
+
+class _Controller:
+    """
+    Hill-climbing concurrency for one (drive, kind).
+
+    Every window it compares the throughput (units per second) with the
+    previous window. A step that paid off is repeated, one that did not is
+    reversed, so the limit settles around the knee of the throughput curve.
+    If the 90th percentile latency goes over the cap the limit is cut by a
+    third, whatever throughput says.
+    """
+
+    def __init__(self, policy, limit, window, min_ops, tolerance):
+        self.policy = policy
+        self.limit = max(policy.minimum, min(policy.maximum, limit))
+        self.window = window
+        self.min_ops = min_ops
+        self.tolerance = tolerance
+        self.direction = 1
+        self.throughput = None
+        self.latency = None
+        self._reset(time.monotonic())
+
+    def _reset(self, now):
+        self._window_start = now
+        self._units = 0.0
+        self._latencies = []
+
+    def record(self, seconds, units):
+        units = max(units, 1e-9)
+        self._units += units
+        self._latencies.append(seconds / units)
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= self.window and len(self._latencies) >= self.min_ops:
+            latencies = sorted(self._latencies)
+            self._step(self._units / elapsed, latencies[int(len(latencies) * 0.9)])
+            self._reset(now)
+
+    def _step(self, throughput, latency):
+        policy = self.policy
+        if latency > policy.latency_cap:
+            self.limit = max(policy.minimum, self.limit * 2 // 3)
+            # Probe upwards again from the lower level once latency recovers
+            self.direction = 1
+        else:
+            if self.throughput is not None and throughput < self.throughput * (1 + self.tolerance):
+                self.direction = -self.direction
+            self.limit = max(policy.minimum, min(policy.maximum, self.limit + self.direction))
+        self.throughput = throughput
+        self.latency = latency
+
+
+class ConcurrencyTuner:
+    """
+    Per-drive I/O concurrency that adapts to what each drive can take.
+
+    Workers ask limit(drive, kind) how many operations may be outstanding on
+    a drive and report every finished one with record(). The limits start
+    from the values saved in the FlightIndex by the previous session (or the
+    policy's initial value) and save() stores them back, so a NAS and a
+    local SSD each keep the concurrency they were tuned to.
+    """
+
+    def __init__(self, index=None, policies=DEFAULT_POLICIES, window=1.0, min_ops=8, tolerance=0.05):
+        self.index = index
+        self.policies = policies
+        self.window = window
+        self.min_ops = min_ops
+        self.tolerance = tolerance
+        self._lock = threading.Lock()
+        self._controllers = {}
+        self._saved = index.load_tuning() if index is not None else {}
+
+    def _controller(self, drive, kind):
+        controller = self._controllers.get((drive, kind))
+        if controller is None:
+            policy = self.policies[kind]
+            limit = self._saved.get((drive, kind), policy.initial)
+            controller = self._controllers[(drive, kind)] = _Controller(
+                policy, limit, self.window, self.min_ops, self.tolerance)
+        return controller
+
+    def limit(self, drive, kind="scan"):
+        with self._lock:
+            return self._controller(drive, kind).limit
+
+    def record(self, drive, seconds, units=1, kind="scan"):
+        with self._lock:
+            self._controller(drive, kind).record(seconds, units)
+
+    def snapshot(self):
+        """Return [(drive, kind, concurrency, throughput, latency), ...] for every tuned drive."""
+        with self._lock:
+            return [(drive, kind, c.limit, c.throughput, c.latency)
+                    for (drive, kind), c in self._controllers.items()]
+
+    def save(self):
+        if self.index is not None:
+            self.index.save_tuning(self.snapshot())
+
+
+def run_tuned(jobs, tuner, kind="copy", max_workers=16, on_error=None):
+    """
+    Run func() for every (drive, units, func) job with at most
+    tuner.limit(drive, kind) jobs running per drive, feeding each job's
+    duration back into the tuner. Jobs on different drives run side by
+    side; the limit is re-read before every job, so it follows the tuner
+    as it moves. on_error(exception) is called for a job that raises.
+    """
+    queues = defaultdict(deque)
+    for drive, units, func in jobs:
+        queues[drive].append((units, func))
+    active = defaultdict(int)
+    cond = threading.Condition()
+
+    def take():
+        with cond:
+            while any(queues.values()):
+                for drive, queued in queues.items():
+                    if queued and active[drive] < tuner.limit(drive, kind):
+                        active[drive] += 1
+                        return drive, queued.popleft()
+                # The limit may rise with the next record(), so do not wait forever
+                cond.wait(0.1)
+            return None
+
+    def work():
+        while True:
+            task = take()
+            if task is None:
+                return
+            drive, (units, func) = task
+            start = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+            finally:
+                tuner.record(drive, time.perf_counter() - start, units, kind)
+                with cond:
+                    active[drive] -= 1
+                    cond.notify_all()
+
+    workers = [threading.Thread(target=work, daemon=True) for _ in range(max(1, max_workers))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
@@ -5,15 +5,18 @@ from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
 
+from drive_config import load_drive_mapping
+
 class FlightFileManager:
     def __init__(self, root, network_drives):
         self.root = root
         self.network_drives = network_drives
         self.flight_data = []
-        self.drive_mapping = {
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "C:/": 61,
             "Y:/": 62,
-        }
+        })
         self.init_gui()
     
     def init_gui(self):
@@ -1,25 +1,42 @@
-import os
 import random
-import re
 from pathlib import Path
-import shutil
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, font
-from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
 
+from drive_config import load_drive_mapping
+from flight_catalog import FlightCatalog, add_entries, deleted_entries, remove_entries
+from flight_engine import FlightEngine
+from flight_schema import DEFAULT_CLASSIFIER
+from scan_session import ScanSessions
+from ui_channel import UiChannel
+
 class FlightFileManager:
     def __init__(self, root, network_drives):
         self.root = root
+        # Worker threads reach the window only through this, never through Tk directly
+        self.ui = UiChannel(self.root)
+        self.ui.start()
         self.network_drives = network_drives
-        self.flight_data = {}
-        self.drive_mapping = {
+        self.flight_data = FlightCatalog()
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "C:/": 61, "E:/": 63, "Y:/": 62, "D:/": 64,
             "G:/": 65, "H:/": 66, "I:/": 67,
-        }
-        self.scan_complete = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        })
+        # Starting a scan cancels the one still running instead of racing it
+        self.sessions = ScanSessions()
+        # {drive: what the last scan found wrong with its RECORDS.LOG}, for the status line
+        self.drive_problems = {}
+        # Reads the logs into the index, and copies and deletes; a drive that
+        # runs over its time budget or stalls keeps its indexed flights and
+        # is skipped until it answers a probe
+        # This window has always listed RECORDS.LOG flights whatever the
+        # length of their plane number
+        self.engine = FlightEngine(self.drive_mapping, log_classifier=DEFAULT_CLASSIFIER)
+        self.index = self.engine.index
+        self.health = self.engine.health
         self.init_gui()
 
     def init_gui(self):
@@ -52,9 +69,12 @@ class FlightFileManager:
         self.delete_btn = tk.Button(self.btn_frame, text="Delete", command=self.delete_files)
         self.delete_btn.pack(side="right", padx=5, pady=5)
 
-        self.reload_btn = tk.Button(self.btn_frame, text="Reload", command=self.load_files)
+        self.reload_btn = tk.Button(self.btn_frame, text="Reload", command=self.reload_files)
         self.reload_btn.pack(side="right", padx=5, pady=5)
 
+        self.stop_btn = tk.Button(self.btn_frame, text="Stop", command=self.stop_scan)
+        self.stop_btn.pack(side="right", padx=5, pady=5)
+
         self.easter_egg_btn = tk.Button(self.btn_frame, text="Easter Egg", command=self.display_easter_egg)
         self.easter_egg_btn.pack(side="left", padx=5, pady=5)
 
@@ -65,7 +85,7 @@ class FlightFileManager:
         self.status_label = tk.Label(self.root, text="Ready")
         self.status_label.pack(pady=5)
 
-        self.root.after(100, self.load_files)
+        self.root.after(100, self.load_cached_flights)
 
     def easter_egg_message(self):
         messages = [
@@ -78,71 +98,93 @@ class FlightFileManager:
     def display_easter_egg(self):
         messagebox.showinfo("Easter Egg", self.easter_egg_message())
 
-    def load_files(self):
-        self.status_label.config(text="Loading files...")
+    def load_cached_flights(self):
+        # Only re-read the logs on startup if the index has never seen some of the drives
+        if not set(self.network_drives) <= self.index.scanned_drives():
+            self.load_files()
+            return
+        self.flight_data = self.index.load_flight_data(self.network_drives)
+        self.display_flights()
+
+    def load_files(self, incremental=False):
+        session, previous = self.sessions.start(full=not incremental)
+        self.status_label.config(text="Reloading files..." if incremental else "Loading files...")
         self.progress_var.set(0)
         self.table.delete(*self.table.get_children())
-        self.scan_complete.clear()
-        threading.Thread(target=self.scan_flight_records, daemon=True).start()
-        self.root.after(100, self.check_scan_complete)
+        threading.Thread(target=self.scan_flight_records, args=(session, previous, incremental), daemon=True).start()
+        self.root.after(100, self.check_scan_complete, session)
+
+    def reload_files(self):
+        self.load_files(incremental=True)
+
+    def stop_scan(self):
+        if self.sessions.cancel():
+            self.status_label.config(text="Stopping scan...")
 
-    def check_scan_complete(self):
-        if self.scan_complete.is_set():
+    def check_scan_complete(self, session):
+        if not self.sessions.is_current(session):
+            # Superseded - the newer scan polls for itself
+            return
+        if session.done.is_set():
             self.display_flights()
+            if session.cancelled:
+                self.status_label.config(text="Scan stopped - showing partial results")
+            elif self.drive_problems:
+                drives = "; ".join(f"{drive} {problem}" for drive, problem in sorted(self.drive_problems.items()))
+                self.status_label.config(text=f"Ready - check: {drives}")
+            elif self.health.degraded:
+                drives = ", ".join(f"{drive} ({reason})" for drive, reason in sorted(self.health.degraded.items()))
+                self.status_label.config(text=f"Ready - degraded: {drives}")
         else:
-            self.root.after(100, self.check_scan_complete)
+            self.root.after(100, self.check_scan_complete, session)
+
+    def scan_flight_records(self, session, previous=None, incremental=False):
+        try:
+            if previous is not None:
+                # Let the superseded scan finish storing the drives it completed
+                previous.done.wait()
+            self._scan_flight_records(session, incremental)
+        finally:
+            session.done.set()
 
-    def scan_flight_records(self):
+    def _scan_flight_records(self, session, incremental):
         start_time = time.time()
-        
-        def process_drive(drive):
-            drive_data = []
-            records_log = Path(drive) / '!shu_fd' / 'RECORDS.LOG'
-            if records_log.exists():
-                with open(records_log, 'r') as f:
-                    for line in f:
-                        if line.startswith('[') and line.endswith(']\n'):
-                            file_path = line.strip('[]').strip()
-                            file_path = Path(file_path.replace('D:/', drive))
-                            if file_path.exists():
-                                match = re.search(r'(\d{6})_(\d+)', file_path.stem)
-                                if match:
-                                    date, plane_number = match.groups()
-                                    size = file_path.stat().st_size
-                                    drive_data.append({
-                                        "date": date,
-                                        "plane_number": plane_number,
-                                        "filepath": file_path,
-                                        "drive_id": self.drive_mapping.get(drive, "Unknown"),
-                                        "size": size
-                                    })
-            return drive_data
-
-        futures = [self.executor.submit(process_drive, drive) for drive in self.network_drives]
-
-        flight_data = {}
+        self.drive_problems = {}
+
+        def apply_diff(drive_id, added, removed):
+            remove_entries(self.flight_data, removed, drive_id)
+            add_entries(self.flight_data, added, drive_id)
+
+        # A cancelled, timed out or skipped drive, or one whose log is
+        # missing or unreadable, leaves its index rows untouched; the ones
+        # that finished are kept either way
+        outcomes = self.engine.sync_logs(self.network_drives, incremental, session.token)
+
         total_drives = len(self.network_drives)
-        for i, future in enumerate(futures):
-            for entry in future.result():
-                key = f"{entry['date']}_{entry['plane_number']}_{entry['drive_id']}"
-                if key not in flight_data:
-                    flight_data[key] = {"files": [], "total_size": 0}
-                flight_data[key]["files"].append(entry['filepath'])
-                flight_data[key]["total_size"] += entry['size'] / (1024 * 1024 * 1024)  # Convert to GB
-            self.progress_var.set((i + 1) / total_drives * 100)
-
-        self.flight_data = flight_data
+        for i, (drive, status, result) in enumerate(outcomes):
+            if status != "done":
+                print(f"{drive}: {status}")
+                continue
+            if result.problem:
+                self.drive_problems[drive] = result.problem
+            if incremental:
+                session.token.call(apply_diff, self.engine.drive_id(drive), result.added, result.removed)
+            if not session.cancelled:
+                self.ui.post("progress", self.progress_var.set, (i + 1) / total_drives * 100)
+
+        if not incremental:
+            session.token.call(setattr, self, "flight_data", self.index.load_flight_data(self.network_drives))
         end_time = time.time()
-        print(f"Scan completed in {end_time - start_time:.2f} seconds")
-        self.scan_complete.set()
+        state = "stopped" if session.cancelled else "completed"
+        print(f"Scan {state} after {end_time - start_time:.2f} seconds")
 
     def display_flights(self):
         start_time = time.time()
         for key, data in self.flight_data.items():
             date, plane_number, drive_id = key.split('_')
             formatted_date = f"{date[:2]}/{date[2:4]}/{date[4:]}"
-            total_size = round(data["total_size"], 2)
-            self.table.insert("", "end", values=(formatted_date, plane_number, drive_id, f"{len(data['files'])} files", f"{total_size:.2f}"))
+            total_size = round(data.total_size, 2)
+            self.table.insert("", "end", values=(formatted_date, plane_number, drive_id, f"{data.file_count} files", f"{total_size:.2f}"))
         end_time = time.time()
         print(f"Display completed in {end_time - start_time:.2f} seconds")
         self.status_label.config(text="Ready")
@@ -158,23 +200,29 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Copying files...")
-        threading.Thread(target=self._copy_files, args=(selected, dest_dir), daemon=True).start()
+        # The table and flight_data are read here, on the Tk thread; the worker
+        # gets its own copy of the selected flights
+        flights = self.flight_data.subset(self.selected_keys(selected))
+        threading.Thread(target=self._copy_files, args=(flights, dest_dir), daemon=True).start()
 
-    def _copy_files(self, selected, dest_dir):
+    def selected_keys(self, selected):
+        keys = []
         for item in selected:
             values = self.table.item(item, 'values')
             if values:
                 date, plane_number, drive_id, _, _ = values
                 unformatted_date = date.replace("/", "")
-                key = f"{unformatted_date}_{plane_number}_{drive_id}"
-                if key in self.flight_data:
-                    for file in self.flight_data[key]["files"]:
-                        try:
-                            shutil.copy2(file, dest_dir)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Copy Error", f"Error copying file {file}: {str(e)}")
-        self.root.after(0, messagebox.showinfo, "Copy Complete", "Selected files have been copied.")
-        self.root.after(0, self.status_label.config, {"text": "Ready"})
+                keys.append(f"{unformatted_date}_{plane_number}_{drive_id}")
+        return keys
+
+    def _copy_files(self, flights, dest_dir):
+        self.engine.copy(flights, list(flights), dest_dir, on_file=self.report_copy)
+        self.ui.call(messagebox.showinfo, "Copy Complete", "Selected files have been copied.")
+        self.ui.post("status", self.status_label.config, {"text": "Ready"})
+
+    def report_copy(self, file, error):
+        if error is not None:
+            self.ui.call(messagebox.showerror, "Copy Error", f"Error copying file {file}: {str(error)}")
 
     def delete_files(self):
         selected = self.table.selection()
@@ -187,24 +235,32 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Deleting files...")
-        threading.Thread(target=self._delete_files, args=(selected,), daemon=True).start()
+        flights = self.flight_data.subset(self.selected_keys(selected))
+        threading.Thread(target=self._delete_files, args=(flights,), daemon=True).start()
 
-    def _delete_files(self, selected):
-        for item in selected:
-            values = self.table.item(item, 'values')
-            if values:
-                date, plane_number, drive_id, _, _ = values
-                unformatted_date = date.replace("/", "")
-                key = f"{unformatted_date}_{plane_number}_{drive_id}"
-                if key in self.flight_data:
-                    for file in self.flight_data[key]["files"]:
-                        try:
-                            os.remove(file)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Deletion Error", f"Error deleting file {file}: {str(e)}")
-        self.root.after(0, self.load_files)
-        self.root.after(0, messagebox.showinfo, "Deletion Complete", "Selected files have been deleted.")
-        self.root.after(0, self.status_label.config, {"text": "Ready"})
+    def _delete_files(self, flights):
+        deleted = set()
+
+        def on_file(file, error):
+            if error is None:
+                deleted.add(Path(file))
+            self.report_delete(file, error)
+
+        self.engine.delete(flights, list(flights), on_file=on_file)
+        # The engine has already dropped the files from the index, so the
+        # reload has nothing left to diff them against: take them off here
+        for drive_id, removed in deleted_entries(flights, deleted).items():
+            self.ui.call(self.forget_deleted, drive_id, removed)
+        self.ui.call(messagebox.showinfo, "Deletion Complete", "Selected files have been deleted.")
+        # The reload sets the status line itself once it has finished
+        self.ui.call(self.reload_files)
+
+    def forget_deleted(self, drive_id, removed):
+        remove_entries(self.flight_data, removed, drive_id)
+
+    def report_delete(self, file, error):
+        if error is not None:
+            self.ui.call(messagebox.showerror, "Deletion Error", f"Error deleting file {file}: {str(error)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,425 @@
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+
+from das_walker import FlightEntry, iter_das_dirs, iter_das_entries
+from flight_schema import DEFAULT_CLASSIFIER
+from scan_session import DriveToken, ScanCancelled
+
+
+class SubtreeScanner:
+    """
+    Scan many drives with one pool of workers that share directory-sized tasks.
+
+    Each directory under !shu_fd is a task. A worker pushes the sub-directories
+    it discovers onto its own deque and keeps working depth-first from the
+    right end; an idle worker steals from the left end of another worker's
+    deque, which holds the oldest (and usually largest) subtrees. One huge
+    drive therefore keeps every worker busy instead of pinning a single
+    thread while the others sit idle.
+
+    max_workers caps the total number of directories being listed at once.
+    per_drive_limit caps how many of those may hit the same drive, either as
+    one number for every drive or as a {drive: limit} dict (None = no cap).
+    progress(dirs_done, dirs_pending, files_found) is called from the worker
+    threads at most every progress_interval seconds and once at the end.
+
+    scan() takes an optional CancelToken. Workers check it before every
+    directory and every file stat, and scan() then raises ScanCancelled
+    with the das folders that were listed completely as its partial.
+
+    drive_budget and stall_timeout (seconds, None = unlimited) bound each
+    drive separately. A drive that runs past its budget, or has listings
+    in flight but finishes none of them and stats no file for stall_timeout
+    seconds, is given up on: its queued directories are dropped, workers
+    stuck on it are left behind, and scan() returns whatever it listed
+    completely. Those drives end up in self.expired as {drive: reason}.
+    Once cancel fires, a drive with listings in flight that has not
+    checked in for cancel_grace seconds is given up on the same way, with
+    "cancelled" as its reason: that one is the user's doing, not the
+    drive's, and must not count against it.
+    A drive whose !shu_fd cannot be listed at all ends up in
+    self.unreachable as {drive: reason}, with no entries, so callers can
+    tell it from a drive that is really empty. Folders further down that
+    cannot be listed (access denied, a share that hiccuped) are skipped
+    but recorded in self.unreadable as {drive: [path, ...]}, so callers
+    do not mistake the flights under them for deleted ones.
+
+    With an io_tuner.ConcurrencyTuner as tuner, per_drive_limit is ignored:
+    each drive's limit is read from the tuner before every task and every
+    listing is reported back to it, so the limit follows what the drive
+    can take while the scan runs.
+    """
+
+    def __init__(self, max_workers=16, per_drive_limit=4, classifier=DEFAULT_CLASSIFIER,
+                 progress=None, progress_interval=0.1, drive_budget=None, stall_timeout=None,
+                 cancel_grace=2.0, tuner=None):
+        self.max_workers = max(1, max_workers)
+        self.per_drive_limit = per_drive_limit
+        self.classifier = classifier
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.drive_budget = drive_budget
+        self.stall_timeout = stall_timeout
+        self.cancel_grace = cancel_grace
+        self.tuner = tuner
+        self.expired = {}
+        self.unreachable = {}
+        self.unreadable = {}
+
+    def _limit_for(self, drive):
+        if self.tuner is not None:
+            return self.tuner.limit(drive, "scan")
+        if isinstance(self.per_drive_limit, dict):
+            return self.per_drive_limit.get(drive)
+        return self.per_drive_limit
+
+    def scan(self, drives, cancel=None):
+        """Scan <drive>/!shu_fd on every drive and return {drive: [FlightEntry, ...]}."""
+        drives = list(drives)
+        self._cancel = cancel
+        self._tokens = {drive: DriveToken(cancel, self.drive_budget, self.stall_timeout) for drive in drives}
+        self.expired = {}
+        self.unreachable = {}
+        self.unreadable = {}
+        self._roots = {drive: os.path.join(drive, '!shu_fd') for drive in drives}
+        self._queues = [deque() for _ in range(self.max_workers)]
+        self._cond = threading.Condition()
+        self._in_flight = {drive: 0 for drive in drives}
+        # Queued plus in-flight directories per drive
+        self._outstanding = {drive: 1 for drive in drives}
+        self._results = {drive: [] for drive in drives}
+        self._pending = 0
+        self._dirs_done = 0
+        self._files_found = 0
+        self._error = None
+        self._last_progress = 0.0
+
+        # Deal the drive roots out round-robin so every worker starts with something
+        for i, drive in enumerate(drives):
+            self._queues[i % self.max_workers].append((drive, self._roots[drive]))
+            self._pending += 1
+
+        # Every worker starts, even with a single drive: the idle ones steal the
+        # sub-directories the busy ones push, so one big drive is listed in parallel
+        workers = [threading.Thread(target=self._work, args=(i,), daemon=True) for i in range(self.max_workers)]
+        for worker in workers:
+            worker.start()
+        # Supervise instead of joining: a worker stuck on a dead drive may never return
+        with self._cond:
+            while not self._finished():
+                self._cond.wait(0.25)
+                self._expire_overdue()
+
+        if self._error is not None:
+            raise self._error
+        self._report_progress(force=True)
+        if cancel is not None and cancel.cancelled:
+            raise ScanCancelled(self._results)
+        return self._results
+
+    def _live_drives(self):
+        return [drive for drive in self._outstanding if drive not in self.expired]
+
+    def _finished(self):
+        if self._error is not None:
+            return True
+        if self._cancel is not None and self._cancel.cancelled:
+            return all(self._in_flight[drive] == 0 for drive in self._live_drives())
+        return all(self._outstanding[drive] == 0 for drive in self._live_drives())
+
+    def _expire_overdue(self):
+        now = time.monotonic()
+        cancelled = self._cancel is not None and self._cancel.cancelled
+        for drive in self._live_drives():
+            token = self._tokens[drive]
+            if self._in_flight[drive] == 0:
+                # Waiting for a free worker is not stalling
+                token.last_beat = now
+            reason = token.overdue(now)
+            if reason is None and cancelled and now - token.last_beat > self.cancel_grace:
+                reason = "cancelled"
+            if reason is not None and self._outstanding[drive]:
+                self._expire(drive, reason)
+
+    def _expire(self, drive, reason):
+        self._tokens[drive].expire(reason)
+        self.expired[drive] = reason
+        dropped = 0
+        for dq in self._queues:
+            kept = [task for task in dq if task[0] != drive]
+            dropped += len(dq) - len(kept)
+            dq.clear()
+            dq.extend(kept)
+        self._outstanding[drive] -= dropped
+        self._pending -= dropped
+        self._cond.notify_all()
+
+    def _take_eligible(self, dq, from_right):
+        # Skip over tasks whose drive already has per_drive_limit listings running
+        indices = range(len(dq) - 1, -1, -1) if from_right else range(len(dq))
+        for i in indices:
+            drive = dq[i][0]
+            limit = self._limit_for(drive)
+            if limit is None or self._in_flight[drive] < limit:
+                task = dq[i]
+                del dq[i]
+                return task
+        return None
+
+    def _next_task(self, me):
+        with self._cond:
+            while True:
+                if self._finished() or (self._cancel is not None and self._cancel.cancelled):
+                    return None
+                task = self._take_eligible(self._queues[me], from_right=True)
+                if task is None:
+                    for offset in range(1, len(self._queues)):
+                        victim = self._queues[(me + offset) % len(self._queues)]
+                        if victim:
+                            task = self._take_eligible(victim, from_right=False)
+                            if task is not None:
+                                break
+                if task is not None:
+                    self._in_flight[task[0]] += 1
+                    return task
+                self._cond.wait()
+
+    def _work(self, me):
+        while True:
+            task = self._next_task(me)
+            if task is None:
+                return
+            drive, path = task
+            token = self._tokens[drive]
+            subdirs, entries = [], []
+            started = time.perf_counter()
+            try:
+                if os.path.basename(path) == 'das':
+                    entries = list(iter_das_entries(path, self.classifier, token, strict=True))
+                else:
+                    subdirs = self._list_subdirs(path)
+                if self.tuner is not None:
+                    # One unit for the listing plus one per file stat'ed
+                    self.tuner.record(drive, time.perf_counter() - started, 1 + len(entries), "scan")
+            except ScanCancelled:
+                # Drop the half-listed folder
+                subdirs, entries = [], None
+            except OSError as e:
+                with self._cond:
+                    if path == self._roots[drive]:
+                        self.unreachable[drive] = e.strerror or str(e)
+                    elif not isinstance(e, FileNotFoundError):
+                        # Removed since its parent was listed is fine; unreadable is not
+                        self.unreadable.setdefault(drive, []).append(path)
+                subdirs, entries = [], None
+            except BaseException as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._in_flight[drive] -= 1
+                self._outstanding[drive] -= 1
+                self._pending -= 1
+                if entries is not None and drive not in self.expired:
+                    token.last_beat = time.monotonic()
+                    self._results[drive].extend(entries)
+                    self._queues[me].extend((drive, sub) for sub in subdirs)
+                    self._outstanding[drive] += len(subdirs)
+                    self._pending += len(subdirs)
+                    self._dirs_done += 1
+                    self._files_found += len(entries)
+                self._cond.notify_all()
+            self._report_progress()
+
+    @staticmethod
+    def _list_subdirs(path):
+        subdirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                except OSError:
+                    continue
+        return subdirs
+
+    def _report_progress(self, force=False):
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        with self._cond:
+            if not force and now - self._last_progress < self.progress_interval:
+                return
+            self._last_progress = now
+            snapshot = (self._dirs_done, self._pending, self._files_found)
+        self.progress(*snapshot)
+
+
+def scan_das_batch(das_dirs, classifier=DEFAULT_CLASSIFIER):
+    """
+    Process-pool worker: list and classify a batch of das folders.
+
+    Returns one compact tuple per folder instead of a list of dicts with
+    Path objects, so only a few strings and two packed arrays cross the
+    process boundary:
+        (das_dir, names, dates, planes, sizes, mtimes)
+    names/dates/planes are NUL-joined strings, sizes is array('q').tobytes()
+    and mtimes is array('d').tobytes(), all in the same order. A folder
+    that exists but cannot be listed comes back with names set to None.
+    """
+    batches = []
+    for das_dir in das_dirs:
+        names, dates, planes = [], [], []
+        sizes, mtimes = array('q'), array('d')
+        try:
+            with os.scandir(das_dir) as it:
+                listing = list(it)
+        except FileNotFoundError:
+            listing = []
+        except OSError:
+            batches.append((das_dir, None, "", "", b"", b""))
+            continue
+        for i, (date, plane_number, _) in classifier.classify_listing([entry.name for entry in listing]):
+            entry = listing[i]
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                size, mtime = st.st_size, st.st_mtime
+            except OSError:
+                size, mtime = 0, 0.0
+            names.append(entry.name)
+            dates.append(date)
+            planes.append(plane_number)
+            sizes.append(size)
+            mtimes.append(mtime)
+        batches.append((das_dir, "\0".join(names), "\0".join(dates), "\0".join(planes),
+                        sizes.tobytes(), mtimes.tobytes()))
+    return batches
+
+
+def iter_batch_entries(batch):
+    """Expand one scan_das_batch folder tuple back into FlightEntry objects."""
+    das_dir, names, dates, planes, size_bytes, mtime_bytes = batch
+    if not names:
+        return
+    sizes, mtimes = array('q'), array('d')
+    sizes.frombytes(size_bytes)
+    mtimes.frombytes(mtime_bytes)
+    prefix = os.path.join(das_dir, '')
+    for name, date, plane_number, size, mtime in zip(
+            names.split("\0"), dates.split("\0"), planes.split("\0"), sizes, mtimes):
+        yield FlightEntry(date, plane_number, prefix + name, size, mtime)
+
+
+class ProcessScanner:
+    """
+    Scan drives with a ProcessPoolExecutor doing the per-file work.
+
+    The parent only discovers das folders (cheap, I/O bound). Batches of
+    dirs_per_task folders are listed, stat'ed and classified in worker
+    processes, so the regex and record building for folders with hundreds
+    of thousands of files run on every core instead of under one GIL.
+    Results come back as compact scan_das_batch tuples.
+
+    Same scan()/progress/cancel interface as SubtreeScanner. On cancel,
+    batches not yet started are dropped and the pool is shut down without
+    waiting; a batch already running in a worker finishes on its own.
+    There are no per-drive deadlines here, so self.expired stays empty;
+    self.unreachable and self.unreadable are filled in the same way as
+    SubtreeScanner's.
+    """
+
+    def __init__(self, max_workers=None, dirs_per_task=8, classifier=DEFAULT_CLASSIFIER,
+                 progress=None, progress_interval=0.1):
+        self.max_workers = max_workers
+        self.dirs_per_task = max(1, dirs_per_task)
+        self.expired = {}
+        self.unreachable = {}
+        self.unreadable = {}
+        self.classifier = classifier
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+    def scan(self, drives, cancel=None):
+        """Scan <drive>/!shu_fd on every drive and return {drive: [FlightEntry, ...]}."""
+        try:
+            results = self.scan_batches(drives, cancel)
+        except ScanCancelled as stopped:
+            raise ScanCancelled(self._expand(stopped.partial)) from None
+        return self._expand(results)
+
+    @staticmethod
+    def _expand(results):
+        return {drive: [e for batch in batches for e in iter_batch_entries(batch)]
+                for drive, batches in results.items()}
+
+    def scan_batches(self, drives, cancel=None):
+        """Like scan(), but return {drive: [scan_das_batch tuple, ...]} without expanding them."""
+        drives = list(drives)
+        results = {drive: [] for drive in drives}
+        self.unreachable = {}
+        self.unreadable = {}
+        dirs_done = dirs_pending = files_found = 0
+        last_progress = 0.0
+
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {}
+            for drive in drives:
+                root = os.path.join(drive, '!shu_fd')
+                try:
+                    os.stat(root)
+                except OSError as e:
+                    self.unreachable[drive] = e.strerror or str(e)
+                    continue
+                batch = []
+                unreadable = partial(self._note_unreadable, drive)
+                for das_dir in iter_das_dirs(root, on_error=unreadable):
+                    if cancel is not None:
+                        cancel.check()
+                    batch.append(das_dir)
+                    if len(batch) == self.dirs_per_task:
+                        futures[executor.submit(scan_das_batch, batch, self.classifier)] = drive
+                        dirs_pending += len(batch)
+                        batch = []
+                if batch:
+                    futures[executor.submit(scan_das_batch, batch, self.classifier)] = drive
+                    dirs_pending += len(batch)
+
+            while futures:
+                if cancel is not None:
+                    cancel.check()
+                done, _ = wait(futures, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    drive = futures.pop(future)
+                    for folder in future.result():
+                        if folder[1] is None:
+                            self._note_unreadable(drive, folder[0])
+                        else:
+                            results[drive].append(folder)
+                        dirs_done += 1
+                        dirs_pending -= 1
+                        files_found += folder[1].count("\0") + 1 if folder[1] else 0
+                now = time.monotonic()
+                if self.progress is not None and (not futures or now - last_progress >= self.progress_interval):
+                    last_progress = now
+                    self.progress(dirs_done, dirs_pending, files_found)
+        except ScanCancelled:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise ScanCancelled(results) from None
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return results
+
+    def _note_unreadable(self, drive, path, error=None):
+        self.unreadable.setdefault(drive, []).append(path)
@@ -0,0 +1,123 @@
+import os
+from typing import NamedTuple
+
+from das_walker import iter_das_entries
+from flight_schema import DEFAULT_CLASSIFIER
+
+PRESENT = "present"
+MISSING = "missing"
+SIZE_MISMATCH = "size_mismatch"
+ORPHANED = "orphaned"
+
+
+class FlightCheck(NamedTuple):
+    flight: dict         # the RECORDS.LOG entry, as RecordLogParser returns it
+    das_dir: str         # where its files were looked for on this drive
+    status: str          # PRESENT, MISSING or SIZE_MISMATCH
+    logged_size: int     # DataLength from the log, 0 when it had none
+    disk_size: int       # total size of the flight's files found on disk
+    files: tuple         # FlightEntry for each of those files
+
+
+class Reconciliation:
+    """
+    RECORDS.LOG flights joined against what is on disk.
+
+    checks holds one FlightCheck per log flight, in log order. orphans are
+    the flight files found in the listed directories that no log flight
+    accounts for. unreadable lists the referenced directories that could
+    not be listed; their flights all show up as MISSING.
+    """
+
+    __slots__ = ("checks", "orphans", "listed", "unreadable")
+
+    def __init__(self):
+        self.checks = []
+        self.orphans = []
+        self.listed = []
+        self.unreadable = []
+
+    def counts(self):
+        """Return {status: number of flights}, with ORPHANED counting orphaned files."""
+        counts = {PRESENT: 0, MISSING: 0, SIZE_MISMATCH: 0}
+        for check in self.checks:
+            counts[check.status] += 1
+        counts[ORPHANED] = len(self.orphans)
+        return counts
+
+    def entries(self):
+        """Return the FlightEntry list of every flight with files on disk."""
+        # Two log flights with the same date and plane share their files
+        return list(dict.fromkeys(entry for check in self.checks for entry in check.files))
+
+    def status_by_name(self):
+        """Return {base_filename: status}, e.g. {"011124_201": "present"}."""
+        return {check.flight['base_filename']: check.status for check in self.checks}
+
+    def __repr__(self):
+        counts = ", ".join(f"{status}={n}" for status, n in self.counts().items())
+        return f"Reconciliation({counts}, dirs={len(self.listed)}, unreadable={len(self.unreadable)})"
+
+
+def relocate(base_path, recorded_root=None, drive=None):
+    """
+    Map a base_path as the recorder wrote it (e.g. "D:/!shu_fd/das") onto
+    the drive it is mounted as here: recorded_root at the front of the path
+    is swapped for drive.
+    """
+    if recorded_root and drive and base_path.startswith(recorded_root):
+        return drive + base_path[len(recorded_root):]
+    return base_path
+
+
+def reconcile(flights, recorded_root=None, drive=None, classifier=DEFAULT_CLASSIFIER, cancel=None):
+    """
+    Check RECORDS.LOG flights against the disk and return a Reconciliation.
+
+    Every directory the log refers to is listed exactly once, and the
+    listing is joined with the log on (directory, date, plane): no per-file
+    exists() or stat() calls, just what iter_das_entries costs. A flight
+    is PRESENT when its files are there and add up to DataLength (or the
+    log gave no DataLength), SIZE_MISMATCH when they do not, MISSING when
+    none are found. With a CancelToken as cancel, it is checked before
+    every listing and every stat.
+    """
+    result = Reconciliation()
+    planned = []
+    wanted = {}
+    for flight in flights:
+        das_dir = os.path.normpath(relocate(flight['base_path'], recorded_root, drive))
+        date = flight['date']
+        # Log dates are YYYYMMDD, file names carry DDMMYY
+        key = (das_dir, f"{date[6:8]}{date[4:6]}{date[2:4]}", flight['plane_number'])
+        planned.append((flight, das_dir, key))
+        wanted.setdefault(das_dir, set()).add(key)
+
+    found = {}
+    for das_dir, keys in wanted.items():
+        if cancel is not None:
+            cancel.check()
+        result.listed.append(das_dir)
+        listed_any = False
+        for entry in iter_das_entries(das_dir, classifier, cancel):
+            listed_any = True
+            key = (das_dir, entry.date, entry.plane_number)
+            if key in keys:
+                found.setdefault(key, []).append(entry)
+            else:
+                result.orphans.append(entry)
+        if not listed_any and not os.path.isdir(das_dir):
+            result.unreadable.append(das_dir)
+
+    for flight, das_dir, key in planned:
+        files = tuple(found.get(key, ()))
+        disk_size = sum(entry.size for entry in files)
+        logged_size = flight['size'] or 0
+        if not files:
+            status = MISSING
+        elif logged_size and logged_size != disk_size:
+            status = SIZE_MISMATCH
+        else:
+            status = PRESENT
+        result.checks.append(FlightCheck(flight, das_dir, status, logged_size, disk_size, files))
+    return result
@@ -0,0 +1,470 @@
+import hashlib
+import locale
+import logging
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from flight_index import LogState
+from flight_schema import LOG_CLASSIFIER
+
+log = logging.getLogger(__name__)
+
+# The only lines the mapped parser looks at. Leading and trailing whitespace
+# is allowed, as the text parser strips every line; everything else is
+# skipped inside the regex engine without becoming a Python object. Matches
+# start at the newline before the line rather than at ^, which lets the
+# engine jump from newline to newline instead of trying every byte; the
+# first line, which has none, goes through _FIRST_LINE. Each group keeps its
+# key or bracket, so the one that matched is the one that is not empty.
+_WHITESPACE = rb"[ \t\x0b\x0c\r]*"
+_FIELDS = (
+    rb"(?:"
+    rb"(\[[^\n]*\.000)\]"
+    rb"|(StartedAt=[^\n]*)"
+    rb"|(FinishedAt=[^\n]*)"
+    rb"|(DataLength=[^\n]*)"
+    rb")" + _WHITESPACE + rb"(?=\n|\Z)"
+)
+_MAPPED_LINE = re.compile(rb"\n" + _WHITESPACE + _FIELDS)
+_FIRST_LINE = re.compile(_WHITESPACE + _FIELDS)
+# Header lines alone, for cutting a log into independently parsable ranges
+_HEADER_LINE = re.compile(rb"\n" + _WHITESPACE + rb"(\[[^\n]*\.000)\]" + _WHITESPACE + rb"(?=\n|\Z)")
+
+# Bytes per range in parse_parallel()
+PARALLEL_CHUNK_SIZE = 64 * 1024 * 1024
+
+# StartedAt/FinishedAt as the recorders have written them, DD.MM.YYYY,
+# DD/MM/YYYY or YYYY-MM-DD and then hh:mm:ss, as digit groups for log_time_key
+_LOG_TIME = re.compile(
+    r"\s*(?:(\d\d)[./](\d\d)[./](\d{4})|(\d{4})-(\d\d)-(\d\d))\s+(\d\d):(\d\d):(\d\d)\s*$")
+
+
+
+class ParseResult:
+    """
+    What parsing one RECORDS.LOG produced: the flight dicts the index
+    stores, plus how many lines were read, how many entries could not be
+    parsed and how long it took (lines and malformed count only the part
+    of the file that was parsed). error holds the exception that stopped
+    the parse, if any; flights is empty in that case.
+    """
+
+    __slots__ = ("path", "flights", "lines", "malformed", "elapsed", "error", "start", "kept", "state")
+
+    def __init__(self, path):
+        self.path = path
+        self.flights = []
+        self.lines = 0
+        self.malformed = 0
+        self.elapsed = 0.0
+        self.error = None
+        # Only set by parse_tail(): where it began, how many earlier flights
+        # still stand and the LogState for the next call
+        self.start = 0
+        self.kept = 0
+        self.state = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return (f"ParseResult({self.path!r}, flights={len(self.flights)}, lines={self.lines}, "
+                f"malformed={self.malformed}, elapsed={self.elapsed:.3f}s, {state})")
+
+
+class RecordLogParser:
+    """
+    Parser for the recorder's RECORDS.LOG.
+
+    Silent by default. Per-entry diagnostics go to the "record_log" logger
+    at DEBUG level, with the details as structured fields in the record's
+    extra: event, the values involved and, from parse(), the line number. Whether DEBUG is on is
+    checked once per file, so with it off the parse loop pays nothing for
+    them. A parse that fails is logged once at WARNING.
+    """
+
+    @staticmethod
+    def parse(log_path, classifier=LOG_CLASSIFIER):
+        result = ParseResult(log_path)
+        trace = log.isEnabledFor(logging.DEBUG)
+        flights = []
+        current_flight = None
+        line_number = 0
+        start = time.perf_counter()
+
+        try:
+            with open(log_path, 'r') as f:
+                for line in f:
+                    line_number += 1
+                    line = line.strip()
+
+                    # Check for new flight entry
+                    if line.startswith('[') and line.endswith('.000]'):
+                        # Extract flight info from path
+                        flight_path = line[1:-1]
+                        dir_name = os.path.dirname(flight_path)
+                        file_name = os.path.basename(flight_path)
+
+                        # Parse flight details
+                        name = classifier.classify(file_name)
+                        if name and name[2] == '000':
+                            date, plane, _ = name
+                            day, month, year = date[0:2], date[2:4], date[4:6]
+
+                            current_flight = {
+                                'date': f'20{year}{month}{day}',
+                                'plane_number': plane,
+                                'base_path': dir_name,
+                                'base_filename': file_name[:-4],
+                                'size': 0,
+                                'start_time': None,
+                                'end_time': None
+                            }
+                            if trace:
+                                log.debug("flight header", extra={"event": "header", "line": line_number,
+                                                                  "path": flight_path})
+                        else:
+                            result.malformed += 1
+                            if trace:
+                                log.debug("unparsable flight header", extra={"event": "bad_header",
+                                                                             "line": line_number, "path": flight_path})
+
+                    # Get start time
+                    elif line.startswith('StartedAt=') and current_flight:
+                        current_flight['start_time'] = line.split('=')[1]
+
+                    # Get end time and add flight to list
+                    elif line.startswith('FinishedAt=') and current_flight:
+                        current_flight['end_time'] = line.split('=')[1]
+                        flights.append(current_flight)
+                        if trace:
+                            log.debug("flight complete", extra={"event": "flight", "line": line_number,
+                                                                "flight": current_flight})
+                        current_flight = None
+
+                    # Get data length
+                    elif line.startswith('DataLength=') and current_flight:
+                        try:
+                            current_flight['size'] = int(line.split('=')[1].split(':')[0])
+                        except (IndexError, ValueError):
+                            current_flight['size'] = 0
+                            result.malformed += 1
+                            if trace:
+                                log.debug("unparsable data length", extra={"event": "bad_length",
+                                                                           "line": line_number, "text": line})
+        except Exception as e:
+            log.warning("parsing %s stopped at line %d: %s", log_path, line_number, e,
+                        extra={"event": "error", "line": line_number}, exc_info=trace)
+            result.error = e
+            flights = []
+
+        result.flights = flights
+        result.lines = line_number
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def parse_mapped(log_path, classifier=LOG_CLASSIFIER):
+        """
+        Same result as parse(), from a memory-mapped file.
+
+        One bytes regex finds the header and StartedAt/FinishedAt/DataLength
+        lines; only the values of those are decoded (in the locale encoding,
+        which is what parse() reads the file with) and every other line is
+        skipped inside the regex engine. Lines are counted with bytes.count.
+        Lines separated by a lone carriage return are not split, whereas
+        parse() would split them.
+        """
+        result = ParseResult(log_path)
+        start = time.perf_counter()
+        try:
+            with _mapped(log_path) as (data, _):
+                result.flights = _parse_region(data, 0, len(data), classifier, result)
+                result.lines = _count_lines(data, 0, len(data))
+        except Exception as e:
+            _parse_failed(result, e)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def parse_tail(log_path, state=None, classifier=LOG_CLASSIFIER, workers=1, chunk_size=None):
+        """
+        Parse only what was appended to the log since state, a LogState the
+        previous parse_tail() returned (None for a first parse).
+
+        The recorder only ever appends, so the flights before state.offset
+        are still valid: result.kept says how many of them to keep, and
+        result.flights holds the ones that follow. The log is parsed from the
+        start again (kept 0) when it is a different file, has shrunk, or no
+        longer holds the same bytes just before state.offset. Only complete
+        lines are read; a line still being written is picked up next time.
+        result.state is the LogState to pass in next time. It points just
+        past the last FinishedAt line, so a flight still being recorded is
+        parsed again once it has finished. A log whose inode, size and mtime
+        all match state is not opened at all. With workers other than 1, a
+        tail longer than chunk_size is parsed the way parse_parallel() does.
+        """
+        result = ParseResult(log_path)
+        start = time.perf_counter()
+        try:
+            st = os.stat(log_path)
+            if state is not None and (state.path, state.inode, state.size, state.mtime_ns) == (
+                    str(log_path), st.st_ino, st.st_size, st.st_mtime_ns):
+                # Untouched since last time: nothing to read at all
+                result.start, result.kept = state.offset, state.flight_count
+                result.state = state
+                result.elapsed = time.perf_counter() - start
+                return result
+            with _mapped(log_path) as (data, st):
+                offset, kept = 0, 0
+                if (state is not None and state.path == str(log_path) and state.inode == st.st_ino
+                        and state.offset <= len(data) and _tail_digest(data, state.offset) == state.digest):
+                    offset, kept = state.offset, state.flight_count
+                elif state is not None and _trace_enabled():
+                    log.debug("log replaced or truncated, parsing it all", extra={"event": "reset",
+                                                                                 "path": str(log_path)})
+                end = max(offset, data.rfind(b"\n") + 1)
+                result.start = offset
+                result.kept = kept
+                if workers == 1:
+                    result.flights = _parse_region(data, offset, end, classifier, result)
+                else:
+                    result.flights = _parse_region_parallel(log_path, data, offset, end, classifier, result,
+                                                            workers, chunk_size or PARALLEL_CHUNK_SIZE)
+                result.lines = _count_lines(data, offset, end)
+                resume = _resume_offset(data, offset, end)
+                result.state = LogState(str(log_path), st.st_ino, st.st_size, st.st_mtime_ns,
+                                        resume, kept + len(result.flights), _tail_digest(data, resume))
+        except Exception as e:
+            _parse_failed(result, e)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def parse_parallel(log_path, workers=None, chunk_size=None, classifier=LOG_CLASSIFIER):
+        """
+        Same result as parse(), with the work split over a process pool.
+
+        The file is cut into ranges of about chunk_size bytes, each starting
+        at a flight header line the classifier accepts. A header like that
+        starts a fresh flight whatever came before it, so every range can be
+        parsed on its own from an empty state, and an entry never straddles
+        two ranges. The ranges' flights are joined back in file order. Worth
+        it only for logs of hundreds of MiB on a machine with spare cores;
+        a log too small to split is parsed in this process.
+        """
+        result = ParseResult(log_path)
+        start = time.perf_counter()
+        try:
+            with _mapped(log_path) as (data, _):
+                result.flights = _parse_region_parallel(log_path, data, 0, len(data), classifier, result,
+                                                        workers, chunk_size or PARALLEL_CHUNK_SIZE)
+                result.lines = _count_lines(data, 0, len(data))
+        except Exception as e:
+            _parse_failed(result, e)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def parse_log_file(log_path):
+        """Return just the flight dicts, [] if the file could not be read."""
+        return RecordLogParser.parse(log_path).flights
+
+
+def log_time_key(text, default=None):
+    """
+    A RECORDS.LOG time as the integer YYYYMMDDhhmmss, default if it cannot
+    be read. It costs a regex match instead of a strptime(), for sorting
+    many flights by time.
+    """
+    match = _LOG_TIME.match(text) if text else None
+    if match is None:
+        return default
+    day, month, year, iso_year, iso_month, iso_day, hour, minute, second = match.groups()
+    if year is None:
+        day, month, year = iso_day, iso_month, iso_year
+    return int(year + month + day + hour + minute + second)
+
+
+def _trace_enabled():
+    return log.isEnabledFor(logging.DEBUG)
+
+
+def _parse_failed(result, error):
+    log.warning("parsing %s stopped: %s", result.path, error, extra={"event": "error"}, exc_info=_trace_enabled())
+    result.error = error
+    result.flights = []
+    result.lines = 0
+    result.state = None
+
+
+@contextmanager
+def _mapped(log_path):
+    """Yield (contents, stat) of the log, memory-mapped unless it is empty (mmap refuses those)."""
+    with open(log_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            yield b"", st
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data, st
+
+
+def _parse_region(data, start, end, classifier, result):
+    """Return the flights completed in data[start:end], which must begin at a line start."""
+    trace = _trace_enabled()
+    encoding = locale.getpreferredencoding(False)
+    flights = []
+    current_flight = None
+    for batch in _mapped_batches(data, start, end):
+        for header, started, finished, length in batch:
+            if header:
+                flight_path = header[1:].decode(encoding)
+                dir_name, file_name = os.path.split(flight_path)
+                name = classifier.classify(file_name)
+                if name and name[2] == '000':
+                    date, plane, _ = name
+                    current_flight = {
+                        'date': f'20{date[4:6]}{date[2:4]}{date[0:2]}',
+                        'plane_number': plane,
+                        'base_path': dir_name,
+                        'base_filename': file_name[:-4],
+                        'size': 0,
+                        'start_time': None,
+                        'end_time': None
+                    }
+                    if trace:
+                        log.debug("flight header", extra={"event": "header", "path": flight_path})
+                else:
+                    result.malformed += 1
+                    if trace:
+                        log.debug("unparsable flight header", extra={"event": "bad_header", "path": flight_path})
+            elif current_flight is None:
+                continue
+            elif started:
+                # StartedAt=value: parse() keeps up to the next '=', minus trailing whitespace
+                current_flight['start_time'] = started[10:].decode(encoding).rstrip().split('=')[0]
+            elif finished:
+                current_flight['end_time'] = finished[11:].decode(encoding).rstrip().split('=')[0]
+                flights.append(current_flight)
+                if trace:
+                    log.debug("flight complete", extra={"event": "flight", "flight": current_flight})
+                current_flight = None
+            else:
+                value = length[11:].rstrip().split(b'=', 1)[0]
+                try:
+                    current_flight['size'] = int(value.split(b':', 1)[0])
+                except ValueError:
+                    current_flight['size'] = 0
+                    result.malformed += 1
+                    if trace:
+                        log.debug("unparsable data length", extra={"event": "bad_length", "text": value})
+    return flights
+
+
+def _chunk_bounds(data, start, end, chunk_size, classifier):
+    """
+    Return [start, ..., end]: offsets roughly chunk_size apart, each past
+    start being the first byte of a header line the classifier accepts.
+    """
+    encoding = locale.getpreferredencoding(False)
+    bounds = [start]
+    target = start + chunk_size
+    while target < end:
+        for match in _HEADER_LINE.finditer(data, target, end):
+            try:
+                file_name = os.path.split(match.group(1)[1:].decode(encoding))[1]
+            except UnicodeDecodeError:
+                continue
+            name = classifier.classify(file_name)
+            if name and name[2] == '000':
+                # The match starts at the newline ending the previous line
+                bounds.append(match.start() + 1)
+                break
+        else:
+            break
+        target = bounds[-1] + chunk_size
+    bounds.append(end)
+    return bounds
+
+
+def _parse_range(log_path, start, end, classifier):
+    """Process pool task: parse data[start:end] of the log, returning (flights, malformed entries)."""
+    result = ParseResult(log_path)
+    with _mapped(log_path) as (data, _):
+        flights = _parse_region(data, start, end, classifier, result)
+    return flights, result.malformed
+
+
+def _parse_region_parallel(log_path, data, start, end, classifier, result, workers, chunk_size):
+    bounds = _chunk_bounds(data, start, end, chunk_size, classifier)
+    if len(bounds) <= 2:
+        return _parse_region(data, start, end, classifier, result)
+    flights = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_parse_range, log_path, a, b, classifier) for a, b in zip(bounds, bounds[1:])]
+        for future in futures:
+            part, malformed = future.result()
+            flights.extend(part)
+            result.malformed += malformed
+    return flights
+
+
+def _resume_offset(data, start, end):
+    """
+    Return the offset just past the last FinishedAt line in data[start:end],
+    or start if there is none. No flight is open after a FinishedAt line,
+    so a later parse can begin there with a clean slate.
+    """
+    pos = end
+    while True:
+        pos = data.rfind(b"FinishedAt=", start, pos)
+        if pos < 0:
+            return start
+        line_start = max(start, data.rfind(b"\n", start, pos) + 1)
+        line_end = data.find(b"\n", pos, end)
+        if line_end < 0:
+            line_end = end
+        match = _FIRST_LINE.match(data, line_start, line_end)
+        if match is not None and match.group(3):
+            return min(end, line_end + 1)
+
+
+def _tail_digest(data, offset, span=4096):
+    """Hash of the bytes just before offset; a log that was replaced will not match it."""
+    return hashlib.blake2b(data[max(0, offset - span):offset], digest_size=16).digest()
+
+
+def _mapped_batches(data, start=0, end=None, chunk=1 << 24):
+    """
+    Yield lists of (header, started, finished, length) tuples, one per line
+    _FIELDS matches in data[start:end], each group including its key so it
+    is never empty when the line is that kind. findall() over chunks ending
+    on a newline rather than finditer(), because a Match object per line
+    costs more than the parse itself.
+    """
+    end = len(data) if end is None else end
+    first = _FIRST_LINE.match(data, start, end)
+    if first is not None:
+        yield [first.groups()]
+    pos = start
+    while pos < end:
+        stop = data.find(b"\n", pos + chunk, end) if pos + chunk < end else -1
+        if stop < 0:
+            stop = end
+        yield _MAPPED_LINE.findall(data, pos, stop)
+        pos = stop
+
+
+def _count_lines(data, start, end, chunk=1 << 24):
+    # mmap has no count(); slicing it a chunk at a time keeps the copies small
+    lines = sum(data[i:min(i + chunk, end)].count(b"\n") for i in range(start, end, chunk))
+    if end > start and data[end - 1:end] != b"\n":
+        lines += 1
+    return lines
@@ -0,0 +1,183 @@
+import threading
+import time
+
+
+class ScanCancelled(Exception):
+    """
+    Raised inside a scan once its CancelToken has been cancelled. Scanners
+    that collect results attach what they finished before stopping as
+    partial, in the same shape a completed scan would have returned.
+    """
+
+    def __init__(self, partial=None):
+        super().__init__("scan cancelled")
+        self.partial = partial
+
+
+class DriveUnreachable(OSError):
+    """
+    Raised by a drive scan that could not reach <drive>/!shu_fd at all.
+    Nothing stored for the drive has been changed: an offline drive keeps
+    its indexed flights instead of looking empty.
+    """
+
+
+class CancelToken:
+    """
+    Cancellation flag shared by everything one scan runs.
+
+    Scan code calls check() between units of work (a directory, a file
+    stat) and unwinds with ScanCancelled. Results are handed to the UI
+    through call(). A plain cancel() still lets results through, because
+    a stopped scan's partial results are worth keeping; cancel(discard=True)
+    drops them, and since call() holds the same lock, nothing from the
+    scan arrives after cancel() has returned.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.discarded = False
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, discard=False):
+        with self._lock:
+            self._event.set()
+            self.discarded = self.discarded or discard
+
+    def check(self):
+        if self._event.is_set():
+            raise ScanCancelled()
+
+    def call(self, func, *args):
+        """Run func(*args) unless the scan's results are being discarded. Returns whether it ran."""
+        with self._lock:
+            if self.discarded:
+                return False
+            func(*args)
+            return True
+
+
+class ScanSession:
+    """
+    One run of a scan: its CancelToken and the executor jobs it submitted.
+
+    cancel() sets the token and cancels every job that has not started, so
+    a shared executor is free for the next session straight away; jobs
+    already running stop at their next check(). done is set by whoever
+    runs the scan once it has stopped, cancelled or not.
+    """
+
+    def __init__(self, full=True):
+        self.token = CancelToken()
+        self.full = full
+        self.started = time.time()
+        self.futures = []
+        self.done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def submit(self, executor, func, *args):
+        future = executor.submit(self._run, func, *args)
+        self.futures.append(future)
+        return future
+
+    def _run(self, func, *args):
+        self.token.check()
+        return func(*args)
+
+    def cancel(self, discard=False):
+        self.token.cancel(discard)
+        for future in self.futures:
+            future.cancel()
+
+
+class ScanSessions:
+    """
+    Hands out ScanSessions; starting a new one cancels the one still
+    running. A new full scan discards the old session's remaining results,
+    since it is about to rebuild everything anyway; a new incremental scan
+    lets them through, because it diffs against what the old one stored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = None
+
+    def start(self, full=True):
+        """Cancel the running session, if any, and return (new_session, previous_session)."""
+        with self._lock:
+            previous = self.current
+            if previous is not None and not previous.done.is_set():
+                previous.cancel(discard=full)
+            self.current = ScanSession(full)
+            return self.current, previous
+
+    def cancel(self):
+        """Cancel the running session and keep whatever it has produced so far."""
+        with self._lock:
+            if self.current is not None and not self.current.done.is_set():
+                self.current.cancel()
+                return True
+            return False
+
+    def is_current(self, session):
+        return session is self.current
+
+
+class DriveToken(CancelToken):
+    """
+    CancelToken for one drive inside a scan, with a time budget and a
+    stall detector.
+
+    Every check() or cancelled lookup counts as a sign of life, so a scan
+    that keeps calling it is never considered stalled. overdue() is polled
+    by whoever supervises the scan; a drive stuck inside a directory
+    listing stops calling it altogether and is reported once stall_timeout
+    seconds pass without one. expire() then stops the drive at its next
+    check. Cancelling the parent token cancels every drive, and results
+    are handed over through the parent's call().
+    """
+
+    def __init__(self, parent=None, budget=None, stall_timeout=None):
+        super().__init__()
+        self.parent = parent
+        now = time.monotonic()
+        self.deadline = None if budget is None else now + budget
+        self.stall_timeout = stall_timeout
+        self.last_beat = now
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        self.last_beat = time.monotonic()
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def check(self):
+        if self.cancelled:
+            raise ScanCancelled()
+
+    def call(self, func, *args):
+        if self.parent is not None:
+            return self.parent.call(func, *args)
+        return super().call(func, *args)
+
+    def overdue(self, now=None):
+        """Return "deadline" or "stalled" when the drive should be given up on, else None."""
+        if self._event.is_set():
+            return self.reason
+        now = time.monotonic() if now is None else now
+        if self.deadline is not None and now > self.deadline:
+            return "deadline"
+        if self.stall_timeout is not None and now - self.last_beat > self.stall_timeout:
+            return "stalled"
+        return None
+
+    def expire(self, reason):
+        self.reason = reason
+        self._event.set()
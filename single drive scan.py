@@ -1,14 +1,17 @@
-import os
+import queue
 import random
-import shutil
-import re
-from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, font
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import time
 
+from drive_config import load_drive_mapping, probe_timeout
+from drive_health import check_drives, describe_drive
+from flight_catalog import FlightCatalog
+from flight_engine import FlightEngine
+from scan_session import ScanSessions
+from ui_channel import UiChannel
+
 class DriveSelector(tk.Toplevel):
     def __init__(self, parent, drive_mapping):
         super().__init__(parent)
@@ -29,15 +32,26 @@ class DriveSelector(tk.Toplevel):
         self.check_vars = {}
         
         # Create checkbuttons for each drive
+        self.status_labels = {}
         for drive_path, drive_id in sorted(drive_mapping.items(), key=lambda x: x[1]):
             var = tk.BooleanVar()
             self.check_vars[drive_path] = var
+            row = tk.Frame(self.check_frame)
+            row.pack(fill="x", pady=5)
             cb = ttk.Checkbutton(
-                self.check_frame, 
+                row, 
                 text=f"Drive ID {drive_id} ({drive_path})", 
                 variable=var
             )
-            cb.pack(anchor="w", pady=5)
+            cb.pack(side="left")
+            self.status_labels[drive_path] = tk.Label(row, text="checking...", fg="gray")
+            self.status_labels[drive_path].pack(side="right")
+        
+        # Every drive is probed at once; answers show up as they come in
+        self.statuses = {}
+        self.probe_results = queue.Queue()
+        threading.Thread(target=self.probe_drives, args=(list(drive_mapping),), daemon=True).start()
+        self._poll_job = self.after(50, self.show_probe_results)
         
         # Buttons frame
         btn_frame = tk.Frame(self)
@@ -51,9 +65,36 @@ class DriveSelector(tk.Toplevel):
         self.transient(parent)
         self.grab_set()
         
+    def probe_drives(self, drives):
+        # Runs on its own thread, show_probe_results picks the answers up on the Tk thread
+        for status in check_drives(drives, probe_timeout()):
+            self.probe_results.put(status)
+
+    def show_probe_results(self):
+        while True:
+            try:
+                status = self.probe_results.get_nowait()
+            except queue.Empty:
+                break
+            self.statuses[status.drive] = status
+            reachable = status.answered and status.error is None
+            self.status_labels[status.drive].config(text=describe_drive(status), fg="green" if reachable else "red")
+        self._poll_job = self.after(50, self.show_probe_results) if len(self.statuses) < len(self.status_labels) else None
+
+    def reachable(self, drive):
+        """False once a probe found drive unreachable, True otherwise (also while it is still being probed)."""
+        status = self.statuses.get(drive)
+        return status is None or (status.answered and status.error is None)
+
+    def destroy(self):
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+        super().destroy()
+
     def select_all(self):
-        for var in self.check_vars.values():
-            var.set(True)
+        for drive, var in self.check_vars.items():
+            var.set(self.reachable(drive))
     
     def clear_all(self):
         for var in self.check_vars.values():
@@ -69,13 +110,22 @@ class DriveSelector(tk.Toplevel):
 class FlightFileManager:
     def __init__(self, root):
         self.root = root
-        self.drive_mapping = {
+        # Worker threads reach the window only through this, never through Tk directly
+        self.ui = UiChannel(self.root)
+        self.ui.start()
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "Z:/": 61, "Y:/": 62, "X:/": 63 , "W:/": 64,
             "V:/": 65, "U:/": 66, "T:/": 67,
-        }
-        self.flight_data = {}
-        self.scan_complete = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        })
+        self.flight_data = FlightCatalog()
+        # Starting a scan cancels the one still running instead of racing it
+        self.sessions = ScanSessions()
+        # Scanning, copying and deleting happen in the engine, the window only
+        # shows what it reports (flight_cli.py drives the same engine)
+        self.engine = FlightEngine(self.drive_mapping)
+        # {drive: reason} for drives the last scan could not reach
+        self.unreachable = {}
         self.init_gui()
 
     def init_gui(self):
@@ -97,6 +147,7 @@ class FlightFileManager:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Select Drives & Scan", command=self.show_drive_selector)
+        file_menu.add_command(label="Stop Scan", command=self.stop_scan)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
 
@@ -129,6 +180,8 @@ class FlightFileManager:
         self.status_label = tk.Label(self.root, text="Ready")
         self.status_label.pack(pady=5)
 
+        self.root.after(100, self.load_cached_flights)
+
     def show_drive_selector(self):
         selector = DriveSelector(self.root, self.drive_mapping)
         self.root.wait_window(selector)
@@ -146,75 +199,72 @@ class FlightFileManager:
     def display_easter_egg(self):
         messagebox.showinfo("Easter Egg", self.easter_egg_message())
 
+    def load_cached_flights(self):
+        self.flight_data = self.engine.flights()
+        self.display_flights()
+
     def load_files(self, selected_drives):
+        session, previous = self.sessions.start()
         self.status_label.config(text="Loading files...")
         self.progress_var.set(0)
         self.table.delete(*self.table.get_children())
-        self.scan_complete.clear()
-        threading.Thread(target=self.scan_flight_records, args=(selected_drives,), daemon=True).start()
-        self.root.after(100, self.check_scan_complete)
+        threading.Thread(target=self.scan_flight_records, args=(session, previous, selected_drives), daemon=True).start()
+        self.root.after(100, self.check_scan_complete, session)
+
+    def stop_scan(self):
+        if self.sessions.cancel():
+            self.status_label.config(text="Stopping scan...")
 
-    def check_scan_complete(self):
-        if self.scan_complete.is_set():
+    def check_scan_complete(self, session):
+        if not self.sessions.is_current(session):
+            # Superseded - the newer scan polls for itself
+            return
+        if session.done.is_set():
             self.display_flights()
+            if session.cancelled:
+                self.status_label.config(text="Scan stopped - showing partial results")
+            elif self.unreachable:
+                drives = ", ".join(f"{drive} ({reason})" for drive, reason in sorted(self.unreachable.items()))
+                self.status_label.config(text=f"Ready - unreachable, showing last known flights: {drives}")
+            elif self.engine.health.degraded:
+                drives = ", ".join(f"{drive} ({reason})" for drive, reason in sorted(self.engine.health.degraded.items()))
+                self.status_label.config(text=f"Ready - degraded: {drives}")
         else:
-            self.root.after(100, self.check_scan_complete)
+            self.root.after(100, self.check_scan_complete, session)
 
-    def scan_flight_records(self, selected_drives):
-        pattern = re.compile(r'(\d{6})_(\d+)')
-        total_drives = len(selected_drives)
-        
-        def process_drive(drive):
-            drive_data = []
-            shu_fd_folder = Path(drive) / '!shu_fd'
-            if shu_fd_folder.exists():
-                for das_folder in shu_fd_folder.rglob('das'):
-                    if das_folder.is_dir():
-                        file_list = list(das_folder.iterdir())
-                        for file in file_list:
-                            if file.is_file() and pattern.match(file.stem):
-                                match = pattern.match(file.stem)
-                                if match:
-                                    date, plane_number = match.groups()
-                                else:
-                                    continue
-                                try:
-                                    size = file.stat().st_size
-                                except OSError:
-                                    size = 0
-                                drive_data.append({
-                                    "date": date,
-                                    "plane_number": plane_number,
-                                    "filepath": file,
-                                    "drive_id": self.drive_mapping.get(drive, "Unknown"),
-                                    "size": size
-                                })
-            return drive_data
-
-        start_time = time.time()
-        futures = [self.executor.submit(process_drive, drive) for drive in selected_drives]
-
-        flight_data = {}
-        for i, future in enumerate(as_completed(futures)):
-            for entry in future.result():
-                key = f"{entry['date']}_{entry['plane_number']}_{entry['drive_id']}"
-                if key not in flight_data:
-                    flight_data[key] = {"files": [], "total_size": 0}
-                flight_data[key]["files"].append(entry['filepath'])
-                flight_data[key]["total_size"] += entry['size'] / (1024 * 1024 * 1024)
-            self.progress_var.set((i + 1) / total_drives * 100)
-
-        self.flight_data = flight_data
-        end_time = time.time()
-        print(f"Scan completed in {end_time - start_time:.2f} seconds")
-        self.scan_complete.set()
+    def scan_flight_records(self, session, previous, selected_drives):
+        def report_progress(dirs_done, dirs_pending, files_found):
+            if session.cancelled:
+                return
+            self.ui.post("progress", self.progress_var.set, dirs_done / max(dirs_done + dirs_pending, 1) * 100)
+            self.ui.post("status", self.status_label.config,
+                         {"text": f"Scanning... {dirs_done} folders, {files_found} files"})
+
+        try:
+            if previous is not None:
+                # Let the superseded scan store what it finished before replacing drives
+                previous.done.wait()
+            start_time = time.time()
+            unreachable = {}
+            for outcome in self.engine.scan(selected_drives, cancel=session.token, progress=report_progress):
+                if outcome.state == "skipped":
+                    print(f"Skipping degraded drive: {outcome.drive}")
+                elif outcome.state == "unreachable":
+                    unreachable[outcome.drive] = outcome.reason
+            session.token.call(setattr, self, "unreachable", unreachable)
+            session.token.call(setattr, self, "flight_data", self.engine.flights(selected_drives))
+            end_time = time.time()
+            state = "stopped" if session.cancelled else "completed"
+            print(f"Scan {state} after {end_time - start_time:.2f} seconds")
+        finally:
+            session.done.set()
 
     def display_flights(self):
         for key, data in self.flight_data.items():
             date, plane_number, drive_id = key.split('_')
             formatted_date = f"{date[:2]}/{date[2:4]}/{date[4:]}"
-            total_size = round(data["total_size"], 2)
-            self.table.insert("", "end", values=(formatted_date, plane_number, drive_id, f"{len(data['files'])} files", f"{total_size:.2f}"))
+            total_size = round(data.total_size, 2)
+            self.table.insert("", "end", values=(formatted_date, plane_number, drive_id, f"{data.file_count} files", f"{total_size:.2f}"))
         self.status_label.config(text="Ready")
 
     def copy_files(self):
@@ -228,23 +278,29 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Copying files...")
-        threading.Thread(target=self._copy_files, args=(selected, dest_dir), daemon=True).start()
+        # The table and flight_data are read here, on the Tk thread; the worker
+        # gets its own copy of the selected flights
+        flights = self.flight_data.subset(self.selected_keys(selected))
+        threading.Thread(target=self._copy_files, args=(flights, dest_dir), daemon=True).start()
+
+    def _copy_files(self, flights, dest_dir):
+        self.engine.copy(flights, list(flights), dest_dir, self._file_done)
+        self.ui.call(messagebox.showinfo, "Copy Complete", "Selected files have been copied.")
+        self.ui.post("status", self.status_label.config, {"text": "Ready"})
+
+    def _file_done(self, file, error):
+        if error is not None:
+            self.ui.call(messagebox.showerror, "File Error", f"Error with file {file}: {str(error)}")
 
-    def _copy_files(self, selected, dest_dir):
+    def selected_keys(self, selected):
+        keys = []
         for item in selected:
             values = self.table.item(item, 'values')
             if values:
                 date, plane_number, drive_id, _, _ = values
                 unformatted_date = date.replace("/", "")
-                key = f"{unformatted_date}_{plane_number}_{drive_id}"
-                if key in self.flight_data:
-                    for file in self.flight_data[key]["files"]:
-                        try:
-                            shutil.copy2(file, dest_dir)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Copy Error", f"Error copying file {file}: {str(e)}")
-        self.root.after(0, messagebox.showinfo, "Copy Complete", "Selected files have been copied.")
-        self.root.after(0, self.status_label.config, {"text": "Ready"})
+                keys.append(f"{unformatted_date}_{plane_number}_{drive_id}")
+        return keys
 
     def delete_files(self):
         selected = self.table.selection()
@@ -257,23 +313,13 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Deleting files...")
-        threading.Thread(target=self._delete_files, args=(selected,), daemon=True).start()
+        flights = self.flight_data.subset(self.selected_keys(selected))
+        threading.Thread(target=self._delete_files, args=(flights,), daemon=True).start()
 
-    def _delete_files(self, selected):
-        for item in selected:
-            values = self.table.item(item, 'values')
-            if values:
-                date, plane_number, drive_id, _, _ = values
-                unformatted_date = date.replace("/", "")
-                key = f"{unformatted_date}_{plane_number}_{drive_id}"
-                if key in self.flight_data:
-                    for file in self.flight_data[key]["files"]:
-                        try:
-                            os.remove(file)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Deletion Error", f"Error deleting file {file}: {str(e)}")
-        self.root.after(0, messagebox.showinfo, "Deletion Complete", "Selected files have been deleted.")
-        self.root.after(0, self.status_label.config, {"text": "Ready"})
+    def _delete_files(self, flights):
+        self.engine.delete(flights, list(flights), self._file_done)
+        self.ui.call(messagebox.showinfo, "Deletion Complete", "Selected files have been deleted.")
+        self.ui.post("status", self.status_label.config, {"text": "Ready"})
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,25 +1,50 @@
 import os
 import random
-import shutil
-import re
 from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, font
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import time
 
+from drive_config import load_drive_mapping
+from drive_health import DriveHealth
+from flight_catalog import FlightCatalog, add_entries, deleted_entries, flight_key, remove_entries
+from flight_engine import FlightEngine
+from flight_stream import FlightStream
+from flight_watch import PollingWatcher, create_watcher
+from scan_session import ScanSessions
+from ui_channel import UiChannel
+
 class FlightFileManager:
     def __init__(self, root, network_drives):
         self.root = root
+        # Worker threads reach the window only through this, never through Tk directly
+        self.ui = UiChannel(self.root)
+        self.ui.start()
         self.network_drives = network_drives
-        self.flight_data = {}
-        self.drive_mapping = {
+        self.flight_data = FlightCatalog()
+        # drives.json, when there is one, replaces these
+        self.drive_mapping = load_drive_mapping({
             "C:/": 61, "E:/": 63, "Y:/": 62, "D:/": 64,
             "G:/": 65, "H:/": 66, "I:/": 67,
-        }
-        self.scan_complete = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        })
+        # Starting a scan cancels the one still running instead of racing it
+        self.sessions = ScanSessions()
+        # Scans, copies and deletes. A drive gets engine.drive_budget seconds
+        # per scan and may go engine.stall_timeout seconds without progress;
+        # one that fails either is skipped until it answers a probe again
+        self.health = DriveHealth(on_change=self.on_drive_health)
+        self.engine = FlightEngine(self.drive_mapping, health=self.health)
+        self.index = self.engine.index
+        # "auto" uses inotify where the OS supports it, "poll" relists the das folders
+        self.watch_mode = "auto"
+        self.watcher = None
+        self.das_drive_ids = {}
+        # Scan and watch results are streamed to the table through self.results
+        self.results = FlightStream()
+        self.rows_per_batch = 2000
+        self.pump_scheduled = False
+        self.scanning = False
         self.init_gui()
 
     def init_gui(self):
@@ -42,6 +67,7 @@ class FlightFileManager:
         for col in ("date", "plane", "id", "files", "size"):
             self.table.heading(col, text=col.capitalize())
             self.table.column(col, width=100, anchor="center")
+        self.table.tag_configure("degraded", foreground="gray")
 
         self.btn_frame = tk.Frame(self.root)
         self.btn_frame.pack(fill="x")
@@ -52,12 +78,19 @@ class FlightFileManager:
         self.delete_btn = tk.Button(self.btn_frame, text="Delete", command=self.delete_files)
         self.delete_btn.pack(side="right", padx=5, pady=5)
 
-        self.reload_btn = tk.Button(self.btn_frame, text="Reload", command=self.load_files)
+        self.reload_btn = tk.Button(self.btn_frame, text="Reload", command=self.reload_files)
         self.reload_btn.pack(side="right", padx=5, pady=5)
 
+        self.stop_btn = tk.Button(self.btn_frame, text="Stop", command=self.stop_scan)
+        self.stop_btn.pack(side="right", padx=5, pady=5)
+
         self.easter_egg_btn = tk.Button(self.btn_frame, text="Easter Egg", command=self.display_easter_egg)
         self.easter_egg_btn.pack(side="left", padx=5, pady=5)
 
+        self.watch_var = tk.BooleanVar()
+        self.watch_check = tk.Checkbutton(self.btn_frame, text="Watch", variable=self.watch_var, command=self.toggle_watch)
+        self.watch_check.pack(side="left", padx=5, pady=5)
+
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(self.root, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(fill="x", padx=5, pady=5)
@@ -65,7 +98,7 @@ class FlightFileManager:
         self.status_label = tk.Label(self.root, text="Ready")
         self.status_label.pack(pady=5)
 
-        self.root.after(100, self.load_files) 
+        self.root.after(100, self.load_cached_flights)
 
     def easter_egg_message(self):
         messages = [
@@ -78,79 +111,183 @@ class FlightFileManager:
     def display_easter_egg(self):
         messagebox.showinfo("Easter Egg", self.easter_egg_message())
 
-    def load_files(self):
-        self.status_label.config(text="Loading files...")
+    def load_cached_flights(self):
+        # Only walk the drives on startup if the index has never seen some of them
+        if not set(self.network_drives) <= self.index.scanned_drives():
+            self.load_files()
+            return
+        self.flight_data = self.index.load_flight_data(self.network_drives)
+        self.display_flights()
+
+    def load_files(self, incremental=False):
+        previous = self.sessions.current
+        if incremental and previous is not None and previous.full and previous.cancelled:
+            # The table only holds what the interrupted full scan got to, so
+            # diffing against the index would leave the rest of it out
+            incremental = False
+        session, previous = self.sessions.start(full=not incremental)
+        self.status_label.config(text="Reloading files..." if incremental else "Loading files...")
         self.progress_var.set(0)
-        self.table.delete(*self.table.get_children())
-        self.scan_complete.clear()
-        threading.Thread(target=self.scan_flight_records, daemon=True).start()
-        self.root.after(100, self.check_scan_complete)
-
-    def check_scan_complete(self):
-        if self.scan_complete.is_set():
-            self.display_flights()
-        else:
-            self.root.after(100, self.check_scan_complete)
+        if not incremental:
+            # A full scan rebuilds the table from the rows it streams in
+            self.table.delete(*self.table.get_children())
+            self.flight_data = FlightCatalog()
+            self.results.clear()
+        self.scanning = True
+        threading.Thread(target=self.scan_flight_records, args=(session, previous, incremental), daemon=True).start()
+        self.schedule_pump()
+
+    def reload_files(self):
+        self.load_files(incremental=True)
+
+    def stop_scan(self):
+        # Whatever has reached the table so far stays there
+        if self.sessions.cancel():
+            self.status_label.config(text="Stopping scan...")
+
+    def schedule_pump(self, delay=50):
+        if not self.pump_scheduled:
+            self.pump_scheduled = True
+            self.root.after(delay, self.pump_results)
+
+    def pump_results(self):
+        """Apply one bounded batch of streamed results to flight_data and the table."""
+        self.pump_scheduled = False
+        touched = set()
+        for kind, drive_id, entries in self.results.drain(self.rows_per_batch):
+            apply = add_entries if kind == "add" else remove_entries
+            apply(self.flight_data, entries, drive_id)
+            touched.update(flight_key(entry, drive_id) for entry in entries)
+        for key in touched:
+            self.refresh_row(key)
 
-    def scan_flight_records(self):
-        pattern = re.compile(r'(\d{6})_(\d+)')
+        if len(self.results):
+            # More waiting - yield to Tk for a moment, then keep going
+            self.schedule_pump(delay=1)
+            return
+        session = self.sessions.current
+        if self.scanning and session.done.is_set():
+            self.scanning = False
+            self.finish_scan(session)
+        if self.scanning or self.watcher is not None:
+            self.schedule_pump()
+
+    def finish_scan(self, session):
+        print(f"Display completed {time.time() - session.started:.2f} seconds after the scan started")
+        self.status_label.config(text="Scan stopped - showing partial results" if session.cancelled else self.ready_text())
+        if self.watcher is not None:
+            # The scan may have found new das folders
+            self.start_watch()
+
+    def ready_text(self):
+        if not self.health.degraded:
+            return "Ready"
+        drives = ", ".join(f"{drive} ({reason})" for drive, reason in sorted(self.health.degraded.items()))
+        return f"Ready - degraded: {drives}"
+
+    def on_drive_health(self, drive, reason):
+        # Called from scan and probe threads
+        self.ui.call(self.refresh_drive_rows, self.drive_mapping.get(drive, "Unknown"))
+
+    def refresh_drive_rows(self, drive_id):
+        suffix = f"_{drive_id}"
+        for key in self.flight_data.keys():
+            if key.endswith(suffix):
+                self.refresh_row(key)
+        if not self.scanning:
+            self.status_label.config(text=self.ready_text())
+
+    def scan_flight_records(self, session, previous=None, incremental=False):
         total_drives = len(self.network_drives)
-        
-        def process_drive(drive):
-            drive_data = []
-            shu_fd_folder = Path(drive) / '!shu_fd'
-            if shu_fd_folder.exists():
-                for das_folder in shu_fd_folder.rglob('das'):
-                    if das_folder.is_dir():
-                        file_list = list(das_folder.iterdir())
-                        for file in file_list:
-                            if file.is_file() and pattern.match(file.stem):
-                                match = pattern.match(file.stem)
-                                if match:
-                                    date, plane_number = match.groups()
-                                else:
-                                    continue
-                                try:
-                                    size = file.stat().st_size
-                                except OSError:
-                                    size = 0  # Handle cases where file size can't be determined
-                                drive_data.append({
-                                    "date": date,
-                                    "plane_number": plane_number,
-                                    "filepath": file,
-                                    "drive_id": self.drive_mapping.get(drive, "Unknown"),
-                                    "size": size
-                                })
-            return drive_data
 
-        start_time = time.time()
-        futures = [self.executor.submit(process_drive, drive) for drive in self.network_drives]
-
-        flight_data = {}
-        for i, future in enumerate(as_completed(futures)):
-            for entry in future.result():
-                key = f"{entry['date']}_{entry['plane_number']}_{entry['drive_id']}"
-                if key not in flight_data:
-                    flight_data[key] = {"files": [], "total_size": 0}
-                flight_data[key]["files"].append(entry['filepath'])
-                flight_data[key]["total_size"] += entry['size'] / (1024 * 1024 * 1024)  # Convert to GB
-            self.progress_var.set((i + 1) / total_drives * 100)
-
-        self.flight_data = flight_data
-        end_time = time.time()
-        print(f"Scan completed in {end_time - start_time:.2f} seconds")
-        self.scan_complete.set()
+        def publish(drive, added, removed):
+            self.results.publish(self.engine.drive_id(drive), added, removed)
+
+        try:
+            if previous is not None:
+                # The superseded scan stops at its next directory or file; let it
+                # store what it finished before this one reads the index
+                previous.done.wait()
+            start_time = time.time()
+            # Each drive runs on its own thread rather than in a shared pool: a
+            # dead share can hold a thread inside one listing for minutes
+            # Each das folder is published as soon as it has been listed
+            outcomes = self.engine.rescan(self.network_drives, incremental, session.token, on_listing=publish)
+            for i, (drive, status, _) in enumerate(outcomes):
+                if status != "done":
+                    print(f"{drive}: {status}")
+                if status in ("skipped", "unreachable") and not incremental:
+                    # Keep showing what the index last knew about a degraded or offline drive
+                    drive_id = self.drive_mapping.get(drive, "Unknown")
+                    session.token.call(self.results.publish, drive_id, self.index.load_drive_entries(drive))
+                if not session.cancelled:
+                    self.ui.post("progress", self.progress_var.set, (i + 1) / total_drives * 100)
+
+            end_time = time.time()
+            state = "stopped" if session.cancelled else "completed"
+            print(f"Scan {state} after {end_time - start_time:.2f} seconds")
+        finally:
+            session.done.set()
 
     def display_flights(self):
         start_time = time.time()
         for key, data in self.flight_data.items():
-            date, plane_number, drive_id = key.split('_')
-            formatted_date = f"{date[:2]}/{date[2:4]}/{date[4:]}"
-            total_size = round(data["total_size"], 2)
-            self.table.insert("", "end", values=(formatted_date, plane_number, drive_id, f"{len(data['files'])} files", f"{total_size:.2f}"))
+            self.table.insert("", "end", iid=key, values=self.row_values(key, data), tags=self.row_tags(key))
         end_time = time.time()
         print(f"Display completed in {end_time - start_time:.2f} seconds")
-        self.status_label.config(text="Ready")
+        self.status_label.config(text=self.ready_text())
+
+    def row_tags(self, key):
+        drive_id = key.rsplit('_', 1)[1]
+        degraded_ids = {str(self.drive_mapping.get(drive, "Unknown")) for drive in self.health.degraded}
+        return ("degraded",) if drive_id in degraded_ids else ()
+
+    def row_values(self, key, data):
+        date, plane_number, drive_id = key.split('_')
+        formatted_date = f"{date[:2]}/{date[2:4]}/{date[4:]}"
+        total_size = round(data.total_size, 2)
+        return (formatted_date, plane_number, drive_id, f"{data.file_count} files", f"{total_size:.2f}")
+
+    def refresh_row(self, key):
+        data = self.flight_data.get(key)
+        if data is None:
+            if self.table.exists(key):
+                self.table.delete(key)
+        elif self.table.exists(key):
+            self.table.item(key, values=self.row_values(key, data), tags=self.row_tags(key))
+        else:
+            self.table.insert("", "end", iid=key, values=self.row_values(key, data), tags=self.row_tags(key))
+
+    def toggle_watch(self):
+        if self.watch_var.get():
+            self.start_watch()
+            self.schedule_pump()
+        else:
+            self.stop_watch()
+            self.status_label.config(text=self.ready_text())
+
+    def start_watch(self):
+        self.stop_watch()
+        das_dirs = self.index.load_das_dirs(self.network_drives)
+        self.das_drive_ids = {das_dir: self.drive_mapping.get(drive, "Unknown") for das_dir, drive in das_dirs.items()}
+        self.watcher = create_watcher(das_dirs, self.on_watch_change, mode=self.watch_mode)
+        how = "polling" if isinstance(self.watcher, PollingWatcher) else "inotify"
+        self.status_label.config(text=f"Watching {len(das_dirs)} das folders ({how})")
+
+    def stop_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def on_watch_change(self, added, removed):
+        # Called on the watcher thread - the changes reach the table through the result stream
+        by_drive = {}
+        for entries, slot in ((added, 0), (removed, 1)):
+            for entry in entries:
+                drive_id = self.das_drive_ids.get(os.path.dirname(entry.path), "Unknown")
+                by_drive.setdefault(drive_id, ([], []))[slot].append(entry)
+        for drive_id, (drive_added, drive_removed) in by_drive.items():
+            self.results.publish(drive_id, drive_added, drive_removed)
 
 
     def copy_files(self):
@@ -164,23 +301,29 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Copying files...")
-        threading.Thread(target=self._copy_files, args=(selected, dest_dir), daemon=True).start()
+        # The table and flight_data are read here, on the Tk thread; the worker
+        # gets its own copy of the selected flights
+        flights = self.flight_data.subset(self.selected_keys(selected))
+        threading.Thread(target=self._copy_files, args=(flights, dest_dir), daemon=True).start()
 
-    def _copy_files(self, selected, dest_dir):
+    def selected_keys(self, selected):
+        keys = []
         for item in selected:
             values = self.table.item(item, 'values')
             if values:
                 date, plane_number, drive_id, _, _ = values
                 unformatted_date = date.replace("/", "")
-                key = f"{unformatted_date}_{plane_number}_{drive_id}"
-                if key in self.flight_data:
-                    for file in self.flight_data[key]["files"]:
-                        try:
-                            shutil.copy2(file, dest_dir)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Copy Error", f"Error copying file {file}: {str(e)}")
-        self.root.after(0, messagebox.showinfo, "Copy Complete", "Selected files have been copied.")
-        self.root.after(0, self.status_label.config, {"text": "Ready"})
+                keys.append(f"{unformatted_date}_{plane_number}_{drive_id}")
+        return keys
+
+    def _copy_files(self, flights, dest_dir):
+        self.engine.copy(flights, list(flights), dest_dir, on_file=self.report_copy)
+        self.ui.call(messagebox.showinfo, "Copy Complete", "Selected files have been copied.")
+        self.ui.post("status", self.status_label.config, {"text": "Ready"})
+
+    def report_copy(self, file, error):
+        if error is not None:
+            self.ui.call(messagebox.showerror, "Copy Error", f"Error copying file {file}: {str(error)}")
 
     def delete_files(self):
         selected = self.table.selection()
@@ -193,24 +336,30 @@ class FlightFileManager:
             return
         
         self.status_label.config(text="Deleting files...")
-        threading.Thread(target=self._delete_files, args=(selected,), daemon=True).start()
+        flights = self.flight_data.subset(self.selected_keys(selected))
+        threading.Thread(target=self._delete_files, args=(flights,), daemon=True).start()
 
-    def _delete_files(self, selected):
-        for item in selected:
-            values = self.table.item(item, 'values')
-            if values:
-                date, plane_number, drive_id, _, _ = values
-                unformatted_date = date.replace("/", "")
-                key = f"{unformatted_date}_{plane_number}_{drive_id}"
-                if key in self.flight_data:
-                    for file in self.flight_data[key]["files"]:
-                        try:
-                            os.remove(file)
-                        except Exception as e:
-                            self.root.after(0, messagebox.showerror, "Deletion Error", f"Error deleting file {file}: {str(e)}")
-        self.root.after(0, self.load_files)
-        self.root.after(0, messagebox.showinfo, "Deletion Complete", "Selected files have been deleted.")
-        self.root.after(0, self.status_label.config, {"text": "Ready"})
+    def _delete_files(self, flights):
+        deleted = set()
+
+        def on_file(file, error):
+            if error is None:
+                deleted.add(Path(file))
+            self.report_delete(file, error)
+
+        self.engine.delete(flights, list(flights), on_file=on_file)
+        # The engine has already dropped the files from the index, so the
+        # reload has nothing left to diff them against: take them off here
+        for drive_id, removed in deleted_entries(flights, deleted).items():
+            self.results.publish(drive_id, removed=removed)
+        self.ui.call(self.schedule_pump)
+        self.ui.call(messagebox.showinfo, "Deletion Complete", "Selected files have been deleted.")
+        # The reload sets the status line itself once it has finished
+        self.ui.call(self.reload_files)
+
+    def report_delete(self, file, error):
+        if error is not None:
+            self.ui.call(messagebox.showerror, "Deletion Error", f"Error deleting file {file}: {str(error)}")
 
 
 if __name__ == "__main__":
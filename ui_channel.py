@@ -0,0 +1,80 @@
+import threading
+from itertools import count
+from operator import itemgetter
+
+# Milliseconds between two applications of what the workers posted, about 30 per second
+FRAME_MS = 33
+
+
+class UiChannel:
+    """
+    The one way worker threads reach the Tk window.
+
+    post(slot, func, *args) may be called from any thread and asks for
+    func(*args) to run on the Tk thread; a later post to the same slot
+    replaces one that has not run yet, so a copy that reports progress for
+    every file still updates the progress bar and status line once per
+    frame. call(func, *args) queues a call that is never dropped or merged
+    (message boxes, handing over scan results). Everything runs in the
+    order it was submitted, a re-posted slot taking the place of its last
+    post, so a status posted before a call cannot land on top of what
+    that call shows.
+
+    Nothing touches Tk outside the Tk thread: start(), from the Tk thread,
+    runs one after() loop that applies everything pending every frame_ms,
+    so the event queue holds one callback however busy the workers are.
+    """
+
+    def __init__(self, root, frame_ms=FRAME_MS):
+        self.root = root
+        self.frame_ms = frame_ms
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._calls = []
+        # Submission order across slots and calls
+        self._sequence = count()
+        self._job = None
+        self._running = False
+
+    def post(self, slot, func, *args):
+        with self._lock:
+            # Replaces a pending post to the slot and takes its turn from now
+            self._slots[slot] = (next(self._sequence), func, args)
+
+    def call(self, func, *args):
+        with self._lock:
+            self._calls.append((next(self._sequence), func, args))
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._job = self.root.after(self.frame_ms, self._apply)
+
+    def stop(self):
+        self._running = False
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def flush(self):
+        """Apply everything pending now; Tk thread only."""
+        with self._lock:
+            calls, self._calls = self._calls, []
+            slots, self._slots = self._slots, {}
+        # Both are in submission order already, so sorting them is a merge
+        for _, func, args in sorted((*calls, *slots.values()), key=itemgetter(0)):
+            try:
+                func(*args)
+            except Exception as e:
+                # One failing update must not stop the ones after it, or the loop
+                print(f"UI update {getattr(func, '__name__', func)} failed: {e}")
+
+    def _apply(self):
+        self._job = None
+        try:
+            self.flush()
+        finally:
+            # Scheduled only once this frame is done, so a slow frame (or a
+            # modal message box) delays the next one instead of stacking them
+            if self._running:
+                self._job = self.root.after(self.frame_ms, self._apply)
@@ -0,0 +1,284 @@
+from tkinter import ttk
+
+# event.state bits of the modifier keys
+_SHIFT = 0x0001
+_CONTROL = 0x0004
+
+# Rows moved per mouse wheel notch
+WHEEL_ROWS = 3
+
+
+class VirtualTable(ttk.Frame):
+    """
+    A ttk.Treeview that only ever holds the rows in view.
+
+    The table's content is a list of row keys; row_values(key) and
+    row_tags(key) are asked for the rows on screen, plus overscan rows of
+    margin, whenever the view moves. Those are written into a fixed set of
+    Treeview items that are reused rather than deleted and re-inserted, so
+    filling or clearing the table costs the same for 50 rows as for 500k.
+    The scrollbar is driven from the key list and so reflects every row,
+    and the selection is kept as keys so it survives scrolling.
+
+    Columns named in sort_keys sort when their heading is clicked, a second
+    click reversing the order. sort_keys[column](key) gives a row's sort
+    value for that column; it is asked once per row and remembered until
+    the row is removed or set_keys() replaces the rows, and each column's
+    sorted order is cached until rows are added or removed, so switching
+    between sorted columns costs a list copy. A column named in sort_orders
+    instead gets its order whole from sort_orders[column](), every row key
+    in ascending order, for rows whose values live in a column store; that
+    order is cached the same way.
+
+    set_filter(keys) narrows the rows shown to those keys, in the current
+    order; set_filter(None) shows every row again.
+
+    heading(), column() and tag_configure() go straight to the Treeview;
+    selection() returns the selected keys in table order.
+    """
+
+    def __init__(self, parent, columns, row_values, row_tags=None, sort_keys=None, sort_orders=None, overscan=2,
+                 **treeview_options):
+        super().__init__(parent)
+        self.row_values = row_values
+        self.row_tags = row_tags if row_tags is not None else (lambda key: ())
+        self.sort_keys = sort_keys or {}
+        self.sort_orders = sort_orders or {}
+        self.overscan = overscan
+        # rows in the order they were added, keys in the order they are shown
+        self.rows = []
+        self.keys = []
+        self.sort_column = None
+        self.descending = False
+        self.shown = None
+        self._sort_values = {column: {} for column in self.sort_keys}
+        self._orders = {}
+        self._titles = {}
+        self.selected = set()
+        self.top = 0
+        # Rows that fit in the widget; measured from the first row once it is drawn
+        self.visible = 20
+        self._slots = []
+        self._anchor = None
+        self._cursor = None
+
+        self.tree = ttk.Treeview(self, columns=columns, selectmode="none", **treeview_options)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+        self.tree.bind("<ButtonPress-1>", self._on_click)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+        moves = {
+            "<Up>": lambda: -1, "<Down>": lambda: 1,
+            "<Prior>": lambda: -self.visible, "<Next>": lambda: self.visible,
+            "<Home>": lambda: -len(self.keys), "<End>": lambda: len(self.keys),
+        }
+        for sequence, step in moves.items():
+            self.tree.bind(sequence, lambda event, step=step: self._on_key(event, step()))
+        self.tree.bind("<Control-a>", self._select_all)
+        for column in (*self.sort_keys, *self.sort_orders):
+            self.tree.heading(column, command=lambda column=column: self.sort_by(column))
+
+    def heading(self, *args, **kwargs):
+        return self.tree.heading(*args, **kwargs)
+
+    def column(self, *args, **kwargs):
+        return self.tree.column(*args, **kwargs)
+
+    def tag_configure(self, *args, **kwargs):
+        return self.tree.tag_configure(*args, **kwargs)
+
+    def set_keys(self, keys):
+        """Replace every row, keeping the sort column. Selected keys that are still there stay selected."""
+        self.rows = list(keys)
+        for values in self._sort_values.values():
+            values.clear()
+        if self.selected:
+            self.selected &= set(self.rows)
+        self._rows_changed()
+
+    def append(self, keys):
+        self.rows.extend(keys)
+        self._rows_changed()
+
+    def remove(self, keys):
+        gone = set(keys)
+        self.rows = [key for key in self.rows if key not in gone]
+        for values in self._sort_values.values():
+            for key in gone:
+                values.pop(key, None)
+        self.selected -= gone
+        if self.shown is not None:
+            self.shown -= gone
+        self._rows_changed()
+
+    def clear(self):
+        self.set_keys([])
+
+    def sort_by(self, column, descending=None):
+        """Show the rows sorted by column; descending=None flips the order if column is already sorted."""
+        if descending is None:
+            descending = column == self.sort_column and not self.descending
+        self.sort_column = column
+        self.descending = descending
+        self._anchor = self._cursor = None
+        for name in (*self.sort_keys, *self.sort_orders):
+            title = self._titles.setdefault(name, self.tree.heading(name, "text"))
+            if name == column:
+                title += " \u25bc" if descending else " \u25b2"
+            self.tree.heading(name, text=title)
+        self._show_rows()
+
+    def set_filter(self, keys):
+        """Show only the rows whose key is in keys (a set), or every row for None."""
+        self.shown = keys
+        if keys is not None and self.selected:
+            self.selected &= keys
+        self._anchor = self._cursor = None
+        self._show_rows()
+
+    def sorted_rows(self, column):
+        """Every row in ascending order of column, from the cache when the rows have not changed since."""
+        order = self._orders.get(column)
+        if order is None and column in self.sort_orders:
+            order = self._orders[column] = list(self.sort_orders[column]())
+        elif order is None:
+            values = self._sort_values[column]
+            sort_key = self.sort_keys[column]
+            for key in self.rows:
+                if key not in values:
+                    values[key] = sort_key(key)
+            order = self._orders[column] = sorted(self.rows, key=values.__getitem__)
+        return order
+
+    def selection(self):
+        if not self.selected:
+            return []
+        return [key for key in self.keys if key in self.selected]
+
+    def yview(self, *args):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units" | "pages")."""
+        if args and args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.keys))
+        elif args and args[0] == "scroll":
+            step = int(args[1])
+            self.top += step * self.visible if args[2] == "pages" else step
+        self.refresh()
+
+    def see(self, row):
+        """Scroll so that row number row is in view."""
+        if row < self.top:
+            self.top = row
+        elif row >= self.top + self.visible:
+            self.top = row - self.visible + 1
+        self.refresh()
+
+    def _rows_changed(self):
+        self._orders.clear()
+        self._anchor = self._cursor = None
+        self._show_rows()
+
+    def _show_rows(self):
+        if self.sort_column is None:
+            order = self.rows
+        else:
+            order = self.sorted_rows(self.sort_column)
+            if self.descending:
+                order = reversed(order)
+        shown = self.shown
+        self.keys = list(order) if shown is None else [key for key in order if key in shown]
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the rows in view, e.g. after the data behind them has changed."""
+        self._measure()
+        self.top = max(0, min(self.top, len(self.keys) - self.visible))
+        keys = self.keys[self.top:self.top + self.visible + self.overscan]
+
+        tree = self.tree
+        while len(self._slots) < len(keys):
+            self._slots.append(tree.insert("", "end"))
+        if len(self._slots) > len(keys):
+            tree.delete(*self._slots[len(keys):])
+            del self._slots[len(keys):]
+        for slot, key in zip(self._slots, keys):
+            tree.item(slot, values=self.row_values(key), tags=self.row_tags(key))
+        tree.selection_set([slot for slot, key in zip(self._slots, keys) if key in self.selected])
+        # The overscan rows hang below the bottom edge; the Treeview itself never scrolls
+        tree.yview_moveto(0)
+
+        total = len(self.keys)
+        if total <= self.visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, min(1, (self.top + self.visible) / total))
+
+    def _measure(self):
+        if not self._slots:
+            return
+        bbox = self.tree.bbox(self._slots[0])
+        height = self.tree.winfo_height()
+        if bbox and bbox[3] > 0 and height > 1:
+            # bbox y is where the rows start, below the headings
+            self.visible = max(1, (height - bbox[1]) // bbox[3])
+
+    def _row_at(self, y):
+        slot = self.tree.identify_row(y)
+        if not slot:
+            return None
+        row = self.top + self._slots.index(slot)
+        return row if row < len(self.keys) else None
+
+    def _select(self, row, extend=False, toggle=False):
+        key = self.keys[row]
+        if extend and self._anchor is not None:
+            low, high = sorted((min(self._anchor, len(self.keys) - 1), row))
+            self.selected = set(self.keys[low:high + 1])
+        elif toggle:
+            self.selected ^= {key}
+            self._anchor = row
+        else:
+            self.selected = {key}
+            self._anchor = row
+        self._cursor = row
+        self.see(row)
+        self.event_generate("<<TreeviewSelect>>")
+
+    def _on_click(self, event):
+        # Let the Treeview handle heading clicks and column resizing itself
+        if self.tree.identify_region(event.x, event.y) in ("heading", "separator"):
+            return None
+        self.tree.focus_set()
+        row = self._row_at(event.y)
+        if row is not None:
+            self._select(row, extend=event.state & _SHIFT, toggle=event.state & _CONTROL)
+        return "break"
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            step = -WHEEL_ROWS
+        elif event.num == 5:
+            step = WHEEL_ROWS
+        else:
+            # Windows reports multiples of 120 per notch, macOS small steps
+            step = -WHEEL_ROWS * (event.delta // 120 if abs(event.delta) >= 120 else event.delta)
+        self.top += step
+        self.refresh()
+        return "break"
+
+    def _on_key(self, event, step):
+        if self.keys:
+            current = self._cursor if self._cursor is not None else self.top
+            self._select(max(0, min(len(self.keys) - 1, current + step)), extend=event.state & _SHIFT)
+        return "break"
+
+    def _select_all(self, event):
+        self.selected = set(self.keys)
+        self.refresh()
+        self.event_generate("<<TreeviewSelect>>")
+        return "break"